@@ -1,19 +1,28 @@
+import argparse
 import asyncio
+import threading
 
 from config import settings
 from config.settings import preferences
-from backend import create_scheduler, start_scheduler
-from ui.console import create_gradio_ui
-from ui.tray import create_tray_icon
+from backend import create_scheduler, start_scheduler, scheduler, watch
+from core.dirsync import migrate_legacy_dumps
+from core import metrics
 
 
 # 非同期のメイン関数
 async def main():
+    # UI関連のモジュールはコンソール起動時のみ読み込む
+    from ui.console import create_gradio_ui
+    from ui.tray import create_tray_icon
     # スケジューラ生成
     create_scheduler()
-    # GradioのUI起動（非ブロッキング）
+    # GradioのUI起動（非ブロッキング、同じポートで /metrics も提供）
     demo = create_gradio_ui()
-    demo.launch(prevent_thread_lock=True, server_port=preferences.ServerPort)
+    demo.launch(
+        prevent_thread_lock=True,
+        server_port=preferences.ServerPort,
+        app_kwargs={"routes": [metrics.prometheus_route()]},
+    )
     # スケジューラ起動
     start_scheduler()
     # トレイアイコンを非同期スレッドで実行
@@ -21,5 +30,55 @@ async def main():
     await asyncio.to_thread(icon.run)
 
 
+# UIなしで同期エンジンのみ実行
+def daemon(once: bool = False):
+    if once:
+        # 1回だけ同期して終了
+        migrate_legacy_dumps()
+        watch(trigger='once')
+        return
+    create_scheduler()
+    start_scheduler()
+    metrics.serve(preferences.ServerPort)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        scheduler.shutdown(wait=False)
+
+
+# 次の同期の計画を表示（コピーは行わない）
+def plan(pair_name: str | None = None):
+    from core import preview
+    migrate_legacy_dumps()
+    for pair in preferences.SyncPairs:
+        if pair_name is not None and pair.Name != pair_name:
+            continue
+        result = preview.preview_pair(pair.Name)
+        print(f'[{pair.Name}] {result.summary()}')
+        for f in result.folders:
+            eta = preview.format_eta(result.eta_seconds(f.bytes_total))
+            print(
+                f'  {f.name}: {f.status}, +{f.adds} ~{f.updates} >{f.moves} -{f.deletes}, '
+                f'{f.bytes_total / 2**20:.1f} MiB, ETA {eta}' + (f' ({f.error})' if f.error else '')
+            )
+
+
+def cli():
+    parser = argparse.ArgumentParser(prog='flexcc')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('console', help='start the sync engine with the console and tray icon (default)')
+    parser_daemon = subparsers.add_parser('daemon', help='start the sync engine only (headless)')
+    parser_daemon.add_argument('--once', action='store_true', help='sync once and exit')
+    parser_plan = subparsers.add_parser('plan', help='show the pending work of the next sync without copying')
+    parser_plan.add_argument('--pair', help='sync pair name (default: all pairs)')
+    args = parser.parse_args()
+    if args.command == 'daemon':
+        daemon(once=args.once)
+    elif args.command == 'plan':
+        plan(args.pair)
+    else:
+        asyncio.run(main())
+
+
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    cli()
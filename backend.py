@@ -1,31 +1,140 @@
 from pathlib import Path
-from core.dirsync import LocalRootDirectory, RemoteRootDirectory
+from core.dirsync import LocalRootDirectory, RemoteRootDirectory, migrate_legacy_dumps
+from core.metrics import RunMetrics, phase
+from core import watcher as folder_watcher, coordinator
 from config import settings
-from config.settings import preferences
+from config.settings import preferences, SyncPair
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime
+import threading
 
 
 scheduler: BackgroundScheduler = BackgroundScheduler()
+watchers: dict[str, folder_watcher.DirtyFolderWatcher] = {}
+job_prefix = 'watch_sync:'
+scrub_job_prefix = 'scrub:'
 
-def watch():
-    if not settings.has_root_dirs():
+def watch(ids: set[str] | None = None, trigger: str = 'manual'):
+    """
+    すべての組を同期する
+    """
+    for pair in preferences.SyncPairs:
+        watch_pair(pair.Name, ids, trigger)
+
+
+def watch_pair(pair_name: str, ids: set[str] | None = None, trigger: str = 'manual') -> bool:
+    """
+    組を同期する（同じ組の同期が実行中なら、完了後の1回の同期にまとめて False を返す）
+    """
+    pair = settings.get_pair(pair_name)
+    if pair is None or not pair.has_root_dirs():
+        return False
+    return coordinator.get(pair.Name).request(sync_pair, ids, trigger)
+
+
+def sync_pair(pair_name: str, ids: set[str] | None, run: RunMetrics, cancel_event: threading.Event):
+    pair = settings.get_pair(pair_name)
+    if pair is None or not pair.has_root_dirs():
+        return
+    local = LocalRootDirectory(path_=pair.LocalDirectory)
+    remote = RemoteRootDirectory(path_=pair.RemoteDirectory)
+    print(f'[{pair.Name}] Local:')
+    with phase(run.timings, 'check local'):
+        local.check()
+    print(f'\n[{pair.Name}] Remote:')
+    with phase(run.timings, 'check remote'):
+        remote.check()
+    if cancel_event.is_set():
+        return
+    print(f'\n[{pair.Name}] Sync:')
+    # フェーズ（transfer・metadata・evict・dump）は local.sync の中で計測する
+    local.sync(remote, ids, run, cancel_event)
+
+
+def scrub_pair(pair_name: str):
+    """
+    組のリモートの整合性チェック（同期とは別のジョブとして、速度と1回あたりの量を制限して実行する）
+    """
+    pair = settings.get_pair(pair_name)
+    if pair is None or not pair.has_root_dirs() or not preferences.ScrubEnabled:
+        return
+    # 同期中はリモートへの負荷を重ねないよう次回に回す
+    if coordinator.is_running(pair.Name):
+        return
+    local = LocalRootDirectory.load(pair.Name)
+    remote = RemoteRootDirectory.load(pair.Name)
+    if local is None or remote is None:
         return
-    local = LocalRootDirectory(path_=preferences.LocalDirectory)
-    remote = RemoteRootDirectory(path_=preferences.RemoteDirectory)
-    print('Local:')
-    local.check()
-    print('\nRemote:')
-    remote.check()
-    print('\nSync:')
-    local.sync(remote)
-    print('Completed')
+    local.scrub(remote)
+
+
+def sync_interval_seconds(pair: SyncPair | None = None) -> int:
+    freq_minutes = pair.get('SyncFreqMinutes') if pair is not None else preferences.SyncFreqMinutes
+    # 監視モードでは定期スキャンは取りこぼし対策の低頻度実行とする
+    if preferences.WatchMode and folder_watcher.is_available():
+        return max(freq_minutes, preferences.SafetyScanMinutes) * 60
+    return freq_minutes * 60
+
+
+def schedule_pairs():
+    """
+    組ごとの同期ジョブを設定に合わせて登録・更新・削除する
+    """
+    job_ids: set[str] = set()
+    for pair in preferences.SyncPairs:
+        job_id = f'{job_prefix}{pair.Name}'
+        job_ids.add(job_id)
+        seconds = sync_interval_seconds(pair)
+        job = scheduler.get_job(job_id)
+        if job is None:
+            scheduler.add_job(
+                func=watch_pair, args=[pair.Name, None, 'schedule'], trigger="interval", seconds=seconds, next_run_time=datetime.now(), id=job_id
+            )
+        elif job.trigger.interval.total_seconds() != seconds:
+            scheduler.reschedule_job(job_id, trigger=IntervalTrigger(seconds=seconds))
+        # 整合性チェックは同期の直後を避けて、最初の間隔が経過してから実行する
+        job_id = f'{scrub_job_prefix}{pair.Name}'
+        job_ids.add(job_id)
+        seconds = preferences.ScrubIntervalMinutes * 60
+        job = scheduler.get_job(job_id)
+        if job is None:
+            scheduler.add_job(func=scrub_pair, args=[pair.Name], trigger="interval", seconds=seconds, id=job_id)
+        elif job.trigger.interval.total_seconds() != seconds:
+            scheduler.reschedule_job(job_id, trigger=IntervalTrigger(seconds=seconds))
+    for job in scheduler.get_jobs():
+        if job.id.startswith((job_prefix, scrub_job_prefix)) and job.id not in job_ids:
+            job.remove()
 
 
 def create_scheduler() -> BackgroundScheduler:
-    scheduler.add_job(func=watch, trigger="interval", seconds=preferences.SyncFreqMinutes*60, next_run_time=datetime.now(), id="watch_sync")
+    migrate_legacy_dumps()
+    schedule_pairs()
     return scheduler
 
 
+def start_watcher():
+    stop_watcher()
+    if not preferences.WatchMode:
+        return
+    for pair in preferences.SyncPairs:
+        if not pair.has_root_dirs():
+            continue
+        watcher = folder_watcher.create_watcher(
+            pair.LocalDirectory, on_settled=lambda ids, name=pair.Name: watch_pair(name, ids, 'watch')
+        )
+        if watcher is None:
+            return
+        watcher.start()
+        watchers[pair.Name] = watcher
+
+
+def stop_watcher():
+    for watcher in watchers.values():
+        watcher.stop()
+    watchers.clear()
+
+
 def start_scheduler():
-    scheduler.start()
\ No newline at end of file
+    scheduler.start()
+    start_watcher()
@@ -0,0 +1,92 @@
+"""
+大きなファイルのコピー方法の比較
+
+    uv run bench/largecopy.py --size-mb 1024 --repeat 3 --target /mnt/nas/tmp
+    uv run bench/largecopy.py --size-mb 50 --bandwidth-mbps 80 --latency-ms 5
+
+指定サイズのファイルを作成し、shutil.copy2 と core/fastcopy.py の各方法
+（reflink・copy_file_range・sendfile・バッファ経由）でコピー先へコピーして、
+所要時間・スループット・CPU 時間を表示する。
+--target を省略した場合は同じ一時フォルダ内へコピーする（reflink はここでのみ効果がある）。
+使用できない方法は次の方法に切り替わるため、実際に使われた方法も表示する。
+--bandwidth-mbps を指定した場合は、コピー先を低速リモート（bench/slowfs.py）として扱う。
+"""
+from contextlib import nullcontext
+from pathlib import Path
+import argparse
+import statistics
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from slowfs import SlowRemote
+
+
+def measure(copy, src: Path, dst: Path) -> tuple[float, float, str]:
+    dst.unlink(missing_ok=True)
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    used = copy(src, dst)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    if dst.stat().st_size != src.stat().st_size:
+        raise RuntimeError(f'size mismatch: {dst}')
+    return elapsed, cpu, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--target', type=Path, help='destination directory (e.g. a network share)')
+    parser.add_argument('--bandwidth-mbps', type=float, default=None, help='simulate a slow remote destination')
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    from core import fastcopy
+
+    work_dir = Path(tempfile.mkdtemp(prefix='fxcc-bench-'))
+    target_dir = Path(tempfile.mkdtemp(prefix='fxcc-bench-', dir=args.target)) if args.target else work_dir
+    if args.bandwidth_mbps is not None and target_dir == work_dir:
+        # 低速リモートはコピー元と別のフォルダにする
+        target_dir = Path(tempfile.mkdtemp(prefix='fxcc-bench-remote-'))
+    try:
+        src = work_dir / 'source.bin'
+        with open(src, 'wb') as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(2**20))
+        dst = target_dir / 'copy.bin'
+        candidates = {'shutil.copy2': lambda s, d: shutil.copy2(s, d) and 'shutil.copy2'}
+        candidates['fastcopy (auto)'] = fastcopy.copy_file
+        for name in fastcopy.METHODS:
+            candidates[f'fastcopy ({name})'] = lambda s, d, name=name: fastcopy.copy_file(s, d, methods=[name])
+
+        print(f'{args.size_mb} MiB, {args.repeat} runs, chunk {fastcopy.chunk_size_for(dst) // 2**20} MiB, '
+              f'network target: {fastcopy.is_network_path(target_dir)}')
+        if args.bandwidth_mbps is not None:
+            print(f'simulated remote: {args.bandwidth_mbps} Mbps, {args.latency_ms} ms')
+        for name, copy in candidates.items():
+            try:
+                slow = SlowRemote(target_dir, args.latency_ms, args.bandwidth_mbps) if args.bandwidth_mbps is not None else nullcontext()
+                with slow:
+                    results = [measure(copy, src, dst) for _ in range(args.repeat)]
+            except OSError as e:
+                print(f'{name:>28}: unavailable ({e})')
+                continue
+            elapsed = statistics.median(r[0] for r in results)
+            cpu = statistics.median(r[1] for r in results)
+            print(f'{name:>28}: median {elapsed * 1000:8.1f} ms  {args.size_mb / elapsed:8.1f} MiB/s  '
+                  f'cpu {cpu * 1000:8.1f} ms  used {results[0][2]}')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if target_dir != work_dir:
+            shutil.rmtree(target_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
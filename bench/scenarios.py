@@ -0,0 +1,137 @@
+"""
+同期処理のベンチマーク
+
+    uv run bench/scenarios.py --profile mixed --folders 4 --latency-ms 5 --bandwidth-mbps 200
+
+生成したツリーを低速リモート（bench/slowfs.py）へ同期し、以下のシナリオごとに
+フェーズ別の所要時間（ローカル走査・リモート走査・同期）とスループットを表示する。
+
+- cold: 空のリモートへの初回同期
+- no-op: 変更なしでの再同期
+- change-1pct: 1% のファイルを書き換えて同期
+- rename-1pct: 1% のファイルをリネームして同期
+"""
+from pathlib import Path
+import argparse
+import tempfile
+import random
+import shutil
+import time
+import sys
+import os
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from treegen import PROFILES, generate_root, list_files, write_file
+from slowfs import SlowRemote
+
+
+def run_cycle(local_dir: Path, remote_dir: Path) -> dict[str, float]:
+    """
+    backend.watch と同じ手順で1回同期し、フェーズ別の所要時間を返す
+    """
+    from core.dirsync import LocalRootDirectory, RemoteRootDirectory
+    timings: dict[str, float] = {}
+    local = LocalRootDirectory(path_=local_dir)
+    remote = RemoteRootDirectory(path_=remote_dir)
+    started = time.perf_counter()
+    local.check()
+    timings['check local'] = time.perf_counter() - started
+    started = time.perf_counter()
+    remote.check()
+    timings['check remote'] = time.perf_counter() - started
+    started = time.perf_counter()
+    local.sync(remote)
+    timings['sync'] = time.perf_counter() - started
+    return timings
+
+
+def change_files(local_dir: Path, ratio: float, rng: random.Random) -> int:
+    files = list_files(local_dir)
+    changed = rng.sample(files, max(1, int(len(files) * ratio)))
+    total = 0
+    for path_ in changed:
+        size = path_.stat().st_size
+        write_file(path_, size, rng)
+        # 書き換え前と同じ時刻にならないよう更新時刻を進める
+        mtime = time.time() + 10
+        os.utime(path_, (mtime, mtime))
+        total += size
+    return total
+
+
+def rename_files(local_dir: Path, ratio: float, rng: random.Random) -> int:
+    files = list_files(local_dir)
+    renamed = rng.sample(files, max(1, int(len(files) * ratio)))
+    total = 0
+    for path_ in renamed:
+        total += path_.stat().st_size
+        path_.rename(path_.with_name(f'renamed-{path_.name}'))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=PROFILES.keys(), default='mixed')
+    parser.add_argument('--folders', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    parser.add_argument('--bandwidth-mbps', type=float, default=200.0)
+    parser.add_argument('--transfer-workers', type=int, default=None)
+    parser.add_argument('--sync-workers', type=int, default=None)
+    parser.add_argument('--engine', default=None, help='transfer engine (native / robocopy)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix='fxcc-bench-'))
+    # 設定・状態ファイルは作業フォルダ以下に作成させる
+    (work_dir / 'config').mkdir()
+    os.chdir(work_dir)
+    from config.settings import preferences, SyncPair
+    local_dir = work_dir / 'local'
+    remote_dir = work_dir / 'remote'
+    remote_dir.mkdir()
+    preferences.SyncPairs = [SyncPair(LocalDirectory=local_dir, RemoteDirectory=remote_dir)]
+    if args.transfer_workers is not None:
+        preferences.TransferWorkers = args.transfer_workers
+    if args.sync_workers is not None:
+        preferences.SyncWorkers = args.sync_workers
+    if args.engine is not None:
+        preferences.TransferEngine = args.engine
+
+    rng = random.Random(args.seed)
+    try:
+        total = generate_root(local_dir, args.profile, args.folders, args.seed)
+        file_count = len(list_files(local_dir))
+        print(f'{args.profile}: {args.folders} folders, {file_count} files, {total / 2**20:.1f} MiB')
+        print(f'remote: {args.latency_ms} ms/op, {args.bandwidth_mbps} Mbps, engine: {preferences.TransferEngine}, '
+              f'workers: {preferences.SyncWorkers} folders x {preferences.TransferWorkers} files\n')
+        scenarios = [
+            ('cold', lambda: total),
+            ('no-op', lambda: 0),
+            ('change-1pct', lambda: change_files(local_dir, 0.01, rng)),
+            ('rename-1pct', lambda: rename_files(local_dir, 0.01, rng)),
+        ]
+        header = f'{"scenario":<14}{"check local":>13}{"check remote":>14}{"sync":>10}{"remote ops":>12}{"MiB/s":>9}'
+        print(header)
+        print('-' * len(header))
+        for name, prepare in scenarios:
+            changed_bytes = prepare()
+            with SlowRemote(remote_dir, args.latency_ms, args.bandwidth_mbps) as remote:
+                # 同期処理の出力は表に混ざらないよう捨てる
+                stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+                try:
+                    timings = run_cycle(local_dir, remote_dir)
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+            throughput = changed_bytes / 2**20 / timings['sync'] if timings['sync'] else 0
+            print(f'{name:<14}{timings["check local"]:>12.3f}s{timings["check remote"]:>13.3f}s'
+                  f'{timings["sync"]:>9.3f}s{remote.ops:>12}{throughput:>9.1f}')
+    finally:
+        os.chdir(Path(__file__).resolve().parent)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+低速なNASを模したリモート
+
+指定したフォルダ以下へのファイル操作に、操作ごとの遅延と帯域制限を加える。
+同期処理が使用する os / shutil / open の関数をベンチマーク実行中だけ差し替える。
+core/fastcopy.py が使うファイルディスクリプタ単位の読み書き（os.write・os.copy_file_range・os.sendfile など）も、
+リモートのファイルを開いたディスクリプタであれば帯域を消費する。
+
+    with SlowRemote(remote_dir, latency_ms=5, bandwidth_mbps=100):
+        ...
+"""
+from pathlib import Path
+import builtins
+import threading
+import shutil
+import errno
+import time
+import io
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Linux の FICLONE（reflink）
+FICLONE = 0x40049409
+
+
+class Bandwidth:
+    """
+    全スレッドで共有する帯域（バイト/秒）
+    """
+
+    def __init__(self, bytes_per_sec: float):
+        self.bytes_per_sec = bytes_per_sec
+        self._lock = threading.Lock()
+        self._available_at = time.perf_counter()
+
+    def consume(self, size: int):
+        if self.bytes_per_sec <= 0 or size <= 0:
+            return
+        with self._lock:
+            now = time.perf_counter()
+            start = max(now, self._available_at)
+            self._available_at = start + size / self.bytes_per_sec
+            wait = self._available_at - now
+        time.sleep(wait)
+
+
+class SlowFile:
+    """
+    読み書きのたびに帯域を消費するファイルラッパー
+    """
+
+    def __init__(self, f, bandwidth: Bandwidth, on_close=None):
+        self._f = f
+        self._bandwidth = bandwidth
+        self._on_close = on_close
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._bandwidth.consume(len(data))
+        return data
+
+    def readinto(self, b):
+        n = self._f.readinto(b)
+        self._bandwidth.consume(n or 0)
+        return n
+
+    def write(self, b):
+        n = self._f.write(b)
+        self._bandwidth.consume(n or 0)
+        return n
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close(self._f)
+        return self._f.close()
+
+    def __enter__(self):
+        self._f.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        if self._on_close is not None:
+            self._on_close(self._f)
+        return self._f.__exit__(*args)
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+
+class SlowRemote:
+    """
+    root 以下のパスへの操作を遅くするコンテキストマネージャ
+    """
+
+    # パスを第1引数に取る関数（遅延のみ）
+    PATH_FUNCS = ['scandir', 'stat', 'lstat', 'mkdir', 'remove', 'unlink', 'rmdir', 'utime', 'chmod', 'link']
+    # パスを2つ取る関数
+    PAIR_FUNCS = ['rename', 'replace']
+
+    def __init__(self, root: Path, latency_ms: float = 5.0, bandwidth_mbps: float = 100.0):
+        self.root = str(Path(root).resolve())
+        self.latency = latency_ms / 1000
+        self.bandwidth = Bandwidth(bandwidth_mbps * 10**6 / 8)
+        self.ops = 0
+        self._ops_lock = threading.Lock()
+        # リモートのファイルを開いているディスクリプタ
+        self._remote_fds: set[int] = set()
+        self._originals: list[tuple[object, str, object]] = []
+
+    def is_remote(self, path_) -> bool:
+        if isinstance(path_, int):
+            return False
+        try:
+            return os.path.abspath(os.fspath(path_)).startswith(self.root)
+        except TypeError:
+            return False
+
+    def _delay(self):
+        with self._ops_lock:
+            self.ops += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _wrap_path_func(self, func):
+        def wrapper(path_, *args, **kwargs):
+            if self.is_remote(path_):
+                self._delay()
+            return func(path_, *args, **kwargs)
+        return wrapper
+
+    def _wrap_pair_func(self, func):
+        def wrapper(src, dst, *args, **kwargs):
+            if self.is_remote(src) or self.is_remote(dst):
+                self._delay()
+            return func(src, dst, *args, **kwargs)
+        return wrapper
+
+    def _wrap_open(self, func):
+        def wrapper(file, *args, **kwargs):
+            f = func(file, *args, **kwargs)
+            if self.is_remote(file):
+                self._delay()
+                self._track_file(f)
+                return SlowFile(f, self.bandwidth, on_close=self._untrack_file)
+            return f
+        return wrapper
+
+    def _track_file(self, f):
+        try:
+            self._remote_fds.add(f.fileno())
+        except (AttributeError, OSError, ValueError):
+            pass
+
+    def _untrack_file(self, f):
+        try:
+            self._remote_fds.discard(f.fileno())
+        except (AttributeError, OSError, ValueError):
+            pass
+
+    def _has_remote_fd(self, *fds) -> bool:
+        return any(fd in self._remote_fds for fd in fds)
+
+    def _wrap_os_open(self, func):
+        def wrapper(path_, *args, **kwargs):
+            fd = func(path_, *args, **kwargs)
+            if self.is_remote(path_):
+                self._delay()
+                self._remote_fds.add(fd)
+            return fd
+        return wrapper
+
+    def _wrap_os_close(self, func):
+        def wrapper(fd):
+            self._remote_fds.discard(fd)
+            return func(fd)
+        return wrapper
+
+    def _wrap_fd_read(self, func):
+        # os.read は読み込んだデータ、os.readv は読み込んだバイト数を返す
+        def wrapper(fd, *args, **kwargs):
+            result = func(fd, *args, **kwargs)
+            if self._has_remote_fd(fd):
+                self.bandwidth.consume(result if isinstance(result, int) else len(result))
+            return result
+        return wrapper
+
+    def _wrap_fd_write(self, func):
+        def wrapper(fd, *args, **kwargs):
+            n = func(fd, *args, **kwargs)
+            if self._has_remote_fd(fd):
+                self.bandwidth.consume(n)
+            return n
+        return wrapper
+
+    def _wrap_fd_pair_func(self, func):
+        # ローカルとリモートの間のカーネル内コピーは、転送したバイト数だけ帯域を消費する
+        # リモート内のコピーはサーバー側で行われるため、遅延のみとする
+        def wrapper(fd1, fd2, *args, **kwargs):
+            n = func(fd1, fd2, *args, **kwargs)
+            remote1, remote2 = self._has_remote_fd(fd1), self._has_remote_fd(fd2)
+            if remote1 and remote2:
+                self._delay()
+            elif remote1 or remote2:
+                self.bandwidth.consume(n)
+            return n
+        return wrapper
+
+    def _wrap_ioctl(self, func):
+        # ローカルとリモートの間の reflink は実際の NAS と同じく使えないものとする
+        def wrapper(fd, request, *args, **kwargs):
+            if request == FICLONE and args and isinstance(args[0], int):
+                if self._has_remote_fd(fd) != self._has_remote_fd(args[0]):
+                    raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+                if self._has_remote_fd(fd):
+                    self._delay()
+            return func(fd, request, *args, **kwargs)
+        return wrapper
+
+    def _patch(self, owner, name: str, wrapper):
+        original = getattr(owner, name)
+        self._originals.append((owner, name, original))
+        setattr(owner, name, wrapper(original))
+
+    def __enter__(self):
+        for name in self.PATH_FUNCS:
+            self._patch(os, name, self._wrap_path_func)
+        for name in self.PAIR_FUNCS:
+            self._patch(os, name, self._wrap_pair_func)
+        self._patch(builtins, 'open', self._wrap_open)
+        self._patch(io, 'open', self._wrap_open)
+        self._patch(os, 'open', self._wrap_os_open)
+        self._patch(os, 'close', self._wrap_os_close)
+        self._patch(os, 'read', self._wrap_fd_read)
+        self._patch(os, 'write', self._wrap_fd_write)
+        if hasattr(os, 'readv'):
+            self._patch(os, 'readv', self._wrap_fd_read)
+        # copy_file_range(src, dst, ...) と sendfile(dst, src, ...)
+        if hasattr(os, 'copy_file_range'):
+            self._patch(os, 'copy_file_range', self._wrap_fd_pair_func)
+        if hasattr(os, 'sendfile'):
+            self._patch(os, 'sendfile', self._wrap_fd_pair_func)
+        if fcntl is not None:
+            self._patch(fcntl, 'ioctl', self._wrap_ioctl)
+        # カーネル内コピーを無効化し、データがラッパーを経由するようにする
+        for name in ('_USE_CP_SENDFILE', '_USE_CP_COPY_FILE_RANGE', '_HAS_FCOPYFILE'):
+            if hasattr(shutil, name):
+                self._patch(shutil, name, lambda original: False)
+        return self
+
+    def __exit__(self, *args):
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals.clear()
+        self._remote_fds.clear()
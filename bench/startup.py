@@ -0,0 +1,80 @@
+"""
+起動から最初の同期完了までの時間を計測するベンチマーク
+
+    uv run bench/startup.py --folders 20 --files 50 --repeat 5
+
+一時フォルダにローカル・リモートと設定ファイルを用意し、
+`app.py daemon --once` を別プロセスで起動して終了までの時間を計測する。
+--console を指定すると、比較用にコンソール関連モジュールの読み込み時間も計測する。
+"""
+from pathlib import Path
+import argparse
+import statistics
+import subprocess
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+import yaml
+
+
+repo_dir = Path(__file__).resolve().parent.parent
+
+
+def prepare(work_dir: Path, folders: int, files: int):
+    local_dir = work_dir / 'local'
+    remote_dir = work_dir / 'remote'
+    for i in range(folders):
+        folder = local_dir / f'project{i:03d}'
+        folder.mkdir(parents=True)
+        for j in range(files):
+            (folder / f'file{j:04d}.bin').write_bytes(os.urandom(1024))
+    remote_dir.mkdir()
+    # 設定ファイルは作業フォルダからの相対パスで読み込まれる
+    (work_dir / 'config').mkdir()
+    preferences = {'LocalDirectory': str(local_dir), 'RemoteDirectory': str(remote_dir)}
+    (work_dir / 'config' / 'preferences.yaml').write_text(
+        '!Preferences\n' + yaml.safe_dump(preferences), encoding='utf8'
+    )
+
+
+def measure(command: list[str], cwd: Path) -> float:
+    started = time.perf_counter()
+    subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--folders', type=int, default=10)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--console', action='store_true', help='also measure importing the console modules')
+    args = parser.parse_args()
+
+    env_python = sys.executable
+    results: dict[str, list[float]] = {'first sync (cold)': [], 'first sync (no change)': []}
+    if args.console:
+        results['console import'] = []
+    for _ in range(args.repeat):
+        work_dir = Path(tempfile.mkdtemp(prefix='fxcc-bench-'))
+        try:
+            prepare(work_dir, args.folders, args.files)
+            daemon = [env_python, str(repo_dir / 'app.py'), 'daemon', '--once']
+            results['first sync (cold)'].append(measure(daemon, work_dir))
+            results['first sync (no change)'].append(measure(daemon, work_dir))
+            if args.console:
+                console = [env_python, '-c', f'import sys; sys.path.insert(0, {str(repo_dir)!r}); import ui.console, ui.tray']
+                results['console import'].append(measure(console, work_dir))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f'{args.folders} folders x {args.files} files, {args.repeat} runs')
+    for name, times in results.items():
+        print(f'{name:>24}: median {statistics.median(times) * 1000:8.1f} ms  (min {min(times) * 1000:.1f} / max {max(times) * 1000:.1f})')
+
+
+if __name__ == '__main__':
+    main()
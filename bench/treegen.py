@@ -0,0 +1,86 @@
+"""
+ベンチマーク用のフォルダツリー生成
+
+    uv run bench/treegen.py out_dir --profile many-small --folders 4
+
+プロファイル（ファイル数・サイズ分布・階層の深さ）を指定して、
+同期フォルダを含むローカルルートを生成する。
+"""
+from pathlib import Path
+import argparse
+import random
+import os
+
+
+# ファイル数、サイズ範囲（バイト）、階層の深さ、1フォルダあたりのファイル数
+PROFILES: dict[str, dict] = {
+    'many-small': dict(files=2000, min_size=1 * 2**10, max_size=64 * 2**10, depth=3, files_per_dir=50),
+    'few-large': dict(files=8, min_size=32 * 2**20, max_size=128 * 2**20, depth=1, files_per_dir=8),
+    'mixed': dict(files=500, min_size=1 * 2**10, max_size=8 * 2**20, depth=2, files_per_dir=40),
+}
+
+
+def random_size(rng: random.Random, min_size: int, max_size: int) -> int:
+    # 対数一様分布（小さいファイルが多く、大きいファイルが少ない）
+    return int(min_size * (max_size / min_size) ** rng.random())
+
+
+def write_file(path_: Path, size: int, rng: random.Random):
+    # 乱数生成のコストを抑えるため、ランダムなブロックを繰り返して書き込む
+    block = rng.randbytes(min(size, 2**20))
+    with open(path_, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def generate_folder(folder: Path, files: int, min_size: int, max_size: int, depth: int, files_per_dir: int, seed: int = 0) -> int:
+    """
+    同期フォルダ1つ分のツリーを生成し、合計バイト数を返す
+    """
+    rng = random.Random(seed)
+    total = 0
+    for i in range(files):
+        # ファイル番号から配置するサブフォルダを決める
+        dir_index = i // files_per_dir
+        parts = [f'd{(dir_index // files_per_dir**level) % files_per_dir:02d}' for level in range(depth - 1)]
+        parent = folder.joinpath(*parts)
+        parent.mkdir(parents=True, exist_ok=True)
+        size = random_size(rng, min_size, max_size)
+        write_file(parent / f'f{i:06d}.bin', size, rng)
+        total += size
+    return total
+
+
+def generate_root(root: Path, profile: str, folders: int, seed: int = 0) -> int:
+    """
+    プロファイルに従って同期フォルダを folders 個生成し、合計バイト数を返す
+    """
+    spec = PROFILES[profile]
+    total = 0
+    for i in range(folders):
+        total += generate_folder(root / f'{profile}-{i:03d}', seed=seed + i, **spec)
+    return total
+
+
+def list_files(root: Path) -> list[Path]:
+    files: list[Path] = []
+    for dirpath, _, filenames in os.walk(root):
+        files.extend(Path(dirpath) / name for name in filenames if not name.startswith('._fxcc'))
+    return sorted(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir', type=Path)
+    parser.add_argument('--profile', choices=PROFILES.keys(), default='mixed')
+    parser.add_argument('--folders', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    total = generate_root(args.out_dir, args.profile, args.folders, args.seed)
+    print(f'{args.out_dir}: {len(list_files(args.out_dir))} files, {total / 2**20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,121 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, field_validator, model_validator
+from datetime import datetime, time
 import yaml
 from pathlib import Path
-import os
-import ctypes
-import shutil
+
+from core.fsutil import unhide_file
 
 
 # 定数
 sync_dir_ext = '._fxcc_sync'
 root_dir_ext = '._fxcc_root'
+manifest_ext = '._fxcc_manifest'
+signatures_ext = '._fxcc_signatures'
+restore_marker_ext = '._fxcc_restoring'
+temp_file_ext = '.fxcc_tmp'
+partial_file_ext = '.fxcc_part'
+journal_file_ext = '.fxcc_journal'
+snapshot_index_ext = '._fxcc_snapshot'
+# リモートフォルダ直下のスナップショットの保存先（"." で始まるため同期フォルダとしては扱われない）
+snapshot_dir_name = '.fxcc_snapshots'
+snapshot_name_format = '%Y%m%d-%H%M%S'
+# 小さなファイルをまとめた束の保存先（同期先フォルダ内）
+bundle_dir_name = '._fxcc_bundles'
+bundle_index_name = 'index.json'
+bundle_ext = '.tar'
+# 転送途中の一時ファイル（走査対象外とし、不要になれば削除する）
+transfer_temp_exts: tuple[str, ...] = (temp_file_ext, partial_file_ext, journal_file_ext)
+# ミラーリング対象外の管理ファイル（同期ファイルは同期処理の最後に個別にコピーする）
+mirror_excludes: set[str] = {sync_dir_ext, manifest_ext, signatures_ext, restore_marker_ext, snapshot_index_ext, bundle_dir_name}
 cache_dir: Path = Path("cache")
-if cache_dir.exists():
-    shutil.rmtree(cache_dir)
-os.makedirs(cache_dir, exist_ok=True)
+state_db_path: Path = cache_dir / "state.sqlite3"
+# 旧形式（YAML）のルートフォルダ情報（起動時にデータベースへ移行する）
 local_dump_filename: Path = cache_dir / f"local{root_dir_ext}"
 remote_dump_filename: Path = cache_dir / f"remote{root_dir_ext}"
+default_pair_name: str = 'default'
 console_refresh_interval_sec: int = 15
+console_page_size: int = 50
+console_history_size: int = 20
+restore_refresh_interval_sec: int = 1
+run_state_refresh_interval_sec: int = 2
+metrics_history_size: int = 50
+metrics_path: str = '/metrics'
 preferences_path: Path = Path('config') / 'preferences.yaml'
+mtime_tolerance_ns: int = 2 * 10**9
+delta_block_size: int = 2**20
+resume_chunk_size: int = 8 * 2**20
+# 高速コピーの1回あたりの転送サイズ（ネットワーク上のコピー先は往復回数を減らすため大きくする）
+fastcopy_local_chunk_size: int = 4 * 2**20
+fastcopy_network_chunk_size: int = 16 * 2**20
+# 帯域制限の調整（遅延が基準の何倍で減速するか、最小倍率、調整間隔）
+throttle_latency_spike_ratio: float = 3.0
+throttle_min_backoff: float = 0.05
+throttle_adjust_interval_sec: float = 1.0
+# 整合性チェックの読み込み単位
+scrub_chunk_size: int = 2**20
+# 同期順の優先度の重み（priority.priority_score）
+priority_weights: dict[str, float] = {'recency': 4.0, 'staleness': 1.0, 'size': 1.0, 'aging': 2.0}
+
+# 時間帯ごとの帯域制限
+class ThrottleWindow(BaseModel):
+    """
+    時間帯ごとの転送速度・ファイル操作数の上限（0 は無制限）
+    """
+
+    Start: str = '09:00'
+    End: str = '18:00'
+    Weekdays: list[int] = [0, 1, 2, 3, 4]
+    MBps: float = 0
+    OpsPerSec: float = 0
+
+    @field_validator('Start', 'End')
+    @classmethod
+    def validate_time(cls, value: str) -> str:
+        time.fromisoformat(value)
+        return value
+
+    def contains(self, now: datetime) -> bool:
+        start = time.fromisoformat(self.Start)
+        end = time.fromisoformat(self.End)
+        current = now.time()
+        if start <= end:
+            return now.weekday() in self.Weekdays and start <= current < end
+        # 日付をまたぐ時間帯（開始日の曜日で判定）
+        if current >= start:
+            return now.weekday() in self.Weekdays
+        return (now.weekday() - 1) % 7 in self.Weekdays and current < end
+
+# 同期するフォルダの組
+class SyncPair(BaseModel):
+    """
+    ローカルフォルダとリモートフォルダの組（未設定の項目は全体の設定を使う）
+    """
+
+    Name: str = default_pair_name
+    LocalDirectory: Path | None = None
+    RemoteDirectory: Path | None = None
+    SyncFreqMinutes: int | None = None
+    HoldAfterCreatedDays: int | None = None
+    HoldAfterModifiedDays: int | None = None
+    LocalQuotaGB: float | None = None
+
+    def get(self, name: str):
+        value = getattr(self, name)
+        return getattr(preferences, name) if value is None else value
+
+    def has_root_dirs(self) -> bool:
+        return bool(
+            self.LocalDirectory
+            and self.RemoteDirectory
+            and self.LocalDirectory.exists()
+            and self.RemoteDirectory.exists()
+        )
+
+    def contains(self, path_: Path) -> bool:
+        return any(
+            root is not None and Path(path_).is_relative_to(root)
+            for root in (self.LocalDirectory, self.RemoteDirectory)
+        )
 
 # ユーザー設定
 class Preferences(BaseModel):
@@ -30,14 +129,55 @@ class Preferences(BaseModel):
     HoldAfterCreatedDays: int = 15
     HoldAfterModifiedDays: int = 8
     ServerPort: int = 28541
+    TransferEngine: str = 'native'
+    TransferWorkers: int = 8
+    ManifestFullScanHours: int = 24
+    SyncWorkers: int = 4
+    MaxSyncsPerRemote: int = 2
+    DeltaThresholdMB: int = 64
+    DeltaPatchInPlace: bool = False
+    ResumableThresholdMB: int = 256
+    LocalQuotaGB: float = 0
+    EvictHighWatermarkPercent: int = 90
+    EvictLowWatermarkPercent: int = 75
+    EvictGraceMinutes: int = 120
+    RestoreOrder: str = 'recent'
+    ThrottleMBps: float = 0
+    ThrottleOpsPerSec: float = 0
+    ThrottleWindows: list[ThrottleWindow] = []
+    AdaptiveThrottle: bool = True
+    SyncDeadlineMinutes: int = 60
+    WatchMode: bool = False
+    WatchDebounceSeconds: int = 10
+    SafetyScanMinutes: int = 180
+    ScrubEnabled: bool = True
+    ScrubMBps: float = 50
+    ScrubBudgetMB: int = 1024
+    ScrubIntervalMinutes: int = 60
+    ScrubIdleHours: int = 24
+    ScrubSamplePercent: float = 2
+    SnapshotMode: bool = False
+    SnapshotKeepCount: int = 10
+    SnapshotKeepDays: int = 30
+    BundleSmallFiles: bool = False
+    BundleMaxFileKB: int = 256
+    BundleTargetMB: int = 64
+    BundleRepackPercent: int = 50
+    SyncPairs: list[SyncPair] = []
+
 
+    @model_validator(mode='after')
+    def migrate_root_dirs(self):
+        # 旧形式（フォルダの組が1つ）の設定を既定の組として移行する
+        if not self.SyncPairs and (self.LocalDirectory or self.RemoteDirectory):
+            self.SyncPairs = [SyncPair(LocalDirectory=self.LocalDirectory, RemoteDirectory=self.RemoteDirectory)]
+            self.LocalDirectory = None
+            self.RemoteDirectory = None
+        return self
 
     def dump(self) -> str:
         # 隠しファイル属性を解除
-        FILE_ATTRIBUTE_HIDDEN = 0x2
-        attrs = ctypes.windll.kernel32.GetFileAttributesW(str(preferences_path))
-        if attrs & FILE_ATTRIBUTE_HIDDEN:
-            ctypes.windll.kernel32.SetFileAttributesW(str(preferences_path), attrs & ~FILE_ATTRIBUTE_HIDDEN)
+        unhide_file(preferences_path)
         # 書き込み
         preferences_path.write_text(yaml.dump(self, allow_unicode=True), encoding='utf8')
 
@@ -59,9 +199,20 @@ else:
     preferences.dump()
 
 def has_root_dirs():
-    return (
-        preferences.LocalDirectory
-        and preferences.RemoteDirectory
-        and preferences.LocalDirectory.exists()
-        and preferences.RemoteDirectory.exists()
-    )
\ No newline at end of file
+    return any(pair.has_root_dirs() for pair in preferences.SyncPairs)
+
+def get_pair(name: str) -> SyncPair | None:
+    return next((pair for pair in preferences.SyncPairs if pair.Name == name), None)
+
+def pair_for(path_: Path) -> SyncPair | None:
+    """
+    パス（ルートフォルダ、または同期フォルダ）が属する組
+    """
+    return next((pair for pair in preferences.SyncPairs if pair.contains(path_)), None)
+
+def setting_for(path_: Path, name: str):
+    """
+    パスが属する組の設定（組が見つからなければ全体の設定）
+    """
+    pair = pair_for(path_)
+    return pair.get(name) if pair is not None else getattr(preferences, name)
@@ -0,0 +1,187 @@
+from __future__ import annotations
+from pydantic import BaseModel, PrivateAttr
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Iterable
+import threading
+import tarfile
+import ulid
+import os
+
+from config import settings
+from config.settings import preferences
+from core.manifest import FileStat
+from core.throttle import throttle
+
+
+class BundleEntry(BaseModel):
+    """
+    束に格納したファイルの位置
+    """
+
+    bundle: str
+    offset: int
+    size: int
+    mtime_ns: int
+
+
+class BundleIndex(BaseModel):
+    """
+    同期先フォルダ内の小さなファイルを格納した束（tar 形式）の索引
+    同期先では束ねたファイルも個別のファイルと同じように扱う（走査・復元・整合性チェック）
+    """
+
+    entries: dict[str, BundleEntry] = {}
+    # 束ごとの格納ファイル数
+    bundles: dict[str, int] = {}
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _dirty: bool = PrivateAttr(default=False)
+
+    @staticmethod
+    def dir_for(root: Path) -> Path:
+        return root / settings.bundle_dir_name
+
+    @classmethod
+    def load(cls, root: Path) -> BundleIndex:
+        filename = cls.dir_for(root) / settings.bundle_index_name
+        try:
+            return cls.model_validate_json(filename.read_text(encoding='utf8'))
+        except FileNotFoundError:
+            return cls()
+
+    def dump(self, root: Path, force: bool = False):
+        if not self._dirty and not force:
+            return
+        folder = self.dir_for(root)
+        os.makedirs(folder, exist_ok=True)
+        tmp = folder / f'{settings.bundle_index_name}{settings.temp_file_ext}'
+        with self._lock:
+            tmp.write_text(self.model_dump_json(), encoding='utf8')
+            self._dirty = False
+        os.replace(tmp, folder / settings.bundle_index_name)
+
+    def stats(self) -> dict[str, FileStat]:
+        return {rel: FileStat(e.size, e.mtime_ns) for rel, e in self.entries.items()}
+
+    def add(self, name: str, entries: dict[str, BundleEntry]):
+        with self._lock:
+            self.entries.update(entries)
+            self.bundles[name] = len(entries)
+            self._dirty = True
+
+    def discard(self, rel: str) -> bool:
+        with self._lock:
+            if self.entries.pop(rel, None) is None:
+                return False
+            self._dirty = True
+            return True
+
+    def move(self, old: str, new: str) -> bool:
+        with self._lock:
+            entry = self.entries.pop(old, None)
+            if entry is None:
+                return False
+            self.entries[new] = entry
+            self._dirty = True
+            return True
+
+    def sparse_bundles(self, exclude: Iterable[str] = ()) -> set[str]:
+        """
+        格納したファイルの多くが削除・更新された束（残りを新しい束へ詰め直す）
+        exclude はこれから削除・更新するファイル
+        """
+        exclude = set(exclude)
+        live = Counter(e.bundle for rel, e in self.entries.items() if rel not in exclude)
+        ratio = preferences.BundleRepackPercent / 100
+        return {name for name, total in self.bundles.items() if 0 < live[name] < total * ratio}
+
+    def collect_garbage(self, root: Path) -> list[str]:
+        """
+        格納したファイルがすべて不要になった束と、索引にない束（書き込み途中で中断したもの）を削除する
+        """
+        live = {e.bundle for e in self.entries.values()}
+        removed: list[str] = []
+        with self._lock:
+            for name in [name for name in self.bundles if name not in live]:
+                del self.bundles[name]
+                removed.append(name)
+            if removed:
+                self._dirty = True
+            keep = {f'{name}{settings.bundle_ext}' for name in self.bundles} | {settings.bundle_index_name}
+        folder = self.dir_for(root)
+        if folder.is_dir():
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.name not in keep and not entry.name.startswith(settings.bundle_index_name):
+                        os.remove(entry.path)
+        return removed
+
+
+def write_bundle(src: Path, dst: Path, rels: Iterable[str]) -> tuple[str, dict[str, BundleEntry]]:
+    """
+    小さなファイルをまとめて1つの束として同期先へ書き込む（ファイルごとの作成・クローズの往復をなくす）
+    戻り値は (束の名前, 格納したファイルの位置)（見つからないファイルは格納しない）
+    """
+    folder = BundleIndex.dir_for(dst)
+    os.makedirs(folder, exist_ok=True)
+    name = str(ulid.ULID())
+    tmp = folder / f'{name}{settings.bundle_ext}{settings.temp_file_ext}'
+    entries: dict[str, BundleEntry] = {}
+    with throttle.measure():
+        fdst = open(tmp, 'wb', buffering=settings.fastcopy_network_chunk_size)
+    with fdst, tarfile.open(fileobj=fdst, mode='w', format=tarfile.PAX_FORMAT) as tar:
+        for rel in rels:
+            try:
+                fsrc = open(src / rel, 'rb')
+            except FileNotFoundError:
+                # 走査後に削除された
+                continue
+            with fsrc:
+                st = os.fstat(fsrc.fileno())
+                info = tarfile.TarInfo(rel)
+                info.size = st.st_size
+                info.mtime = st.st_mtime_ns / 10**9
+                info.mode = 0o644
+                throttle.acquire_bytes(st.st_size)
+                tar.addfile(info, fsrc)
+            # データの位置（ヘッダの後、512バイト単位で埋められる）
+            padded = -(-st.st_size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            entries[rel] = BundleEntry(bundle=name, offset=tar.offset - padded, size=st.st_size, mtime_ns=st.st_mtime_ns)
+    os.replace(tmp, folder / f'{name}{settings.bundle_ext}')
+    return name, entries
+
+
+def bundle_path(root: Path, name: str) -> Path:
+    return BundleIndex.dir_for(root) / f'{name}{settings.bundle_ext}'
+
+
+def extract_bundle(root: Path, name: str, items: list[tuple[str, BundleEntry]], dst: Path, on_chunk: Callable[[int], None] | None = None, on_file: Callable[[str], None] | None = None):
+    """
+    束から指定したファイルを取り出す（束は先頭から順に1回だけ読み込む）
+    """
+    with throttle.measure():
+        fsrc = open(bundle_path(root, name), 'rb', buffering=settings.fastcopy_network_chunk_size)
+    with fsrc:
+        for rel, entry in sorted(items, key=lambda item: item[1].offset):
+            fsrc.seek(entry.offset)
+            remaining = entry.size
+            # 一時ファイルへ書き出してから置き換える（中断しても既存のファイルを途中の内容にしない）
+            tmp = dst / f'{rel}{settings.temp_file_ext}'
+            try:
+                with open(tmp, 'wb') as fdst:
+                    while remaining > 0:
+                        chunk = fsrc.read(min(remaining, settings.fastcopy_local_chunk_size))
+                        if not chunk:
+                            raise OSError(f'bundle is truncated: {name}')
+                        throttle.acquire_bytes(len(chunk))
+                        fdst.write(chunk)
+                        remaining -= len(chunk)
+                        if on_chunk is not None:
+                            on_chunk(len(chunk))
+                os.utime(tmp, ns=(entry.mtime_ns, entry.mtime_ns))
+                os.replace(tmp, dst / rel)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+            if on_file is not None:
+                on_file(rel)
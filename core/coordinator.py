@@ -0,0 +1,138 @@
+from __future__ import annotations
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Callable
+import threading
+
+from core.metrics import RunMetrics, registry
+
+
+class RunState(BaseModel):
+    """
+    コンソールに表示する組ごとの同期の実行状態
+    """
+
+    pair: str
+    status: str = 'idle'    # 'idle' | 'running' | 'cancelling'
+    trigger: str = ''
+    started_at: datetime | None = None
+    # 実行中に受け付け、次の1回にまとめた要求の数
+    pending: int = 0
+    folders: int = 0
+    copied_files: int = 0
+    copied_bytes: int = 0
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (datetime.now() - self.started_at).total_seconds()
+
+
+class SyncCoordinator:
+    """
+    組ごとに同期を1つだけ実行する
+    実行中に届いた要求（定期実行・変更監視・手動同期）は、完了後の1回の同期にまとめる
+    """
+
+    def __init__(self, pair_name: str):
+        self.pair_name = pair_name
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.running = False
+        self.trigger = ''
+        self.run: RunMetrics | None = None
+        # 次の同期の対象（None はすべてのフォルダ）
+        self.pending: list[str] = []
+        self.pending_ids: set[str] | None = set()
+
+    def request(self, target: Callable[[str, set[str] | None, RunMetrics, threading.Event], None], ids: set[str] | None = None, trigger: str = 'manual') -> bool:
+        """
+        同期を実行する（実行中なら次の同期に予約して、すぐに False を返す）
+        予約した同期も呼び出し元のスレッドで続けて実行する
+        """
+        with self.lock:
+            if self.running:
+                self.pending_ids = None if ids is None or self.pending_ids is None else self.pending_ids | ids
+                self.pending.append(trigger)
+                return False
+            self.running = True
+            self.trigger = trigger
+        while True:
+            self._run_once(target, ids)
+            with self.lock:
+                if not self.pending:
+                    self.running = False
+                    self.run = None
+                    return True
+                ids = self.pending_ids
+                self.trigger = f'coalesced ({", ".join(sorted(set(self.pending)))})'
+                self.pending = []
+                self.pending_ids = set()
+
+    def _run_once(self, target: Callable[[str, set[str] | None, RunMetrics, threading.Event], None], ids: set[str] | None):
+        self.cancel_event.clear()
+        run = registry.start_run(self.pair_name)
+        with self.lock:
+            self.run = run
+        try:
+            target(self.pair_name, ids, run, self.cancel_event)
+        except Exception as e:
+            registry.finish_run(run, 'failed')
+            print(f'\n[{self.pair_name}] Sync failed\n{e}')
+            return
+        registry.finish_run(run, 'cancelled' if self.cancel_event.is_set() else 'completed')
+        print(f'[{self.pair_name}] {run.status.capitalize()}: {run.summary()}')
+
+    def cancel(self) -> bool:
+        """
+        実行中の同期を中断し、予約された同期を取り消す（コピー中のファイルは完了させる）
+        """
+        with self.lock:
+            self.pending = []
+            self.pending_ids = set()
+            if not self.running:
+                return False
+            self.cancel_event.set()
+            return True
+
+    def state(self) -> RunState:
+        with self.lock:
+            state = RunState(pair=self.pair_name, pending=len(self.pending))
+            if not self.running:
+                return state
+            state.status = 'cancelling' if self.cancel_event.is_set() else 'running'
+            state.trigger = self.trigger
+            run = self.run
+        if run is not None:
+            state.started_at = run.started_at
+            state.folders = len(run.folders)
+            state.copied_files = run.copied_files
+            state.copied_bytes = run.copied_bytes
+        return state
+
+
+_coordinators: dict[str, SyncCoordinator] = {}
+_coordinators_lock = threading.Lock()
+
+
+def get(pair_name: str) -> SyncCoordinator:
+    with _coordinators_lock:
+        coordinator = _coordinators.get(pair_name)
+        if coordinator is None:
+            coordinator = _coordinators[pair_name] = SyncCoordinator(pair_name)
+        return coordinator
+
+
+def cancel(pair_name: str) -> bool:
+    return get(pair_name).cancel()
+
+
+def is_running(pair_name: str) -> bool:
+    with _coordinators_lock:
+        coordinator = _coordinators.get(pair_name)
+    return coordinator is not None and coordinator.running
+
+
+def states(pair_names: list[str]) -> list[RunState]:
+    return [get(name).state() for name in pair_names]
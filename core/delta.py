@@ -0,0 +1,176 @@
+from __future__ import annotations
+from pydantic import BaseModel, PrivateAttr
+from pathlib import Path
+import threading
+import hashlib
+import shutil
+import errno
+import zlib
+import os
+
+from config import settings
+from config.settings import preferences
+from core.fsutil import unhide_file
+from core.manifest import FileStat, same_file_stat
+from core.throttle import throttle
+from core import fastcopy
+
+
+class FileSignature(BaseModel):
+    """
+    同期先ファイルのブロック単位のチェックサム
+    """
+
+    size: int
+    mtime_ns: int
+    block_size: int
+    weak: list[int] = []
+    strong: list[str] = []
+
+
+class SignatureStore(BaseModel):
+    """
+    同期フォルダ内の大きなファイルのシグネチャ一覧
+    同期先を読み直さずに差分を求めるため、ローカルに保持する
+    """
+
+    files: dict[str, FileSignature] = {}
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _dirty: bool = PrivateAttr(default=False)
+
+
+    def get(self, rel: str, dst_stat: FileStat) -> FileSignature | None:
+        with self._lock:
+            signature = self.files.get(rel)
+        # 同期先が外部で変更されていれば使用しない
+        if signature is None or not same_file_stat(FileStat(signature.size, signature.mtime_ns), dst_stat):
+            return None
+        return signature
+
+    def put(self, rel: str, signature: FileSignature):
+        with self._lock:
+            self.files[rel] = signature
+            self._dirty = True
+
+    def move(self, old: str, new: str):
+        with self._lock:
+            signature = self.files.pop(old, None)
+            if signature is not None:
+                self.files[new] = signature
+                self._dirty = True
+
+    def discard(self, rel: str):
+        with self._lock:
+            if self.files.pop(rel, None) is not None:
+                self._dirty = True
+
+    def dump(self, filename: Path):
+        if not self._dirty:
+            return
+        # 隠しファイル属性を解除
+        unhide_file(filename)
+        # 書き込み
+        with self._lock:
+            filename.write_text(self.model_dump_json(), encoding='utf8')
+            self._dirty = False
+
+    @classmethod
+    def load(cls, filename: Path) -> SignatureStore:
+        if filename.exists():
+            try:
+                return cls.model_validate_json(filename.read_text(encoding='utf8'))
+            except ValueError:
+                pass
+        return cls()
+
+
+def weak_checksum(block: bytes) -> int:
+    return zlib.adler32(block)
+
+
+def strong_checksum(block: bytes) -> str:
+    return hashlib.blake2b(block, digest_size=16).hexdigest()
+
+
+def compute_signature(path_: Path, block_size: int = settings.delta_block_size) -> FileSignature:
+    st = os.stat(path_)
+    signature = FileSignature(size=st.st_size, mtime_ns=st.st_mtime_ns, block_size=block_size)
+    with open(path_, 'rb') as f:
+        while block := f.read(block_size):
+            signature.weak.append(weak_checksum(block))
+            signature.strong.append(strong_checksum(block))
+    return signature
+
+
+def delta_copy(src: Path, dst: Path, signature: FileSignature | None) -> tuple[int, FileSignature]:
+    """
+    src の内容で dst を更新する（変更のあったブロックのみ書き込む）
+    同期先は読み込まず、ローカルに保持したシグネチャと比較する
+    - 同期先でファイルを複製できれば（reflink・サーバー側コピー）、複製に変更のあったブロックを書き込んで dst と置き換える
+    - 複製できなければ全体を一時ファイルへコピーして置き換える（読み込み中の同期先が書き換え途中の内容にならない）
+    - DeltaPatchInPlace を有効にした場合のみ、複製できなければ dst に直接書き込む（記録を残し、中断しても続きから再開する）
+    - スナップショットからハードリンクされたファイルは書き換えず、全体をコピーする
+    戻り値は (転送したバイト数（複製した分は含まない）, 更新後のシグネチャ)
+    """
+    # resume は delta を参照するため遅延インポート
+    from core import resume
+    journal = resume.load_patch_journal(src, dst)
+    if journal is not None:
+        return resume.patch_in_place(src, dst, journal)
+    if signature is None:
+        raise ValueError(f'signature is required: {dst}')
+    tmp = dst.with_name(f'{dst.name}{settings.temp_file_ext}')
+    try:
+        fastcopy.copy_file(dst, tmp, methods=fastcopy.CLONE_METHODS)
+    except OSError as e:
+        tmp.unlink(missing_ok=True)
+        if e.errno != errno.ENOTSUP:
+            raise
+        if preferences.DeltaPatchInPlace and os.stat(dst).st_nlink == 1:
+            return resume.patch_in_place(src, dst, resume.TransferJournal.for_patch(src, signature))
+        return resume.resumable_copy(src, dst), compute_signature(src)
+    try:
+        written, new_signature = patch_blocks(src, tmp, signature)
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return written, new_signature
+
+
+def patch_blocks(src: Path, dst: Path, signature: FileSignature, start: int = 0, on_write=None) -> tuple[int, FileSignature]:
+    """
+    src のブロックのうち、signature と一致しないものだけを dst の同じ位置に書き込む
+    start より前のブロックは書き込み済みとみなす（チェックサムのみ計算する）
+    on_write は書き込んだブロックごとに (ブロック番号, チェックサム一覧) で呼ばれる
+    """
+    block_size = signature.block_size
+    st = os.stat(src)
+    new_signature = FileSignature(size=st.st_size, mtime_ns=st.st_mtime_ns, block_size=block_size)
+    written = 0
+    with open(src, 'rb') as fsrc, open(dst, 'r+b') as fdst:
+        index = 0
+        while block := fsrc.read(block_size):
+            weak = weak_checksum(block)
+            strong = strong_checksum(block)
+            new_signature.weak.append(weak)
+            new_signature.strong.append(strong)
+            # 同じ位置のブロックが一致すれば書き込み不要（弱いチェックサムで先に絞り込む）
+            matched = index < start or (
+                index < len(signature.weak)
+                and signature.weak[index] == weak
+                and signature.strong[index] == strong
+            )
+            if not matched:
+                throttle.acquire_bytes(len(block))
+                fdst.seek(index * block_size)
+                fdst.write(block)
+                written += len(block)
+                if on_write is not None:
+                    fdst.flush()
+                    os.fsync(fdst.fileno())
+                    on_write(index, new_signature.strong)
+            index += 1
+        fdst.truncate(fsrc.tell())
+    return written, new_signature
@@ -1,22 +1,29 @@
 from __future__ import annotations
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, PrivateAttr, field_validator
+from typing import ClassVar, Iterable
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta, time
 import ulid
 from pathlib import Path
-from glob import glob
 import yaml
 import os
-import subprocess
 import shutil
-import ctypes
-from win11toast import toast
-import io
-from contextlib import redirect_stdout
+import threading
 import copy
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from config import settings
 from config.settings import preferences
+from core.fsutil import unhide_file
+from core.notify import toast
+from core.transfer import get_backend
+from core import workers, eviction, priority, scrub, snapshot
+from core.state import store, import_yaml_root
+from core.metrics import FolderMetrics, RunMetrics, phase
+from core.manifest import Manifest, TreeScan
+
+# libyaml が利用できれば高速な C 実装のローダーを使う
+yaml_loader = getattr(yaml, 'CLoader', yaml.Loader)
 
 
 class SyncDirectory(BaseModel):
@@ -31,35 +38,83 @@ class SyncDirectory(BaseModel):
     synced_at: datetime = created_at
     modify_log: str = ''
     locked: bool = False
+    size_bytes: int = 0
+    verified_at: datetime | None = None
+    # 同期ごとに変わる項目（これらの変更のみでは同期ファイルを書き換えない）
+    volatile_fields: ClassVar[set[str]] = {'path_', 'synced_at', 'verified_at'}
+    # 最後に読み込んだ・書き込んだ同期ファイルの内容（不明なら None）
+    _saved: str | None = PrivateAttr(default=None)
     @property
     def be_removed_at(self) -> datetime:
         created_at = datetime.combine(self.created_at.date(), time.min)
         modified_at = datetime.combine(self.modified_at.date(), time.min)
-        after_create = created_at + timedelta(days=preferences.HoldAfterCreatedDays)
-        after_modify = modified_at + timedelta(days=preferences.HoldAfterModifiedDays)
+        # 保持期間は同期フォルダが属する組の設定を使う
+        after_create = created_at + timedelta(days=settings.setting_for(self.path_, 'HoldAfterCreatedDays'))
+        after_modify = modified_at + timedelta(days=settings.setting_for(self.path_, 'HoldAfterModifiedDays'))
         removed_at = max(after_create, after_modify) + timedelta(days=1)
         return removed_at
 
+    @property
+    def is_verified(self) -> bool:
+        # 最後の同期がエラーなく完了していれば、リモートはローカルと一致している
+        return self.verified_at is not None and self.verified_at >= self.synced_at
+
+    @property
+    def restoring(self) -> bool:
+        return (self.path_ / settings.restore_marker_ext).exists()
+
+    @property
+    def is_dirty(self) -> bool:
+        return self._saved is None or self._saved != self.fingerprint()
+
+    def fingerprint(self) -> str:
+        return self.model_dump_json(exclude=self.volatile_fields)
+
+    def mark_saved(self):
+        self._saved = self.fingerprint()
+
 
     def copy(self):
         return copy.copy(self)
 
-    def dump(self) -> str:
+    def dump(self) -> bool:
+        """
+        同期ファイルを書き込む（内容に変更がなければ書き込まず False を返す）
+        """
+        if not self.is_dirty:
+            return False
         filename = self.path_ / settings.sync_dir_ext
         # 隠しファイル属性を解除
-        FILE_ATTRIBUTE_HIDDEN = 0x2
-        attrs = ctypes.windll.kernel32.GetFileAttributesW(str(filename))
-        if attrs & FILE_ATTRIBUTE_HIDDEN:
-            ctypes.windll.kernel32.SetFileAttributesW(str(filename), attrs & ~FILE_ATTRIBUTE_HIDDEN)
+        unhide_file(filename)
         # 書き込み
         filename.write_text(yaml.dump(self, allow_unicode=True), encoding='utf8')
+        self.mark_saved()
+        return True
+
+    def as_remote(self, dst: SyncDirectory) -> SyncDirectory:
+        """
+        同期後のリモートの状態（ローカルの同期ファイルをコピーした状態）
+        書き込み済みかどうかは、リモートから読み込んだ時点の内容と比較して判定する
+        """
+        sync_remote = self.model_copy(update={'path_': dst.path_})
+        sync_remote._saved = dst._saved
+        return sync_remote
 
-    def sync(self, dst: SyncDirectory):
+    def sync(self, dst: SyncDirectory, run: RunMetrics | None = None, cancel_event: threading.Event | None = None, src_scan: TreeScan | None = None):
         now = datetime.now()
         logs: list[str] = []
+        metrics = FolderMetrics(name=self.path_.stem)
+        if run is not None:
+            run.add_folder(metrics)
         if dst.locked:
             # ロックされているフォルダなら中断
             print(f'\nLocked Remote: {dst.path_.stem}\nSync skipped')
+            metrics.skipped = True
+            return
+        if self.restoring:
+            # リモートからの復元が完了していなければ中断
+            print(f'\nRestoring: {self.path_.stem}\nSync skipped')
+            metrics.skipped = True
             return
         if dst.path_.stem != self.path_.stem:
             # ローカルに合わせてリモートフォルダをリネーム
@@ -70,52 +125,86 @@ class SyncDirectory(BaseModel):
             print(f'\n{log}')
             logs.append(log)
             self.modified_at = now
-        # 同期確認
+        # 同期実行
         self.synced_at = now
-        command: list = [
-            "robocopy",
-            self.path_,
-            dst.path_,
-            "/MIR",   # ミラーリング
-            "/L",     # 実行せずに出力だけ
-            "/NP",    # 進行状況バー非表示
-            "/NDL",   # ディレクトリ一覧非表示
-            "/NS",    # ファイルサイズを表示しない
-            # "/NC",    # クラス（例：新規ファイルなど）を表示しない
-            "/NJH",   # ジョブヘッダを表示しない（開始時の情報）
-            "/NJS",   # ジョブサマリを表示しない（統計情報）
-        ]
         print(f'\nSync: {self.path_.stem}')
-        result = subprocess.run(command, capture_output=True, text=True, shell=True)
-        if result.returncode > 7:
+        result = get_backend().mirror(self.path_, dst.path_, self.path_ / settings.manifest_ext, cancel_event, src_scan)
+        for name, seconds in result.timings.items():
+            metrics.timings[name] = metrics.timings.get(name, 0.0) + seconds
+        metrics.copied_files = result.copied_files
+        metrics.copied_bytes = result.copied_bytes
+        metrics.moved_files = result.moved_files
+        metrics.removed_files = result.removed_files
+        metrics.error = result.error
+        self.size_bytes = result.src_bytes if result.src_bytes is not None else eviction.folder_size(self.path_)
+        if not result.error and not result.cancelled:
+            self.verified_at = now
+            # 変更があればリモートのスナップショットを作成する（初回は変更がなくても作成する）
+            if preferences.SnapshotMode and (result.changed or not snapshot.has_snapshot(dst.path_.parent, self.id_)):
+                try:
+                    with phase(metrics.timings, 'snapshot'):
+                        created = snapshot.create_snapshot(dst.path_, self.id_, self.path_ / settings.manifest_ext, now)
+                    if created is not None:
+                        print(f'Snapshot: {created.snapshot} ({created.added_bytes / 2**20:.1f} MiB added)')
+                except OSError as e:
+                    print(f'\nSnapshot failed: {self.path_.stem}\n{e}')
+        if result.error:
             print('Error')
-        elif result.returncode == 0:
+            if result.log:
+                print(result.log)
+        elif result.cancelled:
+            print('Cancelled')
+            if result.log:
+                print(result.log)
+                logs.append(f'Sync (cancelled): {self.path_.stem}\n{result.log}')
+        elif not result.changed:
             print('No change')
-        elif result.returncode:
-            # ミラーリング実行
-            copy_command = [c for c in command if c != '/L']
-            result = subprocess.run(copy_command, capture_output=True, text=True, shell=True)
-            log = result.stdout[1:-1].replace(' ', '').replace('\t', ' ')
-            print(log)
+        else:
+            print(result.log)
             # 結果更新
-            logs.append(f'Sync: {self.path_.stem}\n{log}')
+            logs.append(f'Sync: {self.path_.stem}\n{result.log}')
             self.modified_at = now
         # 同期ログ出力
         if logs:
             self.modify_log = '\n\n'.join(logs)
-        self.dump()
-        shutil.copy2(self.path_ / settings.sync_dir_ext, dst.path_ / settings.sync_dir_ext)
-        sync_remote = SyncDirectory.create(dst.path_)
-        # 削除チェック
+        with phase(metrics.timings, 'metadata'):
+            # 変更がなければ書き込まない（リモートへは実行の最後にまとめて書き込む）
+            self.dump()
+            sync_remote = self.as_remote(dst)
+        # 削除チェック（容量を設定している場合は全フォルダの同期後にまとめて判定する）
+        if eviction.quota_enabled(self.path_) or result.cancelled:
+            return sync_remote
         print(f'Be removed at: {self.be_removed_at:%Y-%m-%d %H:%M}')
         print(f'Now: {now:%Y-%m-%d %H:%M}')
         if (now > self.be_removed_at):
-            # リモートをロックして自身を削除
-            sync_remote.locked = True
-            sync_remote.dump()
-            self.remove()
+            with phase(metrics.timings, 'remove'):
+                if not self.verify_remote(sync_remote):
+                    return sync_remote
+                self.release(sync_remote)
             print(f"Remove local: {self.path_.stem}")
         return sync_remote
+
+    def verify_remote(self, sync_remote: SyncDirectory) -> bool:
+        """
+        ローカルを削除する前に、リモートの全ファイルの内容が一致することを確認する
+        マニフェストがない場合（robocopy）は、最後の同期がエラーなく完了したかで判断する
+        """
+        manifest = Manifest.load(self.path_ / settings.manifest_ext)
+        if manifest is None or manifest.dst != str(sync_remote.path_):
+            if not self.is_verified:
+                print(f'\nVerification failed: {self.path_.stem} (last sync did not complete)\nRemoval postponed')
+            return self.is_verified
+        with workers.folder_lock(self.id_):
+            result = scrub.scrub_folder(self.path_, sync_remote.path_)
+        if not result.ok:
+            print(f'\nVerification failed: {self.path_.stem} ({result.summary()})\nRemoval postponed')
+        return result.ok
+
+    def release(self, sync_remote: SyncDirectory):
+        # リモートをロックして自身を削除
+        sync_remote.locked = True
+        sync_remote.dump()
+        self.remove()
     
     def lock(self):
         self.locked = True
@@ -126,8 +215,10 @@ class SyncDirectory(BaseModel):
     def remove(self):
         shutil.rmtree(self.path_)
     
-    def download(self, root_local: LocalRootDirectory):
-        shutil.copy(self.path_, root_local.path_ / self.path_)
+    def download(self, root_local: LocalRootDirectory, snapshot_path: Path | None = None):
+        # バックグラウンドで復元する（restore は dirsync を参照するため遅延インポート）
+        from core import restore
+        return restore.start(self, root_local.path_, snapshot_path)
 
     
     @classmethod
@@ -139,13 +230,14 @@ class SyncDirectory(BaseModel):
             if anew_id:
                 # フォルダ生成先がすでに存在する
                 raise FileExistsError()
-            instance: SyncDirectory = yaml.load(filename.read_text(encoding='utf8'), Loader=yaml.Loader)
+            instance: SyncDirectory = yaml.load(filename.read_text(encoding='utf8'), Loader=yaml_loader)
             instance.path_ = path_
         else:
             if not anew_id:
                 anew_id = str(ulid.ULID())
             instance = cls(path_=path_, id_=anew_id)
             filename.write_text(yaml.dump(instance, allow_unicode=True), encoding='utf8')
+        instance.mark_saved()
         return instance
 
 
@@ -154,26 +246,77 @@ class RootDirectory(BaseModel, ABC):
     ローカルまたはリモートフォルダの状態を保持するクラス
     """
 
+    kind: ClassVar[str]
+    cache_metadata: ClassVar[bool] = False
     path_: Path | None
     sync_directories: list[SyncDirectory] = []
 
 
     def check(self):
-        dirs = [Path(p) for p in glob(str(self.path_ / '*') + '\\')]
-        for dir in dirs:
-            sdir = SyncDirectory.create(path_=dir)
+        # リモートは前回から変更のないフォルダの同期ファイルを読み込まない
+        cache = store.load_folder_cache(self.side) if self.cache_metadata else {}
+        new_cache: dict[str, tuple[tuple[int, int, int], str]] = {}
+        for entry in self.list_dirs():
+            dir = Path(entry.path)
+            key = folder_cache_key(dir, entry.stat().st_mtime_ns)
+            cached = cache.get(entry.path)
+            if cached is not None and cached[0] == key:
+                sdir = SyncDirectory.model_validate_json(cached[1])
+                sdir.path_ = dir
+                sdir.mark_saved()
+                data = cached[1]
+            else:
+                sdir = SyncDirectory.create(path_=dir)
+                # 同期ファイルを作成した場合はフォルダの更新日時も変わる
+                key = folder_cache_key(dir, os.stat(dir).st_mtime_ns)
+                data = sdir.model_dump_json()
+            new_cache[entry.path] = (key, data)
             self.sync_directories.append(sdir)
             print(f'{dir.stem}: {sdir.id_} (recent modify: {sdir.modified_at:%Y-%m-%d %H:%M:%S})')
+        if self.cache_metadata and new_cache != cache:
+            store.save_folder_cache(self.side, new_cache)
+        self.restore_volatile_fields()
+
+    def restore_volatile_fields(self):
+        """
+        同期ファイルには変更時にしか書き込まない項目（同期日時など）を、前回保存した状態から引き継ぐ
+        """
+        saved = store.load_root(self.side, type(self))
+        if saved is None:
+            return
+        saved_dirs = {d.id_: d for d in saved.sync_directories}
+        for sdir in self.sync_directories:
+            previous = saved_dirs.get(sdir.id_)
+            if previous is None:
+                continue
+            for name in SyncDirectory.volatile_fields - {'path_'}:
+                value = getattr(previous, name)
+                current = getattr(sdir, name)
+                if value is not None and (current is None or value > current):
+                    setattr(sdir, name, value)
+
+    def list_dirs(self) -> list[os.DirEntry]:
+        # 隠しフォルダ（"." で始まる名前）は対象外
+        with os.scandir(self.path_) as it:
+            return [entry for entry in it if not entry.name.startswith('.') and entry.is_dir()]
     
 
-    def dump(self, filename: Path) -> str:
-        # 隠しファイル属性を解除
-        FILE_ATTRIBUTE_HIDDEN = 0x2
-        attrs = ctypes.windll.kernel32.GetFileAttributesW(str(filename))
-        if attrs & FILE_ATTRIBUTE_HIDDEN:
-            ctypes.windll.kernel32.SetFileAttributesW(str(filename), attrs & ~FILE_ATTRIBUTE_HIDDEN)
-        # 書き込み
-        filename.write_text(yaml.dump(self, allow_unicode=True), encoding='utf8')
+    @classmethod
+    def side_for(cls, pair_name: str) -> str:
+        # データベース上の区分（既定の組は従来どおり 'local' / 'remote'）
+        return cls.kind if pair_name == settings.default_pair_name else f'{cls.kind}:{pair_name}'
+
+    @property
+    def side(self) -> str:
+        pair = settings.pair_for(self.path_) if self.path_ is not None else None
+        return self.side_for(pair.Name if pair is not None else settings.default_pair_name)
+
+    def dump(self):
+        store.save_root(self.side, self)
+
+    @classmethod
+    def load(cls, pair_name: str = settings.default_pair_name) -> RootDirectory | None:
+        return store.load_root(cls.side_for(pair_name), cls)
 
 
 class LocalRootDirectory(RootDirectory):
@@ -181,12 +324,10 @@ class LocalRootDirectory(RootDirectory):
     ローカルフォルダ
     """
 
+    kind = 'local'
 
-    def dump(self):
-        return super().dump(settings.local_dump_filename)
-    
 
-    def sync(self, remote_root: RemoteRootDirectory):
+    def sync(self, remote_root: RemoteRootDirectory, ids: set[str] | None = None, run: RunMetrics | None = None, cancel_event: threading.Event | None = None):
         # フォルダのリネーム
         local_dir_dict: dict[str, SyncDirectory] = {d.id_: d for d in self.sync_directories}
         remote_dir_dict: dict[str, SyncDirectory] = {d.id_: d for d in remote_root.sync_directories}
@@ -199,32 +340,139 @@ class LocalRootDirectory(RootDirectory):
                     remote_dir = SyncDirectory.create(remote_root.path_ / local_dir.path_.stem, local_dir.id_)
                     remote_root.sync_directories.append(remote_dir)
                 except FileExistsError as e:
-                    buffer = io.StringIO()
-                    with redirect_stdout(buffer):
-                        toast(
-                            'Conflict on remote', 
-                            'A folder with the same name already exists in the remote.', 
-                        )
-                    captured_output = buffer.getvalue()
+                    toast(
+                        'Conflict on remote', 
+                        'A folder with the same name already exists in the remote.', 
+                    )
                     return
                 remote_dir_dict[remote_dir.id_] = remote_dir
         print('\n'.join([f'{local_dir.path_.stem} - {remote_dir_dict[id_].path_.stem}' for id_, local_dir in local_dir_dict.items()]))
-        # 同期開始
-        for local_dir in self.sync_directories.copy():
-            remote_dir = remote_dir_dict[local_dir.id_]
-            local_dir.locked = False
-            remote_dir = local_dir.sync(remote_dir)
-            # 削除チェック
-            if not local_dir.path_.exists():
-                self.sync_directories = [dir_ for dir_ in self.sync_directories if dir_ != local_dir]
-                remote_root.sync_directories = [remote_dir if dir_.id_ == remote_dir.id_ else dir_ for dir_ in remote_root.sync_directories]
-            # 同期済みフォルダをリモート一覧から削除
-            del remote_dir_dict[local_dir.id_]
+        # 同期開始（フォルダ単位で並列実行、優先度の高いものから投入する）
+        pool = workers.folder_pool()
+        futures: dict[str, Future] = {}
+        synced_remotes: dict[str, SyncDirectory] = {}
+        # フォルダの同期（同期ファイルの書き込み・容量による削除・保存は別のフェーズとして計測する）
+        with phase(run.timings if run else None, 'transfer'):
+            targets = [d for d in self.sync_directories if ids is None or d.id_ in ids]
+            # 優先度はローカルの走査とマニフェストから見積もる（走査はフォルダ単位で並列に行い、同期で再利用する）
+            # 走査結果を使わない転送バックエンド（robocopy）では、前回の同期で記録した値から求める
+            pending: dict[str, priority.PendingWork] = {}
+            if get_backend().accepts_scan:
+                pending = dict(zip((d.id_ for d in targets), pool.map(priority.estimate, targets)))
+            for local_dir in priority.by_priority(targets, pending=pending):
+                local_dir.locked = False
+                src_scan = pending[local_dir.id_].scan if local_dir.id_ in pending else None
+                futures[local_dir.id_] = pool.submit(
+                    self._sync_pair, local_dir, remote_dir_dict[local_dir.id_], remote_root.path_, run, cancel_event, src_scan
+                )
+            # 結果の反映は全フォルダの完了後にまとめて行う
+            for local_dir in self.sync_directories.copy():
+                if local_dir.id_ in futures:
+                    try:
+                        remote_dir = futures[local_dir.id_].result()
+                    except Exception as e:
+                        print(f'\nSync failed: {local_dir.path_.stem}\n{e}')
+                        remote_dir = None
+                    if remote_dir is not None:
+                        synced_remotes[local_dir.id_] = remote_dir
+                    # 今回の同期で変更があればログを記録
+                    if local_dir.modify_log and local_dir.modified_at == local_dir.synced_at:
+                        store.add_log(run.run_id if run else None, local_dir.id_, local_dir.modify_log)
+                    # 削除チェック
+                    if remote_dir is not None and not local_dir.path_.exists():
+                        self.sync_directories = [dir_ for dir_ in self.sync_directories if dir_ != local_dir]
+                        remote_root.sync_directories = [remote_dir if dir_.id_ == remote_dir.id_ else dir_ for dir_ in remote_root.sync_directories]
+                # 同期済みフォルダをリモート一覧から削除
+                del remote_dir_dict[local_dir.id_]
+        # リモートの同期ファイルは、内容の変わったものだけをまとめて書き込む
+        with phase(run.timings if run else None, 'metadata'):
+            self.upload_metadata(pool, synced_remotes.values())
+        # 中断した場合は同期済みの状態のみ保存する
+        cancelled = cancel_event is not None and cancel_event.is_set()
+        # 容量に応じたローカルフォルダの削除
+        if eviction.quota_enabled(self.path_) and not cancelled:
+            with phase(run.timings if run else None, 'evict'):
+                self.evict(remote_root, synced_remotes, ids)
         # ローカルから同期のなかったリモートをロック
         for remote_dir in remote_dir_dict.values():
             remote_dir.locked = True
-        self.dump()
-        remote_root.dump()
+        with phase(run.timings if run else None, 'dump'):
+            self.dump()
+            remote_root.dump()
+
+    @staticmethod
+    def upload_metadata(pool: ThreadPoolExecutor, remote_dirs: Iterable[SyncDirectory]):
+        futures = {remote_dir.path_: pool.submit(remote_dir.dump) for remote_dir in remote_dirs if remote_dir.is_dirty}
+        for path_, future in futures.items():
+            try:
+                future.result()
+            except OSError as e:
+                print(f'\nMetadata upload failed: {path_.stem}\n{e}')
+
+    def evict(self, remote_root: RemoteRootDirectory, synced_remotes: dict[str, SyncDirectory], ids: set[str] | None = None):
+        """
+        容量が不足していれば、リモートへの同期を確認できたフォルダから長く更新されていない大きなものを削除する
+        今回同期していないフォルダも対象とする（変更を検知した同期では、同期したフォルダ自体は作業中のため削除しない）
+        今回同期していないフォルダは、マニフェストで同期後にローカルが変更されていないことを確認できるもののみ
+        """
+        remote_dirs = {d.id_: d for d in remote_root.sync_directories}
+        remote_dirs.update(synced_remotes)
+        candidates = [
+            d.id_ for d in self.sync_directories
+            if d.id_ in remote_dirs and not remote_dirs[d.id_].locked
+            and (d.id_ in synced_remotes or (d.path_ / settings.manifest_ext).exists())
+        ]
+        # 確認できなかったフォルダは除き、容量が下限を下回るまで1つずつ選び直す
+        skipped: set[str] = set()
+        while True:
+            evicted = eviction.select_evictions(
+                self.path_, self.sync_directories, [id_ for id_ in candidates if id_ not in skipped], protected=ids or ()
+            )
+            if not evicted:
+                break
+            local_dir = evicted[0]
+            remote_dir = remote_dirs[local_dir.id_]
+            if not local_dir.verify_remote(remote_dir):
+                skipped.add(local_dir.id_)
+                continue
+            try:
+                local_dir.release(remote_dir)
+            except OSError as e:
+                print(f'\nEvict failed: {local_dir.path_.stem}\n{e}')
+                skipped.add(local_dir.id_)
+                continue
+            print(f'Evict local: {local_dir.path_.stem} ({local_dir.size_bytes / 2**20:.1f} MiB)')
+            self.sync_directories = [dir_ for dir_ in self.sync_directories if dir_.id_ != local_dir.id_]
+            remote_root.sync_directories = [remote_dir if dir_.id_ == remote_dir.id_ else dir_ for dir_ in remote_root.sync_directories]
+
+    def scrub(self, remote_root: RemoteRootDirectory):
+        """
+        リモートの整合性チェック（同期とは別のバックグラウンド処理として定期的に実行する）
+        未確認のファイルを確認し、しばらく更新されていないフォルダは確認済みのファイルも一部を読み直す
+        1回に読み込む量は ScrubBudgetMB まで
+        """
+        now = datetime.now()
+        budget = scrub.ScrubBudget(preferences.ScrubBudgetMB * 2**20)
+        remote_dirs = {d.id_: d for d in remote_root.sync_directories}
+        for local_dir in self.sync_directories:
+            remote_dir = remote_dirs.get(local_dir.id_)
+            if remote_dir is None or remote_dir.locked or not local_dir.path_.exists():
+                continue
+            idle = now - local_dir.modified_at > timedelta(hours=preferences.ScrubIdleHours)
+            with workers.folder_lock(local_dir.id_):
+                result = scrub.scrub_folder(local_dir.path_, remote_dir.path_, budget, sample=idle)
+            if result.checked_files or result.mismatches:
+                print(f'Scrub: {local_dir.path_.stem} ({result.summary()})')
+            if budget.remaining <= 0:
+                break
+
+    @staticmethod
+    def _sync_pair(local_dir: SyncDirectory, remote_dir: SyncDirectory, remote_root_path: Path, run: RunMetrics | None = None, cancel_event: threading.Event | None = None, src_scan: TreeScan | None = None) -> SyncDirectory | None:
+        with workers.remote_slot(remote_root_path), workers.folder_lock(local_dir.id_):
+            # 待機中に中断された場合は開始しない
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            return local_dir.sync(remote_dir, run, cancel_event, src_scan)
 
 
 class RemoteRootDirectory(RootDirectory):
@@ -232,8 +480,19 @@ class RemoteRootDirectory(RootDirectory):
     リモートフォルダ
     """
 
-    def dump(self):
-        return super().dump(settings.remote_dump_filename)
+    kind = 'remote'
+    cache_metadata = True
+
+
+def folder_cache_key(path_: Path, dir_mtime_ns: int) -> tuple[int, int, int]:
+    """
+    フォルダ情報のキャッシュの検証に使う値（フォルダの更新日時、同期ファイルの更新日時とサイズ）
+    """
+    try:
+        st = os.stat(path_ / settings.sync_dir_ext)
+    except FileNotFoundError:
+        return (dir_mtime_ns, 0, -1)
+    return (dir_mtime_ns, st.st_mtime_ns, st.st_size)
 
 
 # シリアライズ処理
@@ -257,9 +516,22 @@ def remote_directory_constructor(loader: yaml.Loader, node: yaml.MappingNode):
 
 yaml.add_representer(SyncDirectory, sync_directory_representer)
 yaml.add_constructor("!SyncDirectory", sync_directory_constructor)
+yaml.add_constructor("!SyncDirectory", sync_directory_constructor, Loader=yaml_loader)
 
 yaml.add_representer(LocalRootDirectory, local_directory_representer)
 yaml.add_constructor("!LocalRootDirectory", local_directory_constructor)
+yaml.add_constructor("!LocalRootDirectory", local_directory_constructor, Loader=yaml_loader)
 
 yaml.add_representer(RemoteRootDirectory, remote_directory_representer)
-yaml.add_constructor("!RemoteRootDirectory", remote_directory_constructor)
\ No newline at end of file
+yaml.add_constructor("!RemoteRootDirectory", remote_directory_constructor)
+yaml.add_constructor("!RemoteRootDirectory", remote_directory_constructor, Loader=yaml_loader)
+
+
+def migrate_legacy_dumps():
+    """
+    旧形式（YAML）で保存されたルートフォルダ情報をデータベースへ移行する
+    """
+    if import_yaml_root(LocalRootDirectory.side_for(settings.default_pair_name), settings.local_dump_filename, yaml_loader):
+        print(f'Migrated: {settings.local_dump_filename}')
+    if import_yaml_root(RemoteRootDirectory.side_for(settings.default_pair_name), settings.remote_dump_filename, yaml_loader):
+        print(f'Migrated: {settings.remote_dump_filename}')
\ No newline at end of file
@@ -0,0 +1,60 @@
+from __future__ import annotations
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+import shutil
+
+from config import settings
+from config.settings import preferences
+from core.manifest import scan_tree
+
+if TYPE_CHECKING:
+    from core.dirsync import SyncDirectory
+
+
+def quota_enabled(path_: Path) -> bool:
+    # 0 の場合は従来どおり日付で削除する
+    return settings.setting_for(path_, 'LocalQuotaGB') > 0
+
+
+def folder_size(path_: Path) -> int:
+    return sum(stat.size for stat in scan_tree(path_).files.values())
+
+
+def local_capacity(root: Path, used: int) -> int:
+    """
+    ローカルフォルダに使用できる容量
+    設定した容量と、ディスクの空き容量（同期フォルダの使用分を含む）の小さい方
+    """
+    quota = int(settings.setting_for(root, 'LocalQuotaGB') * 2**30)
+    return min(quota, used + shutil.disk_usage(root).free)
+
+
+def eviction_score(sync_dir: SyncDirectory, now: datetime) -> float:
+    # 長く更新されていない大きなフォルダほど優先して削除する
+    idle_hours = max((now - sync_dir.modified_at).total_seconds(), 0) / 3600
+    return (idle_hours + 1) * sync_dir.size_bytes
+
+
+def select_evictions(root: Path, folders: list[SyncDirectory], candidates: Iterable[str], now: datetime | None = None, protected: Iterable[str] = ()) -> list[SyncDirectory]:
+    """
+    容量が上限（高水位）を超えていれば、下限（低水位）を下回るまで削除するフォルダを選ぶ
+    削除できるのは、リモートへの同期が完了していることを確認できたフォルダのみ
+    protected（変更を検知して同期したフォルダなど）と、猶予期間（EvictGraceMinutes）内に更新されたフォルダは削除しない
+    """
+    now = now or datetime.now()
+    used = sum(d.size_bytes for d in folders)
+    capacity = local_capacity(root, used)
+    if used <= capacity * preferences.EvictHighWatermarkPercent / 100:
+        return []
+    target = capacity * preferences.EvictLowWatermarkPercent / 100
+    candidates = set(candidates) - set(protected)
+    grace = timedelta(minutes=preferences.EvictGraceMinutes)
+    evictable = [d for d in folders if d.id_ in candidates and d.is_verified and now - d.modified_at >= grace]
+    selected: list[SyncDirectory] = []
+    for sync_dir in sorted(evictable, key=lambda d: eviction_score(d, now), reverse=True):
+        if used <= target:
+            break
+        selected.append(sync_dir)
+        used -= sync_dir.size_bytes
+    return selected
@@ -0,0 +1,253 @@
+from __future__ import annotations
+from contextlib import nullcontext
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Sequence
+import shutil
+import errno
+import os
+
+from config import settings
+from core.throttle import throttle
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Linux の FICLONE（reflink）
+FICLONE = 0x40049409
+# カーネル内コピーが使えない場合のエラー（次の方法で続きからコピーする）
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.ENOTTY}
+NETWORK_FS_TYPES = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'fuse.sshfs', '9p'}
+
+
+class Unsupported(Exception):
+    pass
+
+
+def is_network_path(path_: Path) -> bool:
+    path_ = Path(path_)
+    if os.name == 'nt':
+        anchor = path_.anchor
+        if anchor.startswith('\\\\'):
+            return True
+        return _windows_drive_is_remote(anchor)
+    try:
+        return _posix_device_is_remote(os.stat(path_).st_dev)
+    except OSError:
+        return False
+
+
+@lru_cache(maxsize=None)
+def _windows_drive_is_remote(anchor: str) -> bool:
+    import ctypes
+    # DRIVE_REMOTE = 4（ネットワークドライブ）
+    return ctypes.windll.kernel32.GetDriveTypeW(anchor) == 4
+
+
+@lru_cache(maxsize=None)
+def _posix_device_is_remote(st_dev: int) -> bool:
+    try:
+        with open('/proc/self/mounts', encoding='utf8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3 and fields[2] in NETWORK_FS_TYPES:
+                    try:
+                        if os.stat(fields[1]).st_dev == st_dev:
+                            return True
+                    except OSError:
+                        continue
+    except OSError:
+        pass
+    return False
+
+
+def chunk_size_for(dst: Path) -> int:
+    """
+    コピー先に合わせた1回あたりの転送サイズ
+    ネットワーク上のコピー先は往復回数を減らすため大きくし、ファイルシステムのブロックサイズに揃える
+    """
+    parent = Path(dst).parent
+    size = settings.fastcopy_network_chunk_size if is_network_path(parent) else settings.fastcopy_local_chunk_size
+    try:
+        block = os.statvfs(parent).f_bsize
+    except (AttributeError, OSError):
+        block = 4096
+    return max(block, size // block * block)
+
+
+def _reflink(src_fd: int, dst_fd: int, offset: int, size: int, chunk: int, on_chunk) -> int:
+    if fcntl is None or offset:
+        raise Unsupported()
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError as e:
+        if e.errno in UNSUPPORTED_ERRNOS or e.errno == errno.EPERM:
+            raise Unsupported() from e
+        raise
+    # データは共有されるため転送量の制限は不要
+    if on_chunk is not None:
+        on_chunk(size)
+    return size
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, size: int, chunk: int, on_chunk) -> int:
+    if not hasattr(os, 'copy_file_range'):
+        raise Unsupported()
+    while offset < size:
+        count = min(chunk, size - offset)
+        throttle.acquire_bytes(count)
+        try:
+            sent = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+        except OSError as e:
+            if e.errno in UNSUPPORTED_ERRNOS:
+                raise Unsupported(offset) from e
+            raise
+        if sent == 0:
+            break
+        offset += sent
+        if on_chunk is not None:
+            on_chunk(sent)
+    return offset
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, size: int, chunk: int, on_chunk) -> int:
+    if not hasattr(os, 'sendfile') or os.name == 'nt':
+        raise Unsupported()
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while offset < size:
+        count = min(chunk, size - offset)
+        throttle.acquire_bytes(count)
+        try:
+            sent = os.sendfile(dst_fd, src_fd, offset, count)
+        except OSError as e:
+            if e.errno in UNSUPPORTED_ERRNOS:
+                raise Unsupported(offset) from e
+            raise
+        if sent == 0:
+            break
+        offset += sent
+        if on_chunk is not None:
+            on_chunk(sent)
+    return offset
+
+
+def _buffered(src_fd: int, dst_fd: int, offset: int, size: int, chunk: int, on_chunk) -> int:
+    # バッファを使い回し、チャンクごとのメモリ確保をなくす
+    buffer = bytearray(chunk)
+    view = memoryview(buffer)
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while True:
+        n = os.readv(src_fd, [buffer]) if hasattr(os, 'readv') else _readinto(src_fd, buffer)
+        if n == 0:
+            break
+        throttle.acquire_bytes(n)
+        written = 0
+        while written < n:
+            written += os.write(dst_fd, view[written:n])
+        _drop_cache(src_fd, offset, n)
+        offset += n
+        if on_chunk is not None:
+            on_chunk(n)
+    return offset
+
+
+def _readinto(fd: int, buffer: bytearray) -> int:
+    data = os.read(fd, len(buffer))
+    buffer[:len(data)] = data
+    return len(data)
+
+
+def _advise_sequential(fd: int):
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def _drop_cache(fd: int, offset: int, length: int):
+    # 読み終えた範囲はページキャッシュから外す（大きなファイルで作業中のキャッシュを追い出さない）
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+
+METHODS: dict[str, Callable] = {
+    'reflink': _reflink,
+    'copy_file_range': _copy_file_range,
+    'sendfile': _sendfile,
+    'buffered': _buffered,
+}
+
+
+# 同期先のファイルを、データを転送せずに複製する方法（reflink・サーバー側コピー）
+CLONE_METHODS: tuple[str, ...] = ('reflink', 'copy_file_range')
+
+
+def _measure(remote: bool):
+    # リモート側の操作のみ応答時間として計測する（ローカルの操作は減速の判断に含めない）
+    return throttle.measure() if remote else nullcontext()
+
+
+def copy_file(src: Path, dst: Path, on_chunk: Callable[[int], None] | None = None, methods: Sequence[str] | None = None, chunk_size: int | None = None, remote_src: bool = False) -> str:
+    """
+    src を dst へコピーし、使用した方法を返す
+    reflink → copy_file_range → sendfile → バッファ経由の順に、使えるものを使う（途中で使えなくなった場合は続きから次の方法で続ける）
+    on_chunk は転送したバイト数ごとに呼ばれる（例外を送出するとコピーを中断する）
+    remote_src はリモートからローカルへのコピー（復元）を表す（既定ではコピー先がリモート）
+    """
+    chunk = chunk_size or chunk_size_for(dst)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+    # リモート側のファイルを開く時間を応答時間として計測する
+    with _measure(remote_src):
+        fsrc = open(src, 'rb')
+    with fsrc:
+        src_fd = fsrc.fileno()
+        size = os.fstat(src_fd).st_size
+        _advise_sequential(src_fd)
+        with _measure(not remote_src):
+            dst_fd = os.open(dst, flags, 0o666)
+        try:
+            offset = 0
+            used = 'buffered'
+            for name in methods or METHODS.keys():
+                try:
+                    offset = METHODS[name](src_fd, dst_fd, offset, size, chunk, on_chunk)
+                    used = name
+                    break
+                except Unsupported as e:
+                    if e.args:
+                        offset = e.args[0]
+            else:
+                raise OSError(errno.ENOTSUP, f'no copy method available: {methods}')
+            # コピー中にサイズが変わった場合は残りをバッファ経由でコピーする
+            if used != 'reflink':
+                offset = _buffered(src_fd, dst_fd, offset, size, chunk, on_chunk)
+            os.ftruncate(dst_fd, offset)
+        finally:
+            os.close(dst_fd)
+    shutil.copystat(src, dst)
+    return used
+
+
+def replace_file(src: Path, dst: Path, on_chunk: Callable[[int], None] | None = None, remote_src: bool = False) -> str:
+    """
+    dst を直接書き換えず、一時ファイルへコピーしてから置き換える
+    同期先のファイルはスナップショットからハードリンクされるため、既存のファイルの内容は変更しない
+    """
+    dst = Path(dst)
+    tmp = dst.with_name(f'{dst.name}{settings.temp_file_ext}')
+    try:
+        used = copy_file(src, tmp, on_chunk, remote_src=remote_src)
+        with _measure(not remote_src):
+            os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return used
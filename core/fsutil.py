@@ -0,0 +1,17 @@
+import os
+import ctypes
+from pathlib import Path
+
+
+FILE_ATTRIBUTE_HIDDEN = 0x2
+
+
+def unhide_file(filename: Path):
+    """
+    隠しファイル属性を解除する（Windows以外では何もしない）
+    """
+    if os.name != 'nt':
+        return
+    attrs = ctypes.windll.kernel32.GetFileAttributesW(str(filename))
+    if attrs & FILE_ATTRIBUTE_HIDDEN:
+        ctypes.windll.kernel32.SetFileAttributesW(str(filename), attrs & ~FILE_ATTRIBUTE_HIDDEN)
@@ -0,0 +1,140 @@
+from __future__ import annotations
+from pydantic import BaseModel
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
+import os
+
+from config import settings
+from config.settings import preferences
+from core.fsutil import unhide_file
+
+
+class FileStat(NamedTuple):
+    size: int
+    mtime_ns: int
+    file_id: int = 0
+
+
+class TreeScan(NamedTuple):
+    files: dict[str, FileStat]
+    dirs: set[str]
+    # 転送途中の一時ファイル
+    partials: frozenset[str] | set[str] = frozenset()
+    # ローカルの走査結果をそのまま記録したもの（マニフェスト）であり、更新日時は正確
+    exact: bool = False
+
+
+def same_file_stat(a: FileStat, b: FileStat, exact: bool = False) -> bool:
+    if exact:
+        # 記録したローカルの状態との比較（同じサイズの書き換えも検出する）
+        return a.size == b.size and a.mtime_ns == b.mtime_ns
+    # NAS側のタイムスタンプ精度に合わせて許容誤差を設ける（robocopy /FFT 相当）
+    return a.size == b.size and abs(a.mtime_ns - b.mtime_ns) <= settings.mtime_tolerance_ns
+
+
+def scan_tree(root: Path, with_file_id: bool = False) -> TreeScan:
+    """
+    フォルダ以下のファイル・フォルダを走査する（パスは root からの相対パス、区切りは '/'）
+    """
+    files: dict[str, FileStat] = {}
+    dirs: set[str] = set()
+    partials: set[str] = set()
+    if not root.exists():
+        return TreeScan(files, dirs, partials)
+    stack: list[tuple[str, str]] = [(str(root), '')]
+    while stack:
+        abs_dir, rel_dir = stack.pop()
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                if entry.name in settings.mirror_excludes:
+                    continue
+                rel = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+                if entry.name.endswith(settings.transfer_temp_exts):
+                    partials.add(rel)
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.add(rel)
+                    stack.append((entry.path, rel))
+                else:
+                    st = entry.stat(follow_symlinks=False)
+                    file_id = entry.inode() if with_file_id else 0
+                    files[rel] = FileStat(st.st_size, st.st_mtime_ns, file_id)
+    return TreeScan(files, dirs, partials)
+
+
+class ManifestEntry(BaseModel):
+    """
+    マニフェストに記録するファイル情報
+    """
+
+    size: int
+    mtime_ns: int
+    file_id: int = 0
+    hash: str | None = None
+    # リモートの内容がハッシュと一致することを最後に確認した日時（core/scrub.py）
+    scrubbed_at: datetime | None = None
+
+
+class Manifest(BaseModel):
+    """
+    前回同期完了時点のファイル一覧
+    同期先の状態とみなし、次回以降は同期先を走査せずに差分を求める
+    """
+
+    dst: str = ''
+    verified_at: datetime = datetime.min
+    entries: dict[str, ManifestEntry] = {}
+    dirs: list[str] = []
+
+
+    def is_valid_for(self, dst: Path) -> bool:
+        # 同期先が変わった、または一定時間両側の走査をしていない場合は無効
+        if self.dst != str(dst):
+            return False
+        return datetime.now() < self.verified_at + timedelta(hours=preferences.ManifestFullScanHours)
+
+    def to_scan(self) -> TreeScan:
+        files = {rel: FileStat(e.size, e.mtime_ns, e.file_id) for rel, e in self.entries.items()}
+        return TreeScan(files, set(self.dirs), exact=True)
+
+    def dump(self, filename: Path):
+        # 隠しファイル属性を解除
+        unhide_file(filename)
+        # 書き込み
+        filename.write_text(self.model_dump_json(), encoding='utf8')
+
+    @classmethod
+    def load(cls, filename: Path) -> Manifest | None:
+        if not filename.exists():
+            return None
+        try:
+            return cls.model_validate_json(filename.read_text(encoding='utf8'))
+        except ValueError:
+            # 壊れたマニフェストは無視して両側を走査し直す
+            return None
+
+    def carry_moves(self, previous: Manifest, moves: dict[str, str]):
+        """
+        移動したファイルのハッシュと検証日時を移動元から引き継ぐ（内容は変わらないため）
+        """
+        for rel, source in moves.items():
+            old = previous.entries.get(source)
+            entry = self.entries.get(rel)
+            if old is not None and entry is not None and (old.size, old.mtime_ns) == (entry.size, entry.mtime_ns):
+                entry.hash = old.hash
+                entry.scrubbed_at = old.scrubbed_at
+
+    @classmethod
+    def from_scan(cls, scan: TreeScan, dst: Path, previous: Manifest | None = None, verified: bool = True) -> Manifest:
+        old_entries = previous.entries if previous else {}
+        entries: dict[str, ManifestEntry] = {}
+        for rel, stat in scan.files.items():
+            old = old_entries.get(rel)
+            # 変更のないファイルはハッシュと検証日時を引き継ぐ
+            if old and (old.size, old.mtime_ns, old.file_id) == tuple(stat):
+                entries[rel] = old.model_copy()
+            else:
+                entries[rel] = ManifestEntry(size=stat.size, mtime_ns=stat.mtime_ns, file_id=stat.file_id)
+        verified_at = datetime.now() if verified or previous is None else previous.verified_at
+        return cls(dst=str(dst), verified_at=verified_at, entries=entries, dirs=sorted(scan.dirs))
@@ -0,0 +1,289 @@
+from __future__ import annotations
+from pydantic import BaseModel, PrivateAttr, ValidationError
+from contextlib import contextmanager
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+import threading
+import time
+
+from config import settings
+from core.state import store
+
+
+@contextmanager
+def phase(timings: dict[str, float] | None, name: str) -> Iterator[None]:
+    """
+    処理時間を timings[name] に加算する（timings が None なら計測しない）
+    """
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+class FolderMetrics(BaseModel):
+    """
+    同期フォルダ1件分の計測結果
+    """
+
+    name: str
+    timings: dict[str, float] = {}
+    copied_files: int = 0
+    copied_bytes: int = 0
+    moved_files: int = 0
+    removed_files: int = 0
+    skipped: bool = False
+    error: bool = False
+
+    @property
+    def bytes_per_sec(self) -> float:
+        seconds = self.timings.get('copy', 0.0)
+        return self.copied_bytes / seconds if seconds else 0.0
+
+
+class RunMetrics(BaseModel):
+    """
+    同期1回分の計測結果
+    """
+
+    run_id: int | None = None
+    pair: str = settings.default_pair_name
+    started_at: datetime
+    finished_at: datetime | None = None
+    status: str = 'running'
+    timings: dict[str, float] = {}
+    folders: list[FolderMetrics] = []
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def add_folder(self, folder: FolderMetrics):
+        with self._lock:
+            self.folders.append(folder)
+
+    @property
+    def duration(self) -> float:
+        if self.finished_at is None:
+            return (datetime.now() - self.started_at).total_seconds()
+        return (self.finished_at - self.started_at).total_seconds()
+
+    @property
+    def copied_files(self) -> int:
+        return sum(f.copied_files for f in self.folders)
+
+    @property
+    def copied_bytes(self) -> int:
+        return sum(f.copied_bytes for f in self.folders)
+
+    @property
+    def moved_files(self) -> int:
+        return sum(f.moved_files for f in self.folders)
+
+    @property
+    def removed_files(self) -> int:
+        return sum(f.removed_files for f in self.folders)
+
+    @property
+    def errors(self) -> int:
+        return sum(1 for f in self.folders if f.error)
+
+    @property
+    def transfer_seconds(self) -> float:
+        # 以前の履歴はフォルダの同期から保存までを 'sync' として記録している
+        return self.timings.get('transfer', self.timings.get('sync', 0.0))
+
+    @property
+    def bytes_per_sec(self) -> float:
+        seconds = self.transfer_seconds
+        return self.copied_bytes / seconds if seconds else 0.0
+
+    def phase_timings(self) -> dict[tuple[str, str], float]:
+        """
+        (範囲, フェーズ) ごとの処理時間
+        範囲 'run' は同期全体のフェーズ（重ならない）、'folder' はフォルダ単位のフェーズの合計（並列に実行したものを含む）
+        """
+        timings = {('run', name): seconds for name, seconds in self.timings.items()}
+        timings.update({('folder', name): seconds for name, seconds in self.folder_timings().items()})
+        return timings
+
+    def folder_timings(self) -> dict[str, float]:
+        """
+        フォルダ単位のフェーズ別処理時間の合計
+        """
+        totals: dict[str, float] = {}
+        for folder in self.folders:
+            for name, seconds in folder.timings.items():
+                totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def summary(self) -> str:
+        phases = ', '.join(f'{k} {v:.2f}s' for k, v in self.timings.items())
+        folder_phases = ', '.join(f'{k} {v:.2f}s' for k, v in self.folder_timings().items())
+        return (
+            f'{len(self.folders)} folders, {self.copied_files} files / {self.copied_bytes / 2**20:.1f} MiB copied, '
+            f'{self.moved_files} moved, {self.removed_files} removed, {self.bytes_per_sec / 2**20:.1f} MiB/s '
+            f'({phases}; folders: {folder_phases})'
+        )
+
+
+class MetricsRegistry:
+    """
+    同期処理の計測結果の集計（直近の履歴と起動後の累計）
+    """
+
+    def __init__(self, history_size: int):
+        self.history: deque[RunMetrics] = deque(maxlen=history_size)
+        self.runs_total: dict[str, int] = {}
+        self.counters: dict[str, float] = {}
+        self.phase_seconds: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def start_run(self, pair: str = settings.default_pair_name) -> RunMetrics:
+        return RunMetrics(run_id=store.start_run(), pair=pair, started_at=datetime.now())
+
+    def finish_run(self, run: RunMetrics, status: str):
+        run.finished_at = datetime.now()
+        run.status = status
+        with self._lock:
+            self.runs_total[status] = self.runs_total.get(status, 0) + 1
+            for name, value in (
+                ('copied_files', run.copied_files),
+                ('copied_bytes', run.copied_bytes),
+                ('moved_files', run.moved_files),
+                ('removed_files', run.removed_files),
+                ('folder_errors', run.errors),
+            ):
+                self.counters[name] = self.counters.get(name, 0) + value
+            for key, seconds in run.phase_timings().items():
+                self.phase_seconds[key] = self.phase_seconds.get(key, 0.0) + seconds
+            self.history.append(run)
+        # 履歴として保存
+        if run.run_id is not None:
+            store.finish_run(run.run_id, status, run.model_dump_json())
+
+    def recent_runs(self) -> list[RunMetrics]:
+        """
+        直近の同期結果（新しい順）
+        起動直後はデータベースに保存された履歴を読み込む
+        """
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                loaded: list[RunMetrics] = []
+                for sync_run in store.recent_runs(self.history.maxlen):
+                    try:
+                        loaded.append(RunMetrics.model_validate_json(sync_run.summary))
+                    except ValidationError:
+                        continue
+                known = {run.run_id for run in self.history}
+                for run in reversed(loaded):
+                    if run.run_id not in known:
+                        self.history.appendleft(run)
+            return sorted(self.history, key=lambda run: run.started_at, reverse=True)
+
+    def throughput(self, pair: str | None = None, runs: int = 10) -> float:
+        """
+        直近の同期で転送があったものの平均転送速度 [bytes/s]（組の履歴がなければ全体から求める）
+        """
+        recent = [run for run in self.recent_runs() if run.status == 'completed' and run.copied_bytes]
+        if pair is not None:
+            recent = [run for run in recent if run.pair == pair] or recent
+        recent = recent[:runs]
+        seconds = sum(run.transfer_seconds for run in recent)
+        return sum(run.copied_bytes for run in recent) / seconds if seconds else 0.0
+
+    def render_prometheus(self) -> str:
+        """
+        Prometheus のテキスト形式で出力
+        """
+        lines: list[str] = []
+
+        def metric(name: str, type_: str, help_: str, samples: list[tuple[dict[str, str], float]]):
+            lines.append(f'# HELP {name} {help_}')
+            lines.append(f'# TYPE {name} {type_}')
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+
+        with self._lock:
+            last = self.history[-1] if self.history else None
+            metric('fxcc_sync_runs_total', 'counter', 'Finished sync runs by status.',
+                   [({'status': k}, v) for k, v in self.runs_total.items()])
+            metric('fxcc_copied_files_total', 'counter', 'Files copied to the destination.',
+                   [({}, self.counters.get('copied_files', 0))])
+            metric('fxcc_copied_bytes_total', 'counter', 'Bytes written to the destination.',
+                   [({}, self.counters.get('copied_bytes', 0))])
+            metric('fxcc_moved_files_total', 'counter', 'Files moved within the destination instead of copied.',
+                   [({}, self.counters.get('moved_files', 0))])
+            metric('fxcc_removed_files_total', 'counter', 'Files removed from the destination.',
+                   [({}, self.counters.get('removed_files', 0))])
+            metric('fxcc_folder_errors_total', 'counter', 'Folders that finished a sync with errors.',
+                   [({}, self.counters.get('folder_errors', 0))])
+            metric('fxcc_phase_seconds_total', 'counter', 'Time spent in each sync phase (scope "run": whole-run phases, "folder": summed per-folder phases).',
+                   [({'scope': scope, 'phase': k}, round(v, 6)) for (scope, k), v in self.phase_seconds.items()])
+            if last is not None:
+                metric('fxcc_last_run_timestamp_seconds', 'gauge', 'Finish time of the last sync run.',
+                       [({}, last.finished_at.timestamp() if last.finished_at else 0)])
+                metric('fxcc_last_run_duration_seconds', 'gauge', 'Duration of the last sync run.',
+                       [({}, round(last.duration, 6))])
+                metric('fxcc_last_run_bytes_per_second', 'gauge', 'Copy throughput of the last sync run.',
+                       [({}, round(last.bytes_per_sec, 3))])
+                metric('fxcc_last_run_phase_seconds', 'gauge', 'Time spent in each phase in the last sync run.',
+                       [({'scope': scope, 'phase': k}, round(v, 6)) for (scope, k), v in last.phase_timings().items()])
+                metric('fxcc_last_run_folder_phase_seconds', 'gauge', 'Time spent in each phase per folder in the last sync run.',
+                       [({'folder': f.name, 'phase': k}, round(v, 6)) for f in last.folders for k, v in f.timings.items()])
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry(settings.metrics_history_size)
+
+
+# --- エンドポイント ---
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def prometheus_route():
+    """
+    コンソール（Gradio）のサーバーに追加する /metrics のルート
+    """
+    from starlette.responses import Response
+    from starlette.routing import Route
+
+    def endpoint(request):
+        return Response(registry.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+    return Route(settings.metrics_path, endpoint)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != settings.metrics_path:
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    """
+    UIなしで起動した場合に /metrics のみを提供するサーバー
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name='fxcc-metrics').start()
+    return server
@@ -0,0 +1,19 @@
+from contextlib import redirect_stdout
+import io
+import os
+
+
+def toast(title: str, message: str):
+    """
+    デスクトップ通知を表示する（Windows以外、または win11toast がない環境ではコンソール出力のみ）
+    """
+    print(f'\n{title}: {message}')
+    if os.name != 'nt':
+        return
+    try:
+        from win11toast import toast as win_toast
+    except ImportError:
+        return
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        win_toast(title, message)
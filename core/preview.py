@@ -0,0 +1,132 @@
+from __future__ import annotations
+from pydantic import BaseModel
+from datetime import datetime
+from pathlib import Path
+
+from config import settings
+from core.dirsync import LocalRootDirectory, RemoteRootDirectory, SyncDirectory
+from core.manifest import Manifest
+from core.metrics import registry
+from core.transfer import MirrorPlan, get_planner
+
+
+class FolderPreview(BaseModel):
+    """
+    同期フォルダ1件分の、次の同期で行う操作の見積もり
+    """
+
+    name: str
+    status: str = 'pending'     # 'pending' | 'no change' | 'locked' | 'restoring' | 'failed'
+    adds: int = 0
+    updates: int = 0
+    moves: int = 0
+    deletes: int = 0
+    # 転送量の上限（大きなファイルの差分転送では実際の転送量は少なくなる）
+    bytes_total: int = 0
+    error: str = ''
+
+    @classmethod
+    def from_plan(cls, name: str, plan: MirrorPlan) -> FolderPreview:
+        preview = cls(name=name, status='pending' if plan.changed else 'no change', bytes_total=plan.bytes_total)
+        for op in plan.ops:
+            if op.kind in ('copy', 'bundle') and op.label == 'NewFile':
+                preview.adds += 1
+            elif op.kind in ('copy', 'bundle') and op.label in ('Newer', 'Older'):
+                preview.updates += 1
+            elif op.kind == 'move':
+                preview.moves += 1
+            elif op.kind in ('delete', 'unbundle'):
+                preview.deletes += 1
+        return preview
+
+
+class PairPreview(BaseModel):
+    """
+    組1つ分の同期計画の見積もり
+    """
+
+    pair: str
+    planned_at: datetime
+    folders: list[FolderPreview] = []
+    # 直近の同期の転送速度（履歴がなければ 0）
+    bytes_per_sec: float = 0.0
+
+    @property
+    def adds(self) -> int:
+        return sum(f.adds for f in self.folders)
+
+    @property
+    def updates(self) -> int:
+        return sum(f.updates for f in self.folders)
+
+    @property
+    def moves(self) -> int:
+        return sum(f.moves for f in self.folders)
+
+    @property
+    def deletes(self) -> int:
+        return sum(f.deletes for f in self.folders)
+
+    @property
+    def bytes_total(self) -> int:
+        return sum(f.bytes_total for f in self.folders)
+
+    def eta_seconds(self, bytes_total: int | None = None) -> float | None:
+        bytes_total = self.bytes_total if bytes_total is None else bytes_total
+        if not bytes_total:
+            return 0.0
+        return bytes_total / self.bytes_per_sec if self.bytes_per_sec else None
+
+    def summary(self) -> str:
+        eta = self.eta_seconds()
+        return (
+            f'{len(self.folders)} folders, {self.adds} added, {self.updates} updated, {self.moves} moved, '
+            f'{self.deletes} deleted, {self.bytes_total / 2**20:.1f} MiB to copy, ETA {format_eta(eta)}'
+        )
+
+
+def format_eta(seconds: float | None) -> str:
+    if seconds is None:
+        return 'unknown'
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}'
+
+
+def preview_pair(pair_name: str) -> PairPreview:
+    """
+    次の同期で行う操作を、コピーせずに見積もる
+    マニフェストが有効なフォルダはリモートを走査しない（同期ファイルも作成・更新しない）
+    """
+    preview = PairPreview(pair=pair_name, planned_at=datetime.now(), bytes_per_sec=registry.throughput(pair_name))
+    pair = settings.get_pair(pair_name)
+    if pair is None or not pair.has_root_dirs():
+        return preview
+    local_root = LocalRootDirectory(path_=pair.LocalDirectory)
+    # リモートは前回の同期で保存した状態から対応するフォルダを探す
+    saved_remote = RemoteRootDirectory.load(pair.Name)
+    remote_dirs: dict[str, SyncDirectory] = {d.id_: d for d in saved_remote.sync_directories} if saved_remote is not None else {}
+    planner = get_planner()
+    for entry in sorted(local_root.list_dirs(), key=lambda entry: entry.name):
+        local = Path(entry.path)
+        remote = pair.RemoteDirectory / local.name
+        sync_remote: SyncDirectory | None = None
+        if (local / settings.sync_dir_ext).exists():
+            sync_local = SyncDirectory.create(local)
+            sync_remote = remote_dirs.get(sync_local.id_)
+            if sync_local.restoring:
+                preview.folders.append(FolderPreview(name=local.name, status='restoring'))
+                continue
+        if sync_remote is not None and sync_remote.locked:
+            preview.folders.append(FolderPreview(name=local.name, status='locked'))
+            continue
+        if sync_remote is not None:
+            # フォルダ名が変わった場合、リモートは同期の最初にリネームされる（コピーは不要）
+            remote = sync_remote.path_
+        try:
+            plan = planner.plan(local, remote, Manifest.load(local / settings.manifest_ext))
+        except OSError as e:
+            preview.folders.append(FolderPreview(name=local.name, status='failed', error=str(e)))
+            continue
+        preview.folders.append(FolderPreview.from_plan(local.name, plan))
+    return preview
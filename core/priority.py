@@ -0,0 +1,77 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterable, NamedTuple
+import math
+
+from config import settings
+from config.settings import preferences
+from core.manifest import Manifest, TreeScan, scan_tree, same_file_stat
+
+if TYPE_CHECKING:
+    from core.dirsync import SyncDirectory
+
+
+class PendingWork(NamedTuple):
+    """
+    次の同期で行う作業の見積もり
+    """
+
+    # ローカルのファイルの最新の更新日時
+    newest_mtime: datetime | None
+    # マニフェスト（前回の同期完了時点）から変わったファイルの合計サイズ
+    planned_bytes: int | None
+    # 見積もりに使ったローカルの走査結果（同期でそのまま使い、同じフォルダを走査し直さない）
+    scan: TreeScan | None = None
+
+
+def estimate(sync_dir: SyncDirectory) -> PendingWork:
+    """
+    ローカルの走査とマニフェストの比較から、次の同期の作業を見積もる（リモートは走査しない）
+    マニフェストがなければ（初回）全ファイルを転送するものとする
+    """
+    try:
+        scan = scan_tree(sync_dir.path_, with_file_id=True)
+    except OSError:
+        return PendingWork(None, None)
+    manifest = Manifest.load(sync_dir.path_ / settings.manifest_ext)
+    synced = manifest.to_scan().files if manifest is not None else {}
+    planned_bytes = sum(
+        stat.size for rel, stat in scan.files.items()
+        if rel not in synced or not same_file_stat(stat, synced[rel], exact=True)
+    )
+    newest = max((stat.mtime_ns for stat in scan.files.values()), default=None)
+    return PendingWork(datetime.fromtimestamp(newest / 10**9) if newest is not None else None, planned_bytes, scan)
+
+
+def priority_score(sync_dir: SyncDirectory, now: datetime, pending: PendingWork | None = None) -> float:
+    """
+    同期の優先度（大きいほど先に同期する）
+    - ローカルのファイルが最近更新されたフォルダほど高い
+    - 前回の同期成功から時間が経っているほど高い
+    - 転送量の多いフォルダほどわずかに低い（小さな更新を先に済ませる）
+    - 同期期限（SyncDeadlineMinutes）を過ぎると超過時間に応じて上がり続ける（後回しにされ続けない）
+    見積もり（pending）がなければ、前回の同期で記録した更新日時・フォルダサイズを使う
+    """
+    weights = settings.priority_weights
+    newest_mtime = pending.newest_mtime if pending is not None and pending.newest_mtime is not None else sync_dir.modified_at
+    planned_bytes = pending.planned_bytes if pending is not None and pending.planned_bytes is not None else sync_dir.size_bytes
+    idle_hours = max((now - newest_mtime).total_seconds(), 0) / 3600
+    recency = 1 / (1 + idle_hours)
+    last_success = sync_dir.verified_at or sync_dir.created_at
+    stale_minutes = max((now - last_success).total_seconds(), 0) / 60
+    staleness = min(stale_minutes / (24 * 60), 1.0)
+    size = math.log2(1 + planned_bytes / 2**20) / 20
+    score = weights['recency'] * recency + weights['staleness'] * staleness - weights['size'] * size
+    deadline = max(preferences.SyncDeadlineMinutes, 1)
+    if sync_dir.verified_at is None:
+        # 一度もリモートへの同期を確認できていないフォルダ
+        score += weights['aging']
+    elif stale_minutes > deadline:
+        score += weights['aging'] * (stale_minutes - deadline) / deadline
+    return score
+
+
+def by_priority(sync_dirs: Iterable[SyncDirectory], now: datetime | None = None, pending: dict[str, PendingWork] | None = None) -> list[SyncDirectory]:
+    now = now or datetime.now()
+    pending = pending or {}
+    return sorted(sync_dirs, key=lambda d: priority_score(d, now, pending.get(d.id_)), reverse=True)
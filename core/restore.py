@@ -0,0 +1,230 @@
+from __future__ import annotations
+from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import threading
+import shutil
+import os
+
+from config import settings
+from config.settings import preferences
+from core.dirsync import SyncDirectory, LocalRootDirectory
+from core.manifest import FileStat, scan_tree, same_file_stat
+from core.notify import toast
+from core.state import store
+from core.throttle import throttle
+from core.bundle import BundleEntry, BundleIndex, extract_bundle
+from core import fastcopy
+
+
+class RestoreCancelled(Exception):
+    pass
+
+
+class RestoreProgress(BaseModel):
+    """
+    リストアの進捗
+    """
+
+    id_: str
+    name: str
+    status: str
+    started_at: datetime
+    files_done: int = 0
+    files_total: int = 0
+    bytes_done: int = 0
+    bytes_total: int = 0
+    errors: int = 0
+
+    @property
+    def percent(self) -> float:
+        return 100 * self.bytes_done / self.bytes_total if self.bytes_total else 0.0
+
+
+class RestoreJob:
+    """
+    リモートフォルダをローカルへ復元するバックグラウンド処理
+    更新日時の新しいファイル（または小さいファイル）から順に、複数スレッドでコピーする
+    スナップショットを指定した場合はその時点の内容に戻す（ローカルにしかないファイルは削除する）
+    """
+
+    def __init__(self, sync_remote: SyncDirectory, local_root: Path, snapshot_path: Path | None = None):
+        self.sync_remote = sync_remote
+        self.snapshot_path = snapshot_path
+        self.src = snapshot_path or sync_remote.path_
+        self.dst = local_root / sync_remote.path_.stem
+        # ローカルフォルダを上書きする場合は、キャンセルしても削除しない
+        self.in_place = self.dst.exists() and not (self.dst / settings.restore_marker_ext).exists()
+        self.side = LocalRootDirectory(path_=local_root).side
+        name = sync_remote.path_.stem if snapshot_path is None else f'{sync_remote.path_.stem} @ {snapshot_path.name}'
+        self.progress = RestoreProgress(
+            id_=sync_remote.id_, name=name, status='running', started_at=datetime.now()
+        )
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True, name=f'fxcc-restore-{sync_remote.id_}')
+
+    @property
+    def running(self) -> bool:
+        return self.progress.status == 'running'
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def snapshot(self) -> RestoreProgress:
+        with self.lock:
+            return self.progress.model_copy()
+
+    def run(self):
+        try:
+            self._restore()
+        except RestoreCancelled:
+            if self.in_place:
+                # 上書き中のフォルダは途中の状態のまま同期を再開する（各ファイルは復元前か復元後の内容のどちらか）
+                (self.dst / settings.restore_marker_ext).unlink(missing_ok=True)
+            else:
+                # 途中まで復元したフォルダは同期されないよう削除する
+                shutil.rmtree(self.dst, ignore_errors=True)
+                store.delete_folder(self.side, self.sync_remote.id_)
+            self.progress.status = 'cancelled'
+            print(f'\nRestore cancelled: {self.progress.name}')
+        except Exception as e:
+            # 復元中の目印は残し、再実行時に続きから復元する
+            self.progress.status = 'failed'
+            toast('Restore failed', f'{self.progress.name}: {e}')
+
+    def _restore(self):
+        src = self.src
+        # 復元が完了するまでは同期の対象外とする
+        os.makedirs(self.dst, exist_ok=True)
+        (self.dst / settings.restore_marker_ext).touch()
+        try:
+            sync_local = SyncDirectory.create(self.dst, self.sync_remote.id_)
+        except FileExistsError:
+            # 前回中断した復元の続き
+            sync_local = SyncDirectory.create(self.dst)
+        src_scan = scan_tree(src)
+        # 束ねたファイルも個別のファイルと同様に復元する
+        bundles = BundleIndex.load(src)
+        src_scan.files.update(bundles.stats())
+        dst_scan = scan_tree(self.dst)
+        for rel in sorted(src_scan.dirs, key=lambda rel: rel.count('/')):
+            os.makedirs(self.dst / rel, exist_ok=True)
+        if self.snapshot_path is not None:
+            # スナップショットの時点に存在しないファイル・フォルダを削除する
+            for rel in dst_scan.files.keys() - src_scan.files.keys():
+                (self.dst / rel).unlink(missing_ok=True)
+            for rel in sorted(dst_scan.dirs - src_scan.dirs, key=lambda rel: rel.count('/'), reverse=True):
+                shutil.rmtree(self.dst / rel, ignore_errors=True)
+        # コピー済みのファイルは除き、作業再開に必要なものから順にコピーする
+        files = [
+            (rel, stat) for rel, stat in src_scan.files.items()
+            if rel not in dst_scan.files or not same_file_stat(stat, dst_scan.files[rel])
+        ]
+        if preferences.RestoreOrder == 'smallest':
+            files.sort(key=lambda item: item[1].size)
+        else:
+            files.sort(key=lambda item: item[1].mtime_ns, reverse=True)
+        with self.lock:
+            self.progress.files_total = len(files)
+            self.progress.bytes_total = sum(stat.size for _, stat in files)
+        # 束ねたファイルは束ごとにまとめて取り出す
+        bundled: dict[str, list[tuple[str, BundleEntry]]] = {}
+        for rel, _ in files:
+            if rel in bundles.entries:
+                bundled.setdefault(bundles.entries[rel].bundle, []).append((rel, bundles.entries[rel]))
+        with ThreadPoolExecutor(max_workers=max(1, preferences.TransferWorkers), thread_name_prefix='fxcc-restore') as pool:
+            futures = [pool.submit(self._copy_file, rel, stat) for rel, stat in files if rel not in bundles.entries]
+            futures += [pool.submit(self._extract_bundle, name, items) for name, items in bundled.items()]
+            for future in futures:
+                future.result()
+        if self.cancel_event.is_set():
+            raise RestoreCancelled()
+        if self.progress.errors:
+            raise OSError(f'{self.progress.errors} files could not be restored')
+        # ローカルプロパティ更新
+        now = datetime.now()
+        sync_local.created_at = self.sync_remote.created_at
+        sync_local.modified_at = now
+        sync_local.synced_at = now
+        sync_local.dump()
+        (self.dst / settings.restore_marker_ext).unlink(missing_ok=True)
+        store.save_folder(self.side, sync_local)
+        self.progress.status = 'completed'
+        toast('Restore completed', self.progress.name)
+
+    def _on_chunk(self, size: int):
+        if self.cancel_event.is_set():
+            raise RestoreCancelled()
+        with self.lock:
+            self.progress.bytes_done += size
+
+    def _on_file(self, rel: str):
+        with self.lock:
+            self.progress.files_done += 1
+
+    def _extract_bundle(self, name: str, items: list[tuple[str, BundleEntry]]):
+        if self.cancel_event.is_set():
+            return
+        throttle.acquire_op()
+        try:
+            extract_bundle(self.src, name, items, self.dst, on_chunk=self._on_chunk, on_file=self._on_file)
+        except RestoreCancelled:
+            return
+        except OSError as e:
+            print(f'\nRestore error: {name}\n{e}')
+            with self.lock:
+                self.progress.errors += 1
+
+    def _copy_file(self, rel: str, stat: FileStat):
+        if self.cancel_event.is_set():
+            return
+        src = self.src / rel
+        dst = self.dst / rel
+        throttle.acquire_op()
+        try:
+            # 一時ファイルへコピーしてから置き換える（中断しても既存のファイルを途中の内容にしない）
+            fastcopy.replace_file(src, dst, on_chunk=self._on_chunk, remote_src=True)
+        except RestoreCancelled:
+            return
+        except OSError as e:
+            print(f'\nRestore error: {rel}\n{e}')
+            with self.lock:
+                self.progress.errors += 1
+            return
+        self._on_file(rel)
+
+
+_jobs: dict[str, RestoreJob] = {}
+_jobs_lock = threading.Lock()
+
+
+def start(sync_remote: SyncDirectory, local_root: Path, snapshot_path: Path | None = None) -> RestoreJob:
+    with _jobs_lock:
+        job = _jobs.get(sync_remote.id_)
+        if job is not None and job.running:
+            return job
+        job = RestoreJob(sync_remote, local_root, snapshot_path)
+        _jobs[sync_remote.id_] = job
+    job.thread.start()
+    return job
+
+
+def cancel(id_: str):
+    with _jobs_lock:
+        job = _jobs.get(id_)
+    if job is not None:
+        job.cancel()
+
+
+def is_running(id_: str) -> bool:
+    with _jobs_lock:
+        job = _jobs.get(id_)
+    return job is not None and job.running
+
+
+def progress_list() -> list[RestoreProgress]:
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return sorted((job.snapshot() for job in jobs), key=lambda p: p.started_at, reverse=True)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+from pydantic import BaseModel
+from pathlib import Path
+import shutil
+import os
+
+from config import settings
+from core.delta import FileSignature, patch_blocks, strong_checksum
+from core.throttle import throttle
+
+
+class TransferJournal(BaseModel):
+    """
+    中断したコピーの再開用の記録
+    書き込み済みのチャンクのハッシュを保持し、その範囲は再送しない
+    """
+
+    src_size: int
+    src_mtime_ns: int
+    chunk_size: int
+    hashes: list[str] = []
+    # 同期先に直接書き込む差分転送の場合、書き込み前の同期先のシグネチャ
+    base: FileSignature | None = None
+
+    @property
+    def offset(self) -> int:
+        return len(self.hashes) * self.chunk_size
+
+    def dump(self, filename: Path):
+        filename.write_text(self.model_dump_json(), encoding='utf8')
+
+    @classmethod
+    def for_patch(cls, src: Path, base: FileSignature) -> TransferJournal:
+        st = os.stat(src)
+        return cls(src_size=st.st_size, src_mtime_ns=st.st_mtime_ns, chunk_size=base.block_size, base=base)
+
+    @classmethod
+    def load(cls, filename: Path) -> TransferJournal | None:
+        if not filename.exists():
+            return None
+        try:
+            return cls.model_validate_json(filename.read_text(encoding='utf8'))
+        except ValueError:
+            # 書き込み途中で中断した記録は使用しない
+            return None
+
+
+def partial_path(dst: Path) -> Path:
+    return dst.with_name(f'{dst.name}{settings.partial_file_ext}')
+
+
+def journal_path(dst: Path) -> Path:
+    return dst.with_name(f'{dst.name}{settings.journal_file_ext}')
+
+
+def resume_offset(journal: TransferJournal, part: Path) -> int:
+    """
+    再開位置を求める
+    最後に記録したチャンクを同期先から読み直し、一致しなければ1つ前のチャンクから再開する
+    """
+    try:
+        part_size = os.path.getsize(part)
+    except FileNotFoundError:
+        return 0
+    # 一時ファイルが記録より短い場合は、揃っているチャンクまで巻き戻す
+    del journal.hashes[part_size // journal.chunk_size:]
+    if journal.hashes:
+        with open(part, 'rb') as f:
+            f.seek(journal.offset - journal.chunk_size)
+            if strong_checksum(f.read(journal.chunk_size)) != journal.hashes[-1]:
+                journal.hashes.pop()
+    return journal.offset
+
+
+def resumable_copy(src: Path, dst: Path, chunk_size: int = settings.resume_chunk_size) -> int:
+    """
+    src を dst へチャンク単位でコピーし、書き込んだバイト数を返す
+    同期先の一時ファイルに書き込みながらチャンクごとに記録を残し、
+    前回中断していれば最後に確認できたチャンクの次から再開する
+    すべて書き込んだ後に dst と置き換える
+    """
+    st = os.stat(src)
+    part = partial_path(dst)
+    journal_file = journal_path(dst)
+    journal = TransferJournal.load(journal_file)
+    # 同期元が変更されていれば最初からやり直す
+    if journal is None or journal.base is not None \
+            or (journal.src_size, journal.src_mtime_ns, journal.chunk_size) != (st.st_size, st.st_mtime_ns, chunk_size):
+        journal = TransferJournal(src_size=st.st_size, src_mtime_ns=st.st_mtime_ns, chunk_size=chunk_size)
+        offset = 0
+    else:
+        offset = resume_offset(journal, part)
+    written = 0
+    with open(src, 'rb') as fsrc, open(part, 'r+b' if offset else 'wb') as fpart:
+        fsrc.seek(offset)
+        fpart.seek(offset)
+        # 記録されていない書きかけの部分は破棄する
+        fpart.truncate(offset)
+        while chunk := fsrc.read(chunk_size):
+            throttle.acquire_bytes(len(chunk))
+            fpart.write(chunk)
+            fpart.flush()
+            os.fsync(fpart.fileno())
+            written += len(chunk)
+            journal.hashes.append(strong_checksum(chunk))
+            journal.dump(journal_file)
+    shutil.copystat(src, part)
+    os.replace(part, dst)
+    journal_file.unlink(missing_ok=True)
+    return written
+
+
+def load_patch_journal(src: Path, dst: Path) -> TransferJournal | None:
+    """
+    中断した差分転送（同期先に直接書き込むもの）の記録（同期元が変更されていれば None）
+    """
+    journal = TransferJournal.load(journal_path(dst))
+    if journal is None or journal.base is None or not dst.exists():
+        return None
+    st = os.stat(src)
+    if (journal.src_size, journal.src_mtime_ns) != (st.st_size, st.st_mtime_ns):
+        return None
+    return journal
+
+
+def patch_in_place(src: Path, dst: Path, journal: TransferJournal) -> tuple[int, FileSignature]:
+    """
+    変更のあったブロックを dst に直接書き込む（同期先でファイルを複製できない場合の差分転送）
+    ブロックを書き込むごとに記録を残し、中断した場合は記録済みのブロックの次から再開する
+    戻り値は (書き込んだバイト数, 更新後のシグネチャ)
+    """
+    journal_file = journal_path(dst)
+    start = len(journal.hashes)
+    journal.dump(journal_file)
+
+    def on_write(index: int, hashes: list[str]):
+        journal.hashes = hashes[:index + 1]
+        journal.dump(journal_file)
+
+    written, signature = patch_blocks(src, dst, journal.base, start, on_write)
+    shutil.copystat(src, dst)
+    journal_file.unlink(missing_ok=True)
+    return written, signature
@@ -0,0 +1,215 @@
+from __future__ import annotations
+from pydantic import BaseModel
+from datetime import datetime
+from pathlib import Path
+import math
+import zlib
+
+from config import settings
+from config.settings import preferences
+from core.manifest import FileStat, Manifest, ManifestEntry, scan_tree, same_file_stat
+from core.throttle import TokenBucket, throttle
+from core.bundle import BundleIndex, bundle_path
+from core import fastcopy
+
+# xxhash は任意依存（なければ zlib.crc32 を使う）
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+# 整合性チェック全体の読み込み速度の上限（同期の転送を妨げないよう控えめにする）
+bucket = TokenBucket()
+
+
+def hash_name() -> str:
+    return 'xxh3' if xxhash is not None else 'crc32'
+
+
+def file_hash(path_: Path, remote: bool = False, background: bool = True, offset: int = 0, size: int | None = None) -> str:
+    """
+    ファイル内容のハッシュ（暗号学的な強度は不要なため高速なものを使う）
+    アルゴリズムを変更した場合に再計算されるよう、先頭にアルゴリズム名を付ける
+    background を指定した場合は整合性チェックの速度制限に従う
+    offset・size を指定した場合はその範囲のみ（束に格納したファイル）
+    """
+    hasher = xxhash.xxh3_128() if xxhash is not None else None
+    crc = 0
+    buffer = bytearray(settings.scrub_chunk_size)
+    view = memoryview(buffer)
+    remaining = size
+    with open(path_, 'rb') as f:
+        f.seek(offset)
+        while remaining is None or remaining > 0:
+            if remaining is not None and remaining < len(buffer):
+                n = f.readinto(view[:remaining])
+            else:
+                n = f.readinto(buffer)
+            if not n:
+                break
+            if remaining is not None:
+                remaining -= n
+            if background:
+                bucket.acquire(n)
+            if remote:
+                # リモートからの読み込みは同期の転送と帯域を分け合う
+                throttle.acquire_bytes(n)
+            if hasher is not None:
+                hasher.update(view[:n])
+            else:
+                crc = zlib.crc32(view[:n], crc)
+    digest = hasher.hexdigest() if hasher is not None else f'{crc:08x}'
+    return f'{hash_name()}:{digest}'
+
+
+class ScrubBudget:
+    """
+    1回の同期で整合性チェックに読み込むバイト数の上限
+    大きなファイルも確認できるよう、残りがある限り1ファイル分の超過は許す
+    """
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+
+    def take(self, size: int) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= size
+        return True
+
+
+class ScrubResult(BaseModel):
+    """
+    同期フォルダ1つ分の整合性チェックの結果
+    """
+
+    checked_files: int = 0
+    checked_bytes: int = 0
+    # リモートの内容が一致しなかったファイル（コピーし直したものを含む）
+    mismatches: list[str] = []
+    # コピーし直しても一致しなかったファイル
+    failed: list[str] = []
+    # 確認できなかったファイルがある（予算切れ、同期後にローカルが変更された等）
+    incomplete: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.incomplete and not self.failed
+
+    def summary(self) -> str:
+        text = f'{self.checked_files} files, {self.checked_bytes / 2**20:.1f} MiB checked'
+        if self.mismatches:
+            text += f', {len(self.mismatches)} mismatched ({len(self.failed)} unrepaired)'
+        if self.incomplete:
+            text += ', incomplete'
+        return text
+
+
+def scrub_folder(local: Path, remote: Path, budget: ScrubBudget | None = None, sample: bool = False) -> ScrubResult:
+    """
+    マニフェストに記録したファイルについて、リモートの内容がローカルと一致するか確認する
+    - 確認済みで変更のないファイルは読み直さない（sample を指定した場合のみ、確認が古いものから一部を読み直す）
+    - 一致しないファイルはローカルからコピーし直す
+    - budget を指定しない場合は未確認のファイルをすべて確認する（ローカルを削除する前の検証）
+    """
+    result = ScrubResult()
+    manifest_path = local / settings.manifest_ext
+    manifest = Manifest.load(manifest_path)
+    if manifest is None or manifest.dst != str(remote):
+        # 同期が完了していない（次回の同期でマニフェストが作成される）
+        result.incomplete = True
+        return result
+    local_files = scan_tree(local).files
+    if local_files.keys() - manifest.entries.keys():
+        # 同期後に追加されたファイルがある
+        result.incomplete = True
+    elif any(
+        (local_stat.size, local_stat.mtime_ns) != (manifest.entries[rel].size, manifest.entries[rel].mtime_ns)
+        for rel, local_stat in local_files.items()
+    ):
+        # 同期後に変更されたファイルがある（確認対象外の確認済みのファイルを含む）
+        result.incomplete = True
+    targets = [rel for rel, entry in manifest.entries.items() if entry.scrubbed_at is None]
+    if sample:
+        scrubbed = sorted(
+            (rel for rel, entry in manifest.entries.items() if entry.scrubbed_at is not None),
+            key=lambda rel: manifest.entries[rel].scrubbed_at,
+        )
+        targets += scrubbed[:math.ceil(len(scrubbed) * preferences.ScrubSamplePercent / 100)]
+    bucket.configure(preferences.ScrubMBps * 2**20)
+    bundles = BundleIndex.load(remote)
+    updated = False
+    for rel in targets:
+        entry = manifest.entries[rel]
+        local_stat = local_files.get(rel)
+        if local_stat is None or (local_stat.size, local_stat.mtime_ns) != (entry.size, entry.mtime_ns):
+            # 同期後にローカルが変更・削除された（次回の同期で反映される）
+            result.incomplete = True
+            continue
+        if budget is not None and not budget.take(entry.size * 2):
+            result.incomplete = True
+            break
+        try:
+            if rel in bundles.entries:
+                matched = scrub_bundled_file(local / rel, remote, bundles, rel, entry, result)
+            else:
+                matched = scrub_file(local / rel, remote / rel, entry, result)
+        except OSError as e:
+            print(f'\nScrub error: {rel}\n{e}')
+            result.incomplete = True
+            continue
+        if not matched and rel in bundles.entries:
+            # 束の中は書き換えられないため、次回の同期で新しい束へ書き込み直す
+            result.mismatches.append(rel)
+            result.failed.append(rel)
+            bundles.discard(rel)
+            del manifest.entries[rel]
+            updated = True
+            continue
+        if not matched:
+            result.mismatches.append(rel)
+            try:
+                fastcopy.replace_file(local / rel, remote / rel)
+                matched = scrub_file(local / rel, remote / rel, entry, result)
+            except OSError as e:
+                print(f'\nScrub repair error: {rel}\n{e}')
+            if not matched:
+                result.failed.append(rel)
+                continue
+        entry.scrubbed_at = datetime.now()
+        updated = True
+    if updated:
+        manifest.dump(manifest_path)
+        bundles.dump(remote)
+    return result
+
+
+def scrub_bundled_file(local: Path, remote: Path, bundles: BundleIndex, rel: str, entry: ManifestEntry, result: ScrubResult) -> bool:
+    bundled = bundles.entries[rel]
+    if (bundled.size, bundled.mtime_ns) != (entry.size, entry.mtime_ns):
+        return False
+    if entry.hash is None or not entry.hash.startswith(f'{hash_name()}:'):
+        entry.hash = file_hash(local)
+        result.checked_bytes += entry.size
+    remote_hash = file_hash(bundle_path(remote, bundled.bundle), remote=True, offset=bundled.offset, size=bundled.size)
+    result.checked_files += 1
+    result.checked_bytes += entry.size
+    return remote_hash == entry.hash
+
+
+def scrub_file(local: Path, remote: Path, entry: ManifestEntry, result: ScrubResult) -> bool:
+    try:
+        st = remote.stat()
+    except FileNotFoundError:
+        return False
+    if not same_file_stat(FileStat(st.st_size, st.st_mtime_ns), FileStat(entry.size, entry.mtime_ns)):
+        # リモートが外部で変更された
+        return False
+    if entry.hash is None or not entry.hash.startswith(f'{hash_name()}:'):
+        entry.hash = file_hash(local)
+        result.checked_bytes += entry.size
+    remote_hash = file_hash(remote, remote=True)
+    result.checked_files += 1
+    result.checked_bytes += entry.size
+    return remote_hash == entry.hash
@@ -0,0 +1,184 @@
+from __future__ import annotations
+from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+import threading
+import shutil
+import os
+
+from config import settings
+from config.settings import preferences
+from core.manifest import Manifest, TreeScan, scan_tree
+from core.throttle import throttle
+from core.bundle import BundleIndex, bundle_path
+
+
+class SnapshotIndex(BaseModel):
+    """
+    スナップショットに含まれるファイルの一覧
+    次のスナップショットで、前回から変更のあったファイルを求めるために使う
+    """
+
+    name: str
+    created_at: datetime
+    entries: dict[str, tuple[int, int]] = {}
+    dirs: list[str] = []
+    added_bytes: int = 0
+
+    def dump(self, filename: Path):
+        filename.write_text(self.model_dump_json(), encoding='utf8')
+
+    @classmethod
+    def load(cls, filename: Path) -> SnapshotIndex | None:
+        try:
+            return cls.model_validate_json(filename.read_text(encoding='utf8'))
+        except (OSError, ValueError):
+            return None
+
+
+class SnapshotInfo(BaseModel):
+    """
+    コンソールに表示するスナップショットの概要
+    """
+
+    snapshot: str
+    path_: Path
+    created_at: datetime
+    files: int
+    total_bytes: int
+    added_bytes: int
+
+
+def snapshots_dir(remote_root: Path, id_: str) -> Path:
+    # フォルダ名が変わっても履歴を引き継ぐよう、同期フォルダのIDごとに保存する
+    return remote_root / settings.snapshot_dir_name / id_
+
+
+def snapshot_names(folder: Path) -> list[str]:
+    if not folder.is_dir():
+        return []
+    with os.scandir(folder) as it:
+        names = [entry.name for entry in it if entry.is_dir() and not entry.name.endswith(settings.temp_file_ext)]
+    return sorted(names)
+
+
+def has_snapshot(remote_root: Path, id_: str) -> bool:
+    return bool(snapshot_names(snapshots_dir(remote_root, id_)))
+
+
+def list_snapshots(remote_root: Path, id_: str) -> list[SnapshotInfo]:
+    folder = snapshots_dir(remote_root, id_)
+    infos: list[SnapshotInfo] = []
+    for name in reversed(snapshot_names(folder)):
+        index = SnapshotIndex.load(folder / name / settings.snapshot_index_ext)
+        if index is None:
+            continue
+        infos.append(SnapshotInfo(
+            snapshot=name,
+            path_=folder / name,
+            created_at=index.created_at,
+            files=len(index.entries),
+            total_bytes=sum(size for size, _ in index.entries.values()),
+            added_bytes=index.added_bytes,
+        ))
+    return infos
+
+
+def create_snapshot(remote_dir: Path, id_: str, manifest_path: Path | None = None, now: datetime | None = None) -> SnapshotInfo | None:
+    """
+    同期直後のリモートフォルダのスナップショットを作成する
+    すべてのファイルを同期先のファイルへのハードリンクとする（同期先のファイルは置き換えでのみ更新されるため、
+    スナップショットの内容は変わらない。ハードリンクが使えない場合は作成しない）
+    """
+    now = now or datetime.now()
+    folder = snapshots_dir(remote_dir.parent, id_)
+    name = now.strftime(settings.snapshot_name_format)
+    target = folder / name
+    if target.exists():
+        return None
+    os.makedirs(folder, exist_ok=True)
+    # 前回中断したスナップショットは削除する
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.name.endswith(settings.temp_file_ext):
+                shutil.rmtree(entry.path, ignore_errors=True)
+    names = snapshot_names(folder)
+    previous = SnapshotIndex.load(folder / names[-1] / settings.snapshot_index_ext) if names else None
+    # 同期直後のマニフェストはリモートの状態と一致する（なければリモートを走査する）
+    manifest = Manifest.load(manifest_path) if manifest_path is not None else None
+    bundles = BundleIndex.load(remote_dir)
+    if manifest is not None and manifest.dst == str(remote_dir):
+        scan: TreeScan = manifest.to_scan()
+    else:
+        scan = scan_tree(remote_dir)
+        scan.files.update(bundles.stats())
+    work = folder / f'{name}{settings.temp_file_ext}'
+    os.makedirs(work)
+    for rel in sorted(scan.dirs, key=lambda rel: rel.count('/')):
+        os.makedirs(work / rel, exist_ok=True)
+    index = SnapshotIndex(name=remote_dir.name, created_at=now, dirs=sorted(scan.dirs))
+    lock = threading.Lock()
+
+    def add_file(rel: str, stat: tuple[int, int]):
+        # 同期先のファイルは置き換えでのみ更新されるため、コピーせずハードリンクする
+        throttle.acquire_op()
+        os.link(remote_dir / rel, work / rel)
+        if previous is None or previous.entries.get(rel) != stat:
+            with lock:
+                index.added_bytes += stat[0]
+
+    def add_bundle(name: str):
+        # 束は書き込み後に変更されない
+        throttle.acquire_op()
+        os.link(bundle_path(remote_dir, name), bundle_path(work, name))
+
+    if bundles.bundles:
+        os.makedirs(BundleIndex.dir_for(work))
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, preferences.TransferWorkers), thread_name_prefix='fxcc-snapshot') as pool:
+            futures = []
+            for rel, stat in scan.files.items():
+                index.entries[rel] = (stat.size, stat.mtime_ns)
+                if rel not in bundles.entries:
+                    futures.append(pool.submit(add_file, rel, index.entries[rel]))
+            futures += [pool.submit(add_bundle, name) for name in bundles.bundles]
+            for future in futures:
+                future.result()
+        if bundles.bundles:
+            bundles.dump(work, force=True)
+        index.dump(work / settings.snapshot_index_ext)
+        os.rename(work, target)
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    prune_snapshots(folder, now)
+    return SnapshotInfo(
+        snapshot=name,
+        path_=target,
+        created_at=now,
+        files=len(index.entries),
+        total_bytes=sum(size for size, _ in index.entries.values()),
+        added_bytes=index.added_bytes,
+    )
+
+
+def prune_snapshots(folder: Path, now: datetime | None = None) -> list[str]:
+    """
+    保持期間を過ぎたスナップショットを削除する
+    新しいものから SnapshotKeepCount 個、または SnapshotKeepDays 日以内のものは残す
+    （ハードリンクのため、削除しても他のスナップショットのファイルは残る）
+    """
+    now = now or datetime.now()
+    keep_count = max(1, preferences.SnapshotKeepCount)
+    limit = now - timedelta(days=preferences.SnapshotKeepDays)
+    removed: list[str] = []
+    for name in snapshot_names(folder)[:-keep_count]:
+        try:
+            created_at = datetime.strptime(name, settings.snapshot_name_format)
+        except ValueError:
+            continue
+        if created_at < limit:
+            shutil.rmtree(folder / name, ignore_errors=True)
+            removed.append(name)
+    return removed
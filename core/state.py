@@ -0,0 +1,248 @@
+from __future__ import annotations
+from pydantic import BaseModel
+from contextlib import contextmanager, closing
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+import threading
+import sqlite3
+import json
+import yaml
+
+from config import settings
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    side TEXT PRIMARY KEY,
+    path TEXT
+);
+CREATE TABLE IF NOT EXISTS folders (
+    side TEXT NOT NULL,
+    id_ TEXT NOT NULL,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (side, id_)
+);
+CREATE INDEX IF NOT EXISTS folders_id ON folders (id_);
+CREATE TABLE IF NOT EXISTS sync_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS log_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER,
+    folder_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS log_entries_folder ON log_entries (folder_id);
+CREATE INDEX IF NOT EXISTS log_entries_run ON log_entries (run_id);
+CREATE TABLE IF NOT EXISTS folder_cache (
+    side TEXT NOT NULL,
+    path TEXT NOT NULL,
+    dir_mtime_ns INTEGER NOT NULL,
+    file_mtime_ns INTEGER NOT NULL,
+    file_size INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (side, path)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+
+class SyncRun(BaseModel):
+    """
+    同期実行の履歴
+    """
+
+    id: int
+    started_at: datetime
+    finished_at: datetime | None = None
+    status: str
+    summary: str = ''
+
+
+class StateStore:
+    """
+    同期状態を保持する SQLite データベース
+    """
+
+    def __init__(self, path_: Path):
+        self.path_ = path_
+        self._write_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self._initialize()
+        with closing(sqlite3.connect(self.path_, timeout=30)) as conn:
+            conn.row_factory = sqlite3.Row
+            with conn:
+                yield conn
+
+    def _initialize(self):
+        with self._init_lock:
+            if self._initialized:
+                return
+            self.path_.parent.mkdir(parents=True, exist_ok=True)
+            with closing(sqlite3.connect(self.path_, timeout=30)) as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+            self._initialized = True
+
+    def version(self) -> int:
+        """
+        フォルダ情報の更新ごとに増加するバージョン番号（変更の有無の確認用）
+        """
+        with self.connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def _bump_version(self, conn: sqlite3.Connection):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    # --- フォルダ ---
+
+    def save_root(self, side: str, root: BaseModel):
+        """
+        ルートフォルダとその配下の同期フォルダをまとめて保存する（変更がなければ何もしない）
+        """
+        rows = [
+            (side, d.id_, str(d.path_), i, d.model_dump_json())
+            for i, d in enumerate(root.sync_directories)
+        ]
+        root_path = str(root.path_) if root.path_ is not None else None
+        with self._write_lock, self.connect() as conn:
+            # 前回保存時から変更がなければ書き込まない
+            saved_root = conn.execute('SELECT path FROM roots WHERE side = ?', (side,)).fetchone()
+            if saved_root is not None and saved_root['path'] == root_path:
+                saved_rows = conn.execute(
+                    'SELECT side, id_, path, position, data FROM folders WHERE side = ? ORDER BY position', (side,)
+                ).fetchall()
+                if [tuple(row) for row in saved_rows] == rows:
+                    return
+            conn.execute('INSERT OR REPLACE INTO roots (side, path) VALUES (?, ?)', (side, root_path))
+            conn.execute('DELETE FROM folders WHERE side = ?', (side,))
+            conn.executemany('INSERT INTO folders (side, id_, path, position, data) VALUES (?, ?, ?, ?, ?)', rows)
+            self._bump_version(conn)
+
+    def load_root(self, side: str, root_cls: type[BaseModel]) -> BaseModel | None:
+        with self.connect() as conn:
+            root_row = conn.execute('SELECT path FROM roots WHERE side = ?', (side,)).fetchone()
+            if root_row is None:
+                return None
+            rows = conn.execute('SELECT data FROM folders WHERE side = ? ORDER BY position', (side,)).fetchall()
+        # 保存済みのJSONをそのまま連結して一度に検証する
+        path_ = json.dumps(root_row['path'])
+        folders = ','.join(row['data'] for row in rows)
+        return root_cls.model_validate_json(f'{{"path_": {path_}, "sync_directories": [{folders}]}}')
+
+    def save_folder(self, side: str, folder: BaseModel):
+        """
+        同期フォルダ1件のみを更新する
+        """
+        with self._write_lock, self.connect() as conn:
+            updated = conn.execute(
+                'UPDATE folders SET path = ?, data = ? WHERE side = ? AND id_ = ?',
+                (str(folder.path_), folder.model_dump_json(), side, folder.id_),
+            ).rowcount
+            if not updated:
+                position = conn.execute('SELECT COUNT(*) FROM folders WHERE side = ?', (side,)).fetchone()[0]
+                conn.execute(
+                    'INSERT INTO folders (side, id_, path, position, data) VALUES (?, ?, ?, ?, ?)',
+                    (side, folder.id_, str(folder.path_), position, folder.model_dump_json()),
+                )
+            self._bump_version(conn)
+
+    def delete_folder(self, side: str, id_: str):
+        with self._write_lock, self.connect() as conn:
+            conn.execute('DELETE FROM folders WHERE side = ? AND id_ = ?', (side, id_))
+            self._bump_version(conn)
+
+    def load_folder(self, side: str, id_: str, folder_cls: type[BaseModel]) -> BaseModel | None:
+        with self.connect() as conn:
+            row = conn.execute('SELECT data FROM folders WHERE side = ? AND id_ = ?', (side, id_)).fetchone()
+        return folder_cls.model_validate_json(row['data']) if row else None
+
+    # --- フォルダ情報のキャッシュ ---
+
+    def load_folder_cache(self, side: str) -> dict[str, tuple[tuple[int, int, int], str]]:
+        """
+        フォルダのパスごとの (フォルダ・同期ファイルの更新日時とサイズ, 同期フォルダ情報のJSON)
+        """
+        with self.connect() as conn:
+            rows = conn.execute(
+                'SELECT path, dir_mtime_ns, file_mtime_ns, file_size, data FROM folder_cache WHERE side = ?', (side,)
+            ).fetchall()
+        return {row['path']: ((row['dir_mtime_ns'], row['file_mtime_ns'], row['file_size']), row['data']) for row in rows}
+
+    def save_folder_cache(self, side: str, entries: dict[str, tuple[tuple[int, int, int], str]]):
+        rows = [(side, path_, *key, data) for path_, (key, data) in entries.items()]
+        with self._write_lock, self.connect() as conn:
+            conn.execute('DELETE FROM folder_cache WHERE side = ?', (side,))
+            conn.executemany(
+                'INSERT INTO folder_cache (side, path, dir_mtime_ns, file_mtime_ns, file_size, data) VALUES (?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+
+    # --- 同期履歴 ---
+
+    def start_run(self) -> int:
+        with self._write_lock, self.connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO sync_runs (started_at, status) VALUES (?, ?)',
+                (datetime.now().isoformat(), 'running'),
+            )
+            return cursor.lastrowid
+
+    def finish_run(self, run_id: int, status: str, summary: str = ''):
+        with self._write_lock, self.connect() as conn:
+            conn.execute(
+                'UPDATE sync_runs SET finished_at = ?, status = ?, summary = ? WHERE id = ?',
+                (datetime.now().isoformat(), status, summary, run_id),
+            )
+
+    def recent_runs(self, limit: int = 20) -> list[SyncRun]:
+        with self.connect() as conn:
+            rows = conn.execute('SELECT * FROM sync_runs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [SyncRun(**dict(row)) for row in rows]
+
+    def add_log(self, run_id: int | None, folder_id: str, message: str):
+        with self._write_lock, self.connect() as conn:
+            conn.execute(
+                'INSERT INTO log_entries (run_id, folder_id, created_at, message) VALUES (?, ?, ?, ?)',
+                (run_id, folder_id, datetime.now().isoformat(), message),
+            )
+
+    def folder_logs(self, folder_id: str, limit: int = 20) -> list[tuple[datetime, str]]:
+        with self.connect() as conn:
+            rows = conn.execute(
+                'SELECT created_at, message FROM log_entries WHERE folder_id = ? ORDER BY id DESC LIMIT ?',
+                (folder_id, limit),
+            ).fetchall()
+        return [(datetime.fromisoformat(row['created_at']), row['message']) for row in rows]
+
+
+store = StateStore(settings.state_db_path)
+
+
+def import_yaml_root(side: str, filename: Path, loader) -> bool:
+    """
+    旧形式（YAML）のルートフォルダ情報をデータベースに取り込む
+    """
+    if not filename.exists():
+        return False
+    root = yaml.load(filename.read_text(encoding='utf8'), Loader=loader)
+    store.save_root(side, root)
+    filename.rename(filename.with_name(f'{filename.name}.migrated'))
+    return True
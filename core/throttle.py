@@ -0,0 +1,143 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator
+import threading
+import time
+
+from config import settings
+from config.settings import preferences
+
+
+class TokenBucket:
+    """
+    トークンバケットによる速度制限（rate が 0 以下なら無制限）
+    """
+
+    def __init__(self, rate: float = 0, burst: float | None = None):
+        self._lock = threading.Lock()
+        self.rate = 0.0
+        self.burst = 0.0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.configure(rate, burst)
+
+    def configure(self, rate: float, burst: float | None = None):
+        with self._lock:
+            self.rate = max(rate, 0.0)
+            # 既定では1秒分までためられる
+            self.burst = burst if burst is not None else self.rate
+            self.tokens = min(self.tokens, self.burst)
+
+    def acquire(self, amount: float = 1):
+        with self._lock:
+            if self.rate <= 0:
+                return
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 不足分は前借りし、その分だけ待つ（大きな要求も1回で処理する）
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Throttle:
+    """
+    転送処理の帯域・ファイル操作数の制限
+    時間帯ごとの上限（Preferences.ThrottleWindows）に従い、
+    リモートの応答が遅くなった場合は自動的に減速する（AIMD）
+    """
+
+    def __init__(self):
+        self.bytes = TokenBucket()
+        self.ops = TokenBucket()
+        self._lock = threading.Lock()
+        self.backoff = 1.0
+        self.latency: float | None = None
+        self.latency_floor: float | None = None
+        # 減速を始めた時点の速度（無制限の場合の減速の基準）
+        self.base_rates: tuple[float, float] | None = None
+        self.throughput = 0.0
+        self.ops_rate = 0.0
+        self._window_bytes = 0
+        self._window_ops = 0
+        self._adjusted_at = 0.0
+
+    def limits(self, now: datetime | None = None) -> tuple[float, float]:
+        """
+        現在の時間帯の上限（バイト/秒, 操作/秒）
+        """
+        now = now or datetime.now()
+        for window in preferences.ThrottleWindows:
+            if window.contains(now):
+                return window.MBps * 2**20, window.OpsPerSec
+        return preferences.ThrottleMBps * 2**20, preferences.ThrottleOpsPerSec
+
+    def _refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            elapsed = now - self._adjusted_at
+            if elapsed < settings.throttle_adjust_interval_sec:
+                return
+            if self._adjusted_at:
+                # 実際の転送速度（平滑化）
+                self.throughput = 0.7 * self.throughput + 0.3 * self._window_bytes / elapsed
+                self.ops_rate = 0.7 * self.ops_rate + 0.3 * self._window_ops / elapsed
+            self._window_bytes = 0
+            self._window_ops = 0
+            self._adjusted_at = now
+            byte_limit, ops_limit = self.limits()
+            if preferences.AdaptiveThrottle and self.latency is not None and self.latency_floor is not None:
+                if self.latency > self.latency_floor * settings.throttle_latency_spike_ratio:
+                    if self.backoff == 1.0:
+                        self.base_rates = (byte_limit or self.throughput, ops_limit or self.ops_rate)
+                    self.backoff = max(settings.throttle_min_backoff, self.backoff * 0.5)
+                else:
+                    self.backoff = min(1.0, self.backoff + 0.1)
+            else:
+                self.backoff = 1.0
+            if self.backoff < 1.0 and self.base_rates is not None:
+                base_bytes, base_ops = self.base_rates
+                byte_limit = (min(byte_limit, base_bytes) if byte_limit else base_bytes) * self.backoff
+                ops_limit = (min(ops_limit, base_ops) if ops_limit else base_ops) * self.backoff
+            else:
+                self.base_rates = None
+        self.bytes.configure(byte_limit)
+        self.ops.configure(ops_limit)
+
+    def observe_latency(self, seconds: float):
+        with self._lock:
+            self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+            # 基準の遅延は最小値に追従し、ゆっくりと上昇させる（環境の変化に合わせる）
+            if self.latency_floor is None or self.latency < self.latency_floor:
+                self.latency_floor = self.latency
+            else:
+                self.latency_floor += (self.latency - self.latency_floor) * 0.01
+
+    def acquire_op(self):
+        """
+        ファイル操作1回分の許可を待つ
+        """
+        self._refresh()
+        with self._lock:
+            self._window_ops += 1
+        self.ops.acquire()
+
+    def acquire_bytes(self, size: int):
+        with self._lock:
+            self._window_bytes += size
+        self.bytes.acquire(size)
+
+    @contextmanager
+    def measure(self) -> Iterator[None]:
+        """
+        リモートの応答時間を計測する（メタデータ操作など、転送量に依存しない操作に使う）
+        """
+        started = time.perf_counter()
+        yield
+        self.observe_latency(time.perf_counter() - started)
+
+
+throttle = Throttle()
@@ -0,0 +1,590 @@
+from __future__ import annotations
+from pydantic import BaseModel
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import threading
+import subprocess
+import shutil
+import os
+
+from config import settings
+from config.settings import preferences
+from core.manifest import FileStat, TreeScan, Manifest, scan_tree, same_file_stat
+from core.delta import SignatureStore, compute_signature, delta_copy
+from core.resume import load_patch_journal, resumable_copy
+from core.throttle import throttle
+from core import fastcopy
+from core.metrics import phase
+from core.scrub import file_hash, hash_name
+from core.bundle import BundleIndex, write_bundle
+
+
+class TransferOp(BaseModel):
+    """
+    ミラーリング計画の1操作
+    """
+
+    kind: str   # 'mkdir' | 'copy' | 'move' | 'bundle' | 'delete' | 'unbundle' | 'rmdir'
+    path: str   # 同期フォルダからの相対パス
+    size: int = 0
+    label: str = ''
+    source: str = ''    # 'move' の移動元（同期先の相対パス）
+
+
+class MirrorPlan(BaseModel):
+    """
+    ミラーリング計画
+    """
+
+    src: Path
+    dst: Path
+    ops: list[TransferOp] = []
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.ops)
+
+    @property
+    def bytes_total(self) -> int:
+        return sum(op.size for op in self.ops if op.kind in ('copy', 'bundle'))
+
+
+class MirrorResult(BaseModel):
+    """
+    ミラーリング結果
+    """
+
+    changed: bool = False
+    error: bool = False
+    log: str = ''
+    copied_files: int = 0
+    copied_bytes: int = 0
+    moved_files: int = 0
+    removed_files: int = 0
+    # 中断したため実行していない操作がある
+    cancelled: bool = False
+    # 同期元の合計サイズ（走査していない場合は None）
+    src_bytes: int | None = None
+    timings: dict[str, float] = {}
+
+
+class TransferBackend(ABC):
+    """
+    フォルダのミラーリングを行う転送バックエンド
+    """
+
+    name: str = ''
+    # 同期元の走査結果を受け取って使う（同期順の見積もりで走査したものを渡せる）
+    accepts_scan: bool = False
+
+    @abstractmethod
+    def mirror(self, src: Path, dst: Path, manifest_path: Path | None = None, cancel_event: threading.Event | None = None, src_scan: TreeScan | None = None) -> MirrorResult:
+        pass
+
+
+class RobocopyBackend(TransferBackend):
+    """
+    robocopy によるミラーリング（Windows専用）
+    """
+
+    name = 'robocopy'
+
+    def mirror(self, src: Path, dst: Path, manifest_path: Path | None = None, cancel_event: threading.Event | None = None, src_scan: TreeScan | None = None) -> MirrorResult:
+        # robocopy の実行中は中断できないため、開始前のみ確認する
+        if cancel_event is not None and cancel_event.is_set():
+            return MirrorResult(cancelled=True)
+        # robocopy は毎回両側を走査するためマニフェストは使用しない
+        command: list = [
+            "robocopy",
+            src,
+            dst,
+            "/MIR",   # ミラーリング
+            "/NP",    # 進行状況バー非表示
+            "/NDL",   # ディレクトリ一覧非表示
+            "/NS",    # ファイルサイズを表示しない
+            "/NJH",   # ジョブヘッダを表示しない（開始時の情報）
+            "/NJS",   # ジョブサマリを表示しない（統計情報）
+            "/XF", *settings.mirror_excludes,   # 管理ファイルは除外
+        ]
+        # 戻り値 0: 変更なし, 1-7: コピー・削除あり, 8以上: エラー
+        # （/L による事前確認は行わず、1回の実行結果で判定する）
+        timings: dict[str, float] = {}
+        with phase(timings, 'copy'):
+            result = subprocess.run(command, capture_output=True, text=True)
+        log = result.stdout[1:-1].replace(' ', '').replace('\t', ' ')
+        return MirrorResult(
+            changed=0 < result.returncode <= 7,
+            error=result.returncode > 7,
+            log=log,
+            timings=timings,
+        )
+
+
+class NativeTransferBackend(TransferBackend):
+    """
+    Python実装のミラーリング
+    両側を1回ずつ走査して計画を立て、ファイル単位の操作をスレッドプールで並列実行する
+    """
+
+    name = 'native'
+    accepts_scan = True
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fxcc-copy')
+            return self._pool
+
+    def scan(self, root: Path, with_file_id: bool = False) -> TreeScan:
+        return scan_tree(root, with_file_id)
+
+    def plan(self, src: Path, dst: Path, manifest: Manifest | None = None) -> MirrorPlan:
+        src_scan, dst_scan, verified = self.scan_pair(src, dst, manifest)
+        bundles = BundleIndex.load(dst) if verified else None
+        if bundles is not None:
+            dst_scan.files.update(bundles.stats())
+        signatures = SignatureStore.load(src / settings.signatures_ext)
+        plan = self.plan_from_scans(src, dst, src_scan, dst_scan, manifest_hashes(manifest, dst), signatures)
+        if plan.ops:
+            self.plan_bundles(plan, src_scan, bundles or BundleIndex.load(dst))
+        return plan
+
+    def scan_pair(self, src: Path, dst: Path, manifest: Manifest | None, src_scan: TreeScan | None = None) -> tuple[TreeScan, TreeScan, bool]:
+        """
+        同期元・同期先の走査結果を取得する
+        有効なマニフェストがあれば同期先は走査せず、マニフェストを同期先の状態とみなす
+        src_scan を渡した場合は同期元を走査しない
+        """
+        if manifest is not None and manifest.is_valid_for(dst):
+            return src_scan or self.scan(src, with_file_id=True), manifest.to_scan(), False
+        if src_scan is not None:
+            return src_scan, self.scan(dst), True
+        # 両側の走査は並列に行う（リモートのメタデータ取得待ちを重ねる）
+        src_future = self.pool.submit(self.scan, src, True)
+        dst_scan = self.scan(dst)
+        return src_future.result(), dst_scan, True
+
+    def plan_from_scans(self, src: Path, dst: Path, src_scan: TreeScan, dst_scan: TreeScan, hashes: dict[str, str] | None = None, signatures: SignatureStore | None = None) -> MirrorPlan:
+        """
+        両側の走査結果からミラーリング計画を立てる
+        hashes は同期先のファイルの内容のハッシュ（マニフェストに記録したもの）、signatures は差分転送用のシグネチャ（移動の判定に使う）
+        """
+        ops: list[TransferOp] = []
+        # 種類の異なる同名エントリは先に削除
+        for rel in sorted(src_scan.dirs & dst_scan.files.keys()):
+            ops.append(TransferOp(kind='delete', path=rel, label='*EXTRAFile'))
+        for rel in sorted(src_scan.files.keys() & dst_scan.dirs, reverse=True):
+            ops.append(TransferOp(kind='rmdir', path=rel, label='*EXTRADir'))
+        # フォルダ作成
+        for rel in sorted(src_scan.dirs - dst_scan.dirs):
+            ops.append(TransferOp(kind='mkdir', path=rel))
+        # ファイルコピー
+        added: list[str] = []
+        for rel, stat in src_scan.files.items():
+            dst_stat = dst_scan.files.get(rel)
+            if dst_stat is None or rel in dst_scan.dirs:
+                if rel not in dst_scan.dirs:
+                    added.append(rel)
+                    continue
+                ops.append(TransferOp(kind='copy', path=rel, size=stat.size, label='NewFile'))
+            elif not same_file_stat(stat, dst_stat, dst_scan.exact):
+                label = 'Newer' if stat.mtime_ns >= dst_stat.mtime_ns else 'Older'
+                ops.append(TransferOp(kind='copy', path=rel, size=stat.size, label=label))
+        # 追加・削除されたファイルのうち、同じ内容のものは同期先で移動する
+        removed = sorted(dst_scan.files.keys() - src_scan.files.keys() - src_scan.dirs)
+        moves = detect_moves(src, dst, src_scan, dst_scan, added, removed, hashes or {}, signatures)
+        for rel in added:
+            if rel in moves:
+                ops.append(TransferOp(kind='move', path=rel, size=src_scan.files[rel].size, label='Moved', source=moves[rel]))
+            else:
+                ops.append(TransferOp(kind='copy', path=rel, size=src_scan.files[rel].size, label='NewFile'))
+        # 余分なファイル・フォルダの削除
+        moved_from = set(moves.values())
+        for rel in removed:
+            if rel not in moved_from:
+                ops.append(TransferOp(kind='delete', path=rel, label='*EXTRAFile'))
+        for rel in sorted(dst_scan.dirs - src_scan.dirs - src_scan.files.keys(), reverse=True):
+            ops.append(TransferOp(kind='rmdir', path=rel, label='*EXTRADir'))
+        # 転送途中の一時ファイルは、再開するコピーがなければ削除
+        copying = {op.path for op in ops if op.kind == 'copy'}
+        for rel in sorted(dst_scan.partials):
+            if not (rel.endswith((settings.partial_file_ext, settings.journal_file_ext)) and rel.rsplit('.', 1)[0] in copying):
+                ops.append(TransferOp(kind='delete', path=rel, label='*EXTRAFile'))
+        return MirrorPlan(src=src, dst=dst, ops=ops)
+
+    def plan_bundles(self, plan: MirrorPlan, src_scan: TreeScan, bundles: BundleIndex):
+        """
+        小さなファイルのコピーを束への書き込みに、束ねたファイルの削除を索引からの削除に置き換える
+        """
+        limit = preferences.BundleMaxFileKB * 2**10
+        planned = {op.path for op in plan.ops}
+        for op in plan.ops:
+            if op.kind == 'delete' and op.path in bundles.entries:
+                op.kind = 'unbundle'
+            elif op.kind == 'copy' and preferences.BundleSmallFiles and 0 < op.size <= limit:
+                op.kind = 'bundle'
+        if not preferences.BundleSmallFiles:
+            return
+        # 不要になったファイルの多い束は、残りのファイルを新しい束へ詰め直す
+        sparse = bundles.sparse_bundles(planned)
+        for rel, entry in bundles.entries.items():
+            stat = src_scan.files.get(rel)
+            if entry.bundle in sparse and rel not in planned and stat is not None \
+                    and same_file_stat(stat, FileStat(entry.size, entry.mtime_ns), exact=True):
+                plan.ops.append(TransferOp(kind='bundle', path=rel, size=entry.size, label='Repack'))
+
+    def execute(self, plan: MirrorPlan, signatures: SignatureStore | None = None, bundles: BundleIndex | None = None, cancel_event: threading.Event | None = None) -> MirrorResult:
+        run = MirrorRun(plan, signatures, bundles, cancel_event)
+        os.makedirs(plan.dst, exist_ok=True)
+        ops_by_kind: dict[str, list[TransferOp]] = {
+            'delete': [], 'unbundle': [], 'rmdir': [], 'mkdir': [], 'move': [], 'copy': [], 'bundle': [],
+        }
+        for op in plan.ops:
+            ops_by_kind[op.kind].append(op)
+        # ファイル削除（並列）
+        self._run_parallel(run, ops_by_kind['delete'])
+        # 束ねたファイルは索引から削除する（束自体は格納したファイルがすべて不要になった時点で削除する）
+        for op in ops_by_kind['unbundle']:
+            bundles.discard(op.path)
+            run.done(op)
+        # フォルダ作成（浅い階層から順に）
+        for op in sorted(ops_by_kind['mkdir'], key=lambda op: op.path.count('/')):
+            self._run_op(run, op)
+        # ファイル移動（削除するフォルダ内のファイルも移動してから削除する）
+        self._run_parallel(run, ops_by_kind['move'])
+        # フォルダ削除（深い階層から順に）
+        for op in sorted(ops_by_kind['rmdir'], key=lambda op: op.path.count('/'), reverse=True):
+            self._run_op(run, op)
+        # ファイルコピー（並列）
+        self._run_parallel(run, ops_by_kind['copy'])
+        # 小さなファイルは束ごとにまとめて書き込む（束単位で並列）
+        batches: list[list[TransferOp]] = []
+        batch_size = target = preferences.BundleTargetMB * 2**20
+        for op in ops_by_kind['bundle']:
+            if batch_size >= target:
+                batches.append([])
+                batch_size = 0
+            batches[-1].append(op)
+            batch_size += op.size
+        futures = [self.pool.submit(self._write_bundle, run, batch) for batch in batches]
+        for future in futures:
+            future.result()
+        if bundles is not None:
+            bundles.collect_garbage(plan.dst)
+        run.result.log = '\n'.join(run.logs)
+        return run.result
+
+    def _write_bundle(self, run: MirrorRun, batch: list[TransferOp]):
+        if run.cancelled():
+            return
+        throttle.acquire_op()
+        # 同期先に個別のファイルとして残っている旧版は、束に書き込んだ後で削除する
+        replaced = [op.path for op in batch if op.label in ('Newer', 'Older') and op.path not in run.bundles.entries]
+        try:
+            name, entries = write_bundle(run.plan.src, run.plan.dst, [op.path for op in batch])
+        except OSError as e:
+            for op in batch:
+                run.fail(op, e)
+            return
+        run.bundles.add(name, entries)
+        for rel in replaced:
+            try:
+                with throttle.measure():
+                    os.remove(run.plan.dst / rel)
+            except FileNotFoundError:
+                pass
+        for op in batch:
+            if op.path in entries:
+                run.done(op, entries[op.path].size)
+            else:
+                run.fail(op, 'file not found')
+
+    def _run_parallel(self, run: MirrorRun, ops: list[TransferOp]):
+        futures = [self.pool.submit(self._run_op, run, op) for op in ops]
+        for future in futures:
+            future.result()
+
+    def _run_op(self, run: MirrorRun, op: TransferOp):
+        src = run.plan.src / op.path
+        dst = run.plan.dst / op.path
+        copied_bytes = op.size
+        # 中断の要求はファイル単位で確認する（実行中のコピーは完了させる）
+        if run.cancelled():
+            return
+        # ファイル操作数の制限
+        throttle.acquire_op()
+        try:
+            if op.kind == 'mkdir':
+                with throttle.measure():
+                    os.makedirs(dst, exist_ok=True)
+                return
+            if op.kind == 'copy':
+                copied_bytes = self._copy_file(run, op, src, dst)
+                if run.bundles is not None:
+                    # 束ねていたファイルを個別のファイルに置き換えた
+                    run.bundles.discard(op.path)
+            elif op.kind == 'move':
+                copied_bytes = self._move_file(run, op, src, dst)
+            elif op.kind == 'delete':
+                with throttle.measure():
+                    os.remove(dst)
+                if run.signatures is not None:
+                    run.signatures.discard(op.path)
+            elif op.kind == 'rmdir':
+                shutil.rmtree(dst)
+        except FileNotFoundError:
+            # 削除済み（マニフェストが実際より古い場合）
+            if op.kind == 'copy':
+                run.fail(op, 'file not found')
+            return
+        except OSError as e:
+            run.fail(op, e)
+            return
+        run.done(op, copied_bytes)
+
+    def _move_file(self, run: MirrorRun, op: TransferOp, src: Path, dst: Path) -> int:
+        """
+        同期先のファイルを移動する（移動元がなければコピーする）
+        書き込んだバイト数を返す
+        """
+        if run.bundles is not None and run.bundles.move(op.source, op.path):
+            return 0
+        try:
+            with throttle.measure():
+                os.replace(run.plan.dst / op.source, dst)
+        except FileNotFoundError:
+            return self._copy_file(run, op.model_copy(update={'kind': 'copy', 'label': 'NewFile'}), src, dst)
+        if run.signatures is not None:
+            run.signatures.move(op.source, op.path)
+        return 0
+
+    def _copy_file(self, run: MirrorRun, op: TransferOp, src: Path, dst: Path) -> int:
+        """
+        ファイルをコピーし、書き込んだバイト数を返す
+        しきい値以上の大きなファイルは、同期先のシグネチャを保持していれば差分のみ書き込む
+        それ以外の大きなファイルは、中断しても続きから再開できるようチャンク単位でコピーする
+        """
+        signatures = run.signatures
+        large = signatures is not None and op.size >= preferences.DeltaThresholdMB * 2**20
+        if large and op.label != 'NewFile' and dst.is_file():
+            dst_st = os.stat(dst)
+            signature = signatures.get(op.path, FileStat(dst_st.st_size, dst_st.st_mtime_ns))
+            # シグネチャがなければ同期先は読まずに全体をコピーする（中断した差分転送は記録から再開する）
+            if signature is not None or load_patch_journal(src, dst) is not None:
+                written, signature = delta_copy(src, dst, signature)
+                signatures.put(op.path, signature)
+                return written
+        if op.size >= preferences.ResumableThresholdMB * 2**20:
+            written = resumable_copy(src, dst)
+        else:
+            fastcopy.replace_file(src, dst)
+            written = op.size
+        if large:
+            # 次回の差分転送に備え、ローカル側からシグネチャを作成しておく
+            signatures.put(op.path, compute_signature(src))
+        return written
+
+    def mirror(self, src: Path, dst: Path, manifest_path: Path | None = None, cancel_event: threading.Event | None = None, src_scan: TreeScan | None = None) -> MirrorResult:
+        timings: dict[str, float] = {}
+        with phase(timings, 'scan'):
+            manifest = Manifest.load(manifest_path) if manifest_path else None
+            src_scan, dst_scan, verified = self.scan_pair(src, dst, manifest, src_scan)
+            # 束ねたファイルも同期先のファイルとして扱う（マニフェストを使う場合は記録済み）
+            bundles = BundleIndex.load(dst) if verified else None
+            if bundles is not None:
+                dst_scan.files.update(bundles.stats())
+        signatures = SignatureStore.load(manifest_path.parent / settings.signatures_ext) if manifest_path else None
+        with phase(timings, 'plan'):
+            plan = self.plan_from_scans(src, dst, src_scan, dst_scan, manifest_hashes(manifest, dst), signatures)
+            if plan.ops:
+                bundles = bundles or BundleIndex.load(dst)
+                self.plan_bundles(plan, src_scan, bundles)
+        with phase(timings, 'copy'):
+            result = self.execute(plan, signatures, bundles, cancel_event)
+        with phase(timings, 'metadata'):
+            if signatures is not None:
+                signatures.dump(manifest_path.parent / settings.signatures_ext)
+            if bundles is not None:
+                bundles.dump(dst)
+            if manifest_path is not None:
+                if result.error or result.cancelled:
+                    # 同期先の状態が不明になったため、次回は両側を走査する
+                    manifest_path.unlink(missing_ok=True)
+                elif result.changed or verified or manifest is None:
+                    new_manifest = Manifest.from_scan(src_scan, dst, manifest, verified)
+                    if manifest is not None:
+                        new_manifest.carry_moves(manifest, {op.path: op.source for op in plan.ops if op.kind == 'move'})
+                    new_manifest.dump(manifest_path)
+        result.src_bytes = sum(stat.size for stat in src_scan.files.values())
+        result.timings = timings
+        return result
+
+
+def manifest_hashes(manifest: Manifest | None, dst: Path) -> dict[str, str]:
+    if manifest is None or manifest.dst != str(dst):
+        return {}
+    return {rel: entry.hash for rel, entry in manifest.entries.items() if entry.hash}
+
+
+def detect_moves(src: Path, dst: Path, src_scan: TreeScan, dst_scan: TreeScan, added: list[str], removed: list[str], hashes: dict[str, str], signatures: SignatureStore | None = None) -> dict[str, str]:
+    """
+    追加されたファイルと削除されたファイルを対応付け、移動（リネーム）とみなせる組を返す（新しいパス → 移動元）
+    - ファイルID・サイズ・更新日時（ナノ秒まで）が一致すれば、内容を読まずに同じファイルとみなす
+    - サイズ・更新日時のみが一致する候補は、同期先の内容を記録したハッシュかシグネチャがある場合に限り、ローカルの内容と比較する
+    どちらでも確認できなければ移動とせず、コピーと削除にする（計画の段階では同期先を読み込まない）
+    """
+    by_size: dict[int, list[str]] = {}
+    for rel in removed:
+        stat = dst_scan.files[rel]
+        # 空のファイルはコピーしても転送量がない
+        if stat.size > 0:
+            by_size.setdefault(stat.size, []).append(rel)
+    candidates: dict[str, list[str]] = {}
+    for rel in added:
+        stat = src_scan.files[rel]
+        matched = [old for old in by_size.get(stat.size, []) if same_file_stat(stat, dst_scan.files[old], dst_scan.exact)]
+        if matched:
+            candidates[rel] = matched
+    moves: dict[str, str] = {}
+    used: set[str] = set()
+    # ファイルIDの一致（マニフェストに記録した同期元のファイルID）
+    for rel, matched in candidates.items():
+        stat = src_scan.files[rel]
+        old = next((
+            old for old in matched
+            if stat.file_id and dst_scan.files[old].file_id == stat.file_id
+            and dst_scan.files[old].mtime_ns == stat.mtime_ns and old not in used
+        ), None)
+        if old is not None:
+            moves[rel] = old
+            used.add(old)
+    # 残りの候補は記録した内容と比較する
+    verifier = ContentVerifier(src, dst_scan, hashes, signatures)
+    for rel, matched in candidates.items():
+        if rel in moves:
+            continue
+        old = next((old for old in matched if old not in used and verifier.same_content(rel, old)), None)
+        if old is not None:
+            moves[rel] = old
+            used.add(old)
+    return moves
+
+
+class ContentVerifier:
+    """
+    同期元のファイルの内容が、同期先のファイルについて記録した内容と一致するかを確認する（移動の判定）
+    マニフェストに記録したハッシュ、次に差分転送用のシグネチャと比較する（同期先は読み込まない）
+    """
+
+    def __init__(self, src: Path, dst_scan: TreeScan, hashes: dict[str, str], signatures: SignatureStore | None = None):
+        self.src = src
+        self.dst_scan = dst_scan
+        self.hashes = hashes
+        self.signatures = signatures
+        self._src_hashes: dict[str, str] = {}
+        self._results: dict[tuple[str, str], bool] = {}
+
+    def same_content(self, rel: str, old: str) -> bool:
+        key = (rel, old)
+        if key not in self._results:
+            try:
+                self._results[key] = self._compare(rel, old)
+            except OSError:
+                self._results[key] = False
+        return self._results[key]
+
+    def _compare(self, rel: str, old: str) -> bool:
+        hash_ = self.hashes.get(old)
+        if hash_ is not None and hash_.startswith(f'{hash_name()}:'):
+            return self._src_hash(rel) == hash_
+        signature = self.signatures.get(old, self.dst_scan.files[old]) if self.signatures is not None else None
+        if signature is not None:
+            # シグネチャは同期先へ書き込んだ内容からローカルで作成したもの
+            src_signature = compute_signature(self.src / rel, signature.block_size)
+            return src_signature.size == signature.size and src_signature.strong == signature.strong
+        # 記録がなければ確認できない（コピーする）
+        return False
+
+    def _src_hash(self, rel: str) -> str:
+        if rel not in self._src_hashes:
+            self._src_hashes[rel] = file_hash(self.src / rel, background=False)
+        return self._src_hashes[rel]
+
+
+class MirrorRun:
+    """
+    ミラーリング1回分の実行状態（ワーカースレッド間で共有）
+    """
+
+    def __init__(self, plan: MirrorPlan, signatures: SignatureStore | None = None, bundles: BundleIndex | None = None, cancel_event: threading.Event | None = None):
+        self.plan = plan
+        self.signatures = signatures
+        self.bundles = bundles
+        self.cancel_event = cancel_event
+        self.result = MirrorResult(changed=plan.changed)
+        self.logs: list[str] = []
+        self.lock = threading.Lock()
+
+    def done(self, op: TransferOp, copied_bytes: int = 0):
+        with self.lock:
+            if op.kind == 'copy' or copied_bytes:
+                self.result.copied_files += 1
+                self.result.copied_bytes += copied_bytes
+            elif op.kind == 'move':
+                self.result.moved_files += 1
+            elif op.kind in ('delete', 'unbundle'):
+                self.result.removed_files += 1
+            if op.kind == 'move':
+                self.logs.append(f'{op.label} {op.source} -> {op.path}')
+            else:
+                self.logs.append(f'{op.label} {op.path}')
+
+    def cancelled(self) -> bool:
+        if self.cancel_event is None or not self.cancel_event.is_set():
+            return False
+        with self.lock:
+            self.result.cancelled = True
+        return True
+
+    def fail(self, op: TransferOp, error: object):
+        with self.lock:
+            self.result.error = True
+            self.logs.append(f'ERROR {op.label} {op.path}: {error}')
+
+
+_backends: dict[tuple[str, int], TransferBackend] = {}
+_backends_lock = threading.Lock()
+
+def get_backend() -> TransferBackend:
+    """
+    設定に応じた転送バックエンドを取得
+    """
+    key = (preferences.TransferEngine, preferences.TransferWorkers)
+    with _backends_lock:
+        if key not in _backends:
+            if preferences.TransferEngine == RobocopyBackend.name:
+                _backends[key] = RobocopyBackend()
+            else:
+                _backends[key] = NativeTransferBackend(preferences.TransferWorkers)
+        return _backends[key]
+
+
+def get_planner() -> NativeTransferBackend:
+    """
+    ミラーリング計画の作成に使うバックエンド（robocopy は事前に計画を立てられないため、常に Python実装を使う）
+    """
+    backend = get_backend()
+    if isinstance(backend, NativeTransferBackend):
+        return backend
+    key = (NativeTransferBackend.name, preferences.TransferWorkers)
+    with _backends_lock:
+        if key not in _backends:
+            _backends[key] = NativeTransferBackend(preferences.TransferWorkers)
+        return _backends[key]
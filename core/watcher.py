@@ -0,0 +1,109 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable
+import threading
+
+from config import settings
+from config.settings import preferences
+from core.dirsync import SyncDirectory
+
+# watchdog は任意依存（Linux: inotify, Windows: ReadDirectoryChangesW）
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler, FileSystemEvent
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    FileSystemEvent = object
+
+
+def is_available() -> bool:
+    return Observer is not None
+
+
+class DirtyFolderWatcher(FileSystemEventHandler):
+    """
+    ローカルフォルダの変更を監視し、変更のあった同期フォルダのIDをまとめて通知するクラス
+    最後の変更から一定時間（デバウンス）変更がなければ通知する
+    """
+
+    def __init__(self, root: Path, on_settled: Callable[[set[str]], None], debounce_sec: float):
+        super().__init__()
+        self.root = root
+        self.on_settled = on_settled
+        self.debounce_sec = debounce_sec
+        self._dirty: set[Path] = set()
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self._observer = None
+
+    def start(self):
+        self._observer = Observer()
+        self._observer.schedule(self, str(self.root), recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.event_type in ('opened', 'closed_no_write'):
+            return
+        folders = {self._folder_of(event.src_path)}
+        if getattr(event, 'dest_path', ''):
+            folders.add(self._folder_of(event.dest_path))
+        folders.discard(None)
+        if not folders:
+            return
+        with self._lock:
+            self._dirty |= folders
+            # デバウンス：変更のたびにタイマーを掛け直す
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce_sec, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _folder_of(self, path: str | bytes) -> Path | None:
+        path = Path(path.decode() if isinstance(path, bytes) else path)
+        # 管理ファイルの更新は同期処理自身によるものなので無視
+        if path.name in settings.mirror_excludes:
+            return None
+        try:
+            rel = path.relative_to(self.root)
+        except ValueError:
+            return None
+        if not rel.parts:
+            return None
+        folder = self.root / rel.parts[0]
+        # ルート直下のファイルは同期対象外
+        if len(rel.parts) == 1 and not folder.is_dir():
+            return None
+        return folder
+
+    def _flush(self):
+        with self._lock:
+            folders, self._dirty = self._dirty, set()
+            self._timer = None
+        ids: set[str] = set()
+        for folder in folders:
+            if not folder.is_dir():
+                # 削除・リネーム元のフォルダは全体スキャンで処理する
+                continue
+            ids.add(SyncDirectory.create(folder).id_)
+        if ids:
+            print(f'\nChanged: {", ".join(sorted(f.stem for f in folders))}')
+            self.on_settled(ids)
+
+
+def create_watcher(root: Path, on_settled: Callable[[set[str]], None]) -> DirtyFolderWatcher | None:
+    if not is_available():
+        print('watchdog is not installed: watch mode disabled')
+        return None
+    return DirtyFolderWatcher(root, on_settled, preferences.WatchDebounceSeconds)
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import os
+
+from config.settings import preferences
+
+
+_lock = threading.Lock()
+_folder_pool: ThreadPoolExecutor | None = None
+_folder_pool_size: int = 0
+_remote_slots: dict[int, tuple[int, threading.BoundedSemaphore]] = {}
+_folder_locks: dict[str, threading.RLock] = {}
+
+
+def folder_pool() -> ThreadPoolExecutor:
+    """
+    フォルダ単位の同期を実行する共有ワーカープール（SyncWorkers で大きさを指定）
+    """
+    global _folder_pool, _folder_pool_size
+    with _lock:
+        size = max(1, preferences.SyncWorkers)
+        if _folder_pool is None or _folder_pool_size != size:
+            if _folder_pool is not None:
+                # 実行中のタスクは古いプールで完了させる
+                _folder_pool.shutdown(wait=False)
+            _folder_pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix='fxcc-folder')
+            _folder_pool_size = size
+        return _folder_pool
+
+
+def remote_key(path_: Path) -> int:
+    # 同一ボリューム（共有）上のリモートは同じ上限を共有する
+    try:
+        return os.stat(path_).st_dev
+    except OSError:
+        return hash(path_.anchor)
+
+
+@contextmanager
+def remote_slot(path_: Path):
+    """
+    リモートごとの同時同期数の上限（MaxSyncsPerRemote）を守るためのスロット
+    """
+    key = remote_key(path_)
+    size = max(1, preferences.MaxSyncsPerRemote)
+    with _lock:
+        if key not in _remote_slots or _remote_slots[key][0] != size:
+            _remote_slots[key] = (size, threading.BoundedSemaphore(size))
+        _, slot = _remote_slots[key]
+    with slot:
+        yield
+
+
+def folder_lock(id_: str) -> threading.RLock:
+    """
+    同期フォルダごとのロック（同期とバックグラウンドの整合性チェックが、同じフォルダのマニフェストとリモートを同時に更新しない）
+    """
+    with _lock:
+        if id_ not in _folder_locks:
+            _folder_locks[id_] = threading.RLock()
+        return _folder_locks[id_]
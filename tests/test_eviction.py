@@ -0,0 +1,94 @@
+"""
+容量による削除のテスト
+
+    python -m unittest discover -s tests
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# 設定ファイル・状態データベースは一時フォルダに作成する
+os.chdir(tempfile.mkdtemp(prefix='fxcc-test-'))
+os.makedirs('config', exist_ok=True)
+
+from config.settings import preferences
+from core.dirsync import LocalRootDirectory, RemoteRootDirectory
+
+
+class WatchTriggeredEvictionTest(unittest.TestCase):
+    """
+    変更を検知した同期（対象フォルダを指定）で容量を超えた場合
+    """
+
+    def setUp(self):
+        self.work = Path(tempfile.mkdtemp(prefix='fxcc-eviction-'))
+        self.local_path = self.work / 'local'
+        self.remote_path = self.work / 'remote'
+        for name, size in (('idle-large', 4), ('idle-small', 1), ('editing', 2)):
+            os.makedirs(self.local_path / name)
+            (self.local_path / name / 'data.bin').write_bytes(os.urandom(size * 2**20))
+        os.makedirs(self.remote_path)
+        self.saved = preferences.model_copy()
+        preferences.LocalQuotaGB = 0
+        preferences.BundleSmallFiles = False
+        preferences.SnapshotMode = False
+
+    def tearDown(self):
+        for name, value in self.saved:
+            setattr(preferences, name, value)
+        shutil.rmtree(self.work, ignore_errors=True)
+
+    def roots(self) -> tuple[LocalRootDirectory, RemoteRootDirectory]:
+        local = LocalRootDirectory(path_=self.local_path)
+        remote = RemoteRootDirectory(path_=self.remote_path)
+        local.check()
+        remote.check()
+        return local, remote
+
+    def test_evicts_idle_folders_and_keeps_the_edited_one(self):
+        local, remote = self.roots()
+        local.sync(remote)
+        # 最初の同期から時間が経ったものとする
+        for sync_dir in local.sync_directories:
+            sync_dir.modified_at = sync_dir.synced_at = datetime.now() - timedelta(days=3)
+            sync_dir.verified_at = sync_dir.synced_at
+            sync_dir.dump()
+        local.dump()
+        # 作業中のフォルダを変更し、そのフォルダのみ同期する（容量は合計 7 MiB に対して 5 MiB）
+        (self.local_path / 'editing' / 'data.bin').write_bytes(os.urandom(2 * 2**20))
+        preferences.LocalQuotaGB = 5 / 2**10
+        preferences.EvictHighWatermarkPercent = 90
+        preferences.EvictLowWatermarkPercent = 75
+        local, remote = self.roots()
+        editing = next(d for d in local.sync_directories if d.path_.name == 'editing')
+        local.sync(remote, ids={editing.id_})
+        self.assertTrue((self.local_path / 'editing').exists())
+        self.assertFalse((self.local_path / 'idle-large').exists())
+        self.assertTrue((self.remote_path / 'idle-large' / 'data.bin').exists())
+
+    def test_keeps_folders_changed_since_their_last_sync(self):
+        local, remote = self.roots()
+        local.sync(remote)
+        for sync_dir in local.sync_directories:
+            sync_dir.modified_at = sync_dir.synced_at = datetime.now() - timedelta(days=3)
+            sync_dir.verified_at = sync_dir.synced_at
+            sync_dir.dump()
+        local.dump()
+        # 同期していない変更がある idle-large は削除せず、次の候補を削除する
+        (self.local_path / 'idle-large' / 'data.bin').write_bytes(os.urandom(4 * 2**20))
+        preferences.LocalQuotaGB = 5 / 2**10
+        local, remote = self.roots()
+        editing = next(d for d in local.sync_directories if d.path_.name == 'editing')
+        local.sync(remote, ids={editing.id_})
+        self.assertTrue((self.local_path / 'idle-large').exists())
+        self.assertTrue((self.local_path / 'editing').exists())
+        self.assertFalse((self.local_path / 'idle-small').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
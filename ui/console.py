@@ -1,21 +1,26 @@
 import gradio as gr
-import yaml
-import wx
-app = wx.App(False)
 from pathlib import Path
-from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime
 import os
 
 from config import settings
-from config.settings import preferences
+from config.settings import preferences, SyncPair
 from core.dirsync import LocalRootDirectory, RemoteRootDirectory, SyncDirectory
-from backend import watch, scheduler
+from core.state import store
+from core.metrics import registry
+from core import eviction, restore, snapshot, coordinator, preview
+from backend import watch_pair, schedule_pairs, start_watcher
 
 # --- コールバック ---
 
 # フォルダ選択
+wx_app = None
 def select_directory(default: str):
+    global wx_app
+    # wxPython はダイアログを開くときに初めて読み込む
+    import wx
+    if wx_app is None:
+        wx_app = wx.App(False)
     folder = default
     dialog = wx.DirDialog(None, "フォルダを選択してください", style=wx.DD_DIR_MUST_EXIST)
     if dialog.ShowModal() == wx.ID_OK:
@@ -24,30 +29,146 @@ def select_directory(default: str):
     return folder
 
 # マニュアル同期
-def manual_sync():
-    if settings.has_root_dirs():
-        watch()
+def manual_sync(pair_name: str):
+    pair = settings.get_pair(pair_name)
+    if pair is not None and pair.has_root_dirs():
+        # 実行中なら完了後にもう一度同期する
+        if coordinator.is_running(pair.Name):
+            gr.Info("Sync is running. Another sync will start when it finishes.")
+        watch_pair(pair.Name)
     return datetime.now()
 
-# 数値設定を反映
-def apply_settings(local_root: str, remote_root: str, sync_every: int, hold_after_created: int, hold_after_modified: int, port: int):
-    preferences.LocalDirectory = Path(local_root)
-    preferences.RemoteDirectory = Path(remote_root)
-    if sync_every != preferences.SyncFreqMinutes:
-        preferences.SyncFreqMinutes = sync_every
-        scheduler.modify_job(
-            job_id="watch_sync",
-            trigger=IntervalTrigger(seconds=sync_every*60)
-        )
-    if hold_after_created != preferences.HoldAfterCreatedDays:
-        preferences.HoldAfterCreatedDays = hold_after_created
-    if hold_after_modified != preferences.HoldAfterModifiedDays:
-        preferences.HoldAfterModifiedDays = hold_after_modified
+# 同期の中断（コピー中のファイルは完了させる）
+def cancel_sync(pair_name: str):
+    if not coordinator.cancel(pair_name):
+        raise gr.Error("Sync is not running.")
+    gr.Info(f"Cancelling sync: {pair_name}")
+
+# 組ごとの同期の実行状態
+run_state_headers = ["Pair", "Status", "Trigger", "Elapsed [s]", "Folders", "Files", "Copied [MiB]", "Queued"]
+def run_state_table():
+    return [
+        [s.pair, s.status, s.trigger, round(s.duration, 1), s.folders, s.copied_files, round(s.copied_bytes / 2**20, 1), s.pending]
+        for s in coordinator.states(pair_names())
+    ]
+
+# 数値設定を反映（フォルダ・保持期間などは選択中の組に設定する）
+def apply_settings(pair_name: str, local_root: str, remote_root: str, sync_every: int, watch_mode: bool, hold_after_created: int, hold_after_modified: int, local_quota: float, port: int):
+    pair = settings.get_pair(pair_name)
+    if pair is None:
+        pair = SyncPair(Name=pair_name)
+        preferences.SyncPairs.append(pair)
+    pair.LocalDirectory = Path(local_root)
+    pair.RemoteDirectory = Path(remote_root)
+    pair.SyncFreqMinutes = sync_every
+    pair.HoldAfterCreatedDays = hold_after_created
+    pair.HoldAfterModifiedDays = hold_after_modified
+    pair.LocalQuotaGB = local_quota
+    preferences.WatchMode = watch_mode
     if port != preferences.ServerPort:
         preferences.ServerPort = port
     preferences.dump()
+    schedule_pairs()
+    start_watcher()
     gr.Info("Preferences updated.")
-    return manual_sync()
+    return manual_sync(pair_name)
+
+# 組の選択肢
+def pair_names() -> list[str]:
+    return [pair.Name for pair in preferences.SyncPairs] or [settings.default_pair_name]
+
+# 選択した組の設定を表示
+def select_pair(pair_name: str):
+    pair = settings.get_pair(pair_name) or SyncPair(Name=pair_name)
+    return (
+        str(pair.LocalDirectory),
+        str(pair.RemoteDirectory),
+        pair.get("SyncFreqMinutes"),
+        pair.get("HoldAfterCreatedDays"),
+        pair.get("HoldAfterModifiedDays"),
+        pair.get("LocalQuotaGB"),
+        0,
+    )
+
+# 組の追加
+def add_pair(name: str):
+    name = name.strip()
+    if not name:
+        raise gr.Error("Enter a name for the new pair.")
+    if settings.get_pair(name) is not None:
+        raise gr.Error("A pair with the same name already exists.")
+    preferences.SyncPairs.append(SyncPair(Name=name))
+    preferences.dump()
+    return gr.update(choices=pair_names(), value=name), ""
+
+# 組の削除（フォルダは削除せず、同期対象から外す）
+def remove_pair(pair_name: str):
+    preferences.SyncPairs = [pair for pair in preferences.SyncPairs if pair.Name != pair_name]
+    preferences.dump()
+    schedule_pairs()
+    start_watcher()
+    gr.Info(f"Pair removed: {pair_name}")
+    return gr.update(choices=pair_names(), value=pair_names()[0])
+
+# 同期状態の更新確認（変更がなければ再描画しない）
+def poll_version(current: int):
+    version = store.version()
+    if version == current:
+        return gr.skip()
+    return version
+
+# 同期履歴の表
+metrics_headers = ["Started at", "Pair", "Status", "Duration [s]", "Folders", "Files", "Copied [MiB]", "MiB/s", "Scan [s]", "Copy [s]", "Metadata [s]"]
+def metrics_table():
+    rows = []
+    for run in registry.recent_runs():
+        folder_timings = run.folder_timings()
+        rows.append([
+            run.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            run.pair,
+            run.status,
+            round(run.duration, 2),
+            len(run.folders),
+            run.copied_files,
+            round(run.copied_bytes / 2**20, 1),
+            round(run.bytes_per_sec / 2**20, 1),
+            round(folder_timings.get("scan", 0.0), 2),
+            round(folder_timings.get("copy", 0.0), 2),
+            round(folder_timings.get("metadata", 0.0), 2),
+        ])
+    return rows
+
+# 次の同期の計画（コピーせずに見積もる）
+plan_headers = ["Folder", "Status", "Added", "Updated", "Moved", "Deleted", "Copy [MiB]", "ETA"]
+def plan_preview(pair_name: str):
+    result = preview.preview_pair(pair_name)
+    rows = [
+        [f.name, f.status if not f.error else f"{f.status}: {f.error}", f.adds, f.updates, f.moves, f.deletes,
+         round(f.bytes_total / 2**20, 1), preview.format_eta(result.eta_seconds(f.bytes_total))]
+        for f in result.folders
+    ]
+    return f"{result.planned_at:%Y-%m-%d %H:%M:%S}　　{result.summary()}", rows
+
+# フォルダ一覧のページ数
+def page_count_for(folder_count: int) -> int:
+    page_size = settings.console_page_size
+    return max(1, (folder_count + page_size - 1) // page_size)
+
+# ページ移動（ローカル・リモートのどちらかにあるフォルダの数から求めた最終ページまで）
+def move_page(page: int, step: int, pair_name: str):
+    ids: set[str] = set()
+    for root in (LocalRootDirectory.load(pair_name), RemoteRootDirectory.load(pair_name)):
+        if root is not None:
+            ids.update(d.id_ for d in root.sync_directories)
+    return min(max(0, page + step), page_count_for(len(ids)) - 1)
+
+# 削除予定の表示（容量を設定している場合はフォルダサイズ）
+def get_removal_text(sync_local: SyncDirectory | None) -> str:
+    if sync_local is None:
+        return ""
+    if eviction.quota_enabled(sync_local.path_):
+        return f"By quota ({sync_local.size_bytes / 2**30:.2f} GB)"
+    return sync_local.be_removed_at.strftime("%Y-%m-%d %H:%M")
 
 # 絵文字取得
 def get_icon_emojis(sync_rocal: SyncDirectory, sync_remote: SyncDirectory):
@@ -77,6 +198,8 @@ def lock_remote(sync_local: SyncDirectory, sync_remote: SyncDirectory, root_remo
 
 # リモートフォルダのアンロック
 def unlock_remote(sync_local: SyncDirectory, sync_remote: SyncDirectory, root_remote: RemoteRootDirectory):
+    if restore.is_running(sync_remote.id_) or (sync_local is not None and sync_local.restoring):
+        raise gr.Error("Local folder is being restored.")
     sync_remote.unlock()
     sync_remote.dump()
     root_remote.sync_directories = [sync_remote if sync_remote.id_ == dir_.id_ else dir_ for dir_ in root_remote.sync_directories]
@@ -93,6 +216,8 @@ def unlock_remote(sync_local: SyncDirectory, sync_remote: SyncDirectory, root_re
 def remove_local_dir(sync_local: SyncDirectory, sync_remote: SyncDirectory, root_local: LocalRootDirectory):
     if not sync_remote.locked:
         raise gr.Error("Remote folder is not locked.")
+    if restore.is_running(sync_remote.id_):
+        raise gr.Error("Local folder is being restored.")
     sync_local.remove()
     root_local.sync_directories = [dir_ for dir_ in root_local.sync_directories if dir_.id_ != sync_local.id_]
     root_local.dump()
@@ -104,33 +229,93 @@ def remove_local_dir(sync_local: SyncDirectory, sync_remote: SyncDirectory, root
         gr.update(interactive=True), 
     ) 
 
-# リモートフォルダのダウンロード
+# リモートフォルダのダウンロード（バックグラウンドで復元）
 def download_remote_dir(sync_local: SyncDirectory, sync_remote: SyncDirectory, root_local: LocalRootDirectory):
     if not sync_remote.locked:
         raise gr.Error("Remote folder is not locked.")
-    if sync_local is not None:
+    if sync_local is not None and not sync_local.restoring:
         raise gr.Error("Local folder already exists.")
-    # コピー先フォルダ生成
-    dst = root_local.path_ / sync_remote.path_.stem
-    os.makedirs(dst, exist_ok=True)
-    sync_local = SyncDirectory.create(dst, sync_remote.id_)
-    # 同期実行
-    sync_remote.sync(sync_local)
-    # ローカルプロパティ更新
-    now = sync_remote.synced_at
-    sync_local.created_at = sync_remote.created_at
-    sync_local.modified_at = now
-    sync_local.synced_at = now
-    root_local.sync_directories.append(sync_local)
-    root_local.dump()
+    sync_remote.download(root_local)
+    gr.Info(f"Restore started: {sync_remote.path_.stem}")
     return (
-        get_icon_emojis(sync_local, sync_remote),
+        get_icon_emojis(None, sync_remote),
+        gr.update(interactive=False), 
+        gr.update(interactive=False), 
         gr.update(interactive=False), 
-        gr.update(interactive=True), 
-        gr.update(interactive=True), 
         gr.update(interactive=False), 
     ) 
 
+# 復元の進捗
+restore_headers = ["Name", "Status", "Files", "Restored [MiB]", "Total [MiB]", "Progress [%]"]
+def restore_status(current_choices: list):
+    progress_list = restore.progress_list()
+    rows = [
+        [p.name, p.status, f"{p.files_done} / {p.files_total}", round(p.bytes_done / 2**20, 1), round(p.bytes_total / 2**20, 1), round(p.percent, 1)]
+        for p in progress_list
+    ]
+    # 実行中の一覧が変わった場合のみ選択肢を更新する
+    choices = [(p.name, p.id_) for p in progress_list if p.status == "running"]
+    if choices == current_choices:
+        return rows, gr.skip(), gr.skip()
+    return rows, gr.update(choices=choices, value=None), choices
+
+# 復元のキャンセル
+def cancel_restore(id_: str | None):
+    if not id_:
+        raise gr.Error("Select a restore to cancel.")
+    restore.cancel(id_)
+    gr.Info("Restore cancelled.")
+
+# スナップショットを表示する同期フォルダの選択肢
+def snapshot_folders(pair_name: str):
+    root_remote = RemoteRootDirectory.load(pair_name)
+    folders = root_remote.sync_directories if root_remote is not None else []
+    choices = sorted((d.path_.stem, d.id_) for d in folders)
+    return gr.update(choices=choices, value=None)
+
+# スナップショットの一覧
+snapshot_headers = ["Snapshot", "Created at", "Files", "Total [MiB]", "Added [MiB]"]
+def snapshot_list(pair_name: str, id_: str | None):
+    pair = settings.get_pair(pair_name)
+    if not id_ or pair is None or pair.RemoteDirectory is None:
+        return [], gr.update(choices=[], value=None)
+    infos = snapshot.list_snapshots(pair.RemoteDirectory, id_)
+    rows = [
+        [i.snapshot, i.created_at.strftime("%Y-%m-%d %H:%M:%S"), i.files, round(i.total_bytes / 2**20, 1), round(i.added_bytes / 2**20, 1)]
+        for i in infos
+    ]
+    return rows, gr.update(choices=[i.snapshot for i in infos], value=None)
+
+# スナップショットからローカルへ復元（ローカルフォルダがあれば、その時点の内容に戻す）
+def restore_snapshot(pair_name: str, id_: str | None, snapshot_name: str | None):
+    if not id_ or not snapshot_name:
+        raise gr.Error("Select a folder and a snapshot to restore.")
+    root_local = LocalRootDirectory.load(pair_name)
+    root_remote = RemoteRootDirectory.load(pair_name)
+    if root_local is None or root_remote is None:
+        raise gr.Error("Folders have not been synced yet.")
+    sync_remote = next((d for d in root_remote.sync_directories if d.id_ == id_), None)
+    if sync_remote is None:
+        raise gr.Error("Remote folder not found.")
+    if restore.is_running(id_):
+        raise gr.Error("Restore is already running.")
+    sync_local = next((d for d in root_local.sync_directories if d.id_ == id_), None)
+    if sync_local is not None and sync_local.path_.stem != sync_remote.path_.stem:
+        raise gr.Error("Local folder has been renamed. Sync before restoring.")
+    snapshot_path = snapshot.snapshots_dir(root_remote.path_, id_) / snapshot_name
+    sync_remote.download(root_local, snapshot_path)
+    gr.Info(f"Restore started: {sync_remote.path_.stem} @ {snapshot_name}")
+
+# フォルダごとの変更履歴（新しい順）
+history_headers = ["Synced at", "Changes"]
+def folder_history(id_: str | None):
+    if not id_:
+        return []
+    return [
+        [created_at.strftime("%Y-%m-%d %H:%M:%S"), message]
+        for created_at, message in store.folder_logs(id_, settings.console_history_size)
+    ]
+
 # --- UI実装 ---
 
 # gradioインターフェースの作成
@@ -138,49 +323,141 @@ def create_gradio_ui():
     css = (Path("ui") / "console_main.css").read_text(encoding="utf8")
     with gr.Blocks(css=css) as demo:
         gr_state_on = gr.State(False)
+        # 同期するフォルダの組
+        names = pair_names()
+        first_pair = settings.get_pair(names[0]) or SyncPair(Name=names[0])
+        with gr.Row(equal_height=True):
+            gr_dd_pair: gr.Dropdown = gr.Dropdown(names, value=names[0], label="🗂️Sync Pair", interactive=True, scale=4)
+            gr_text_new_pair: gr.Textbox = gr.Textbox("", label="New Pair Name", interactive=True, scale=2)
+            gr_btn_add_pair: gr.Button = gr.Button("Add Pair", elem_id="button")
+            gr_btn_remove_pair: gr.Button = gr.Button("Remove Pair", elem_id="button")
         # 設定
         has_root_dirs = settings.has_root_dirs()
         with gr.Accordion("Preferences", open=not has_root_dirs) as gr_accordion_pref:
             with gr.Row(equal_height=True):
-                gr_text_local: gr.Textbox = gr.Textbox(str(preferences.LocalDirectory), label="📁Local Folder", interactive=False)
+                gr_text_local: gr.Textbox = gr.Textbox(str(first_pair.LocalDirectory), label="📁Local Folder", interactive=False)
                 gr_btn_open_local: gr.Button = gr.Button("Open", elem_id="button")
             with gr.Row(equal_height=True):
-                gr_text_remote: gr.Textbox = gr.Textbox(str(preferences.RemoteDirectory), label="☁️Remote Folder", interactive=False)
+                gr_text_remote: gr.Textbox = gr.Textbox(str(first_pair.RemoteDirectory), label="☁️Remote Folder", interactive=False)
                 gr_btn_open_remote: gr.Button = gr.Button("Open", elem_id="button")
             with gr.Row(equal_height=True):
-                gr_num_sync_freq_mins: gr.Number = gr.Number(preferences.SyncFreqMinutes, minimum=1, step=1, label="🔄️Sync Every [mins]", interactive=True)
-                gr_num_hold_after_created_days: gr.Number = gr.Number(preferences.HoldAfterCreatedDays, minimum=0, step=1, label="📄Remove Local After Created [days]", interactive=True)
-                gr_num_hold_after_modified_days: gr.Number = gr.Number(preferences.HoldAfterModifiedDays, minimum=0, step=1, label="📝Remove Local After Modified [days]", interactive=True)
+                gr_num_sync_freq_mins: gr.Number = gr.Number(first_pair.get("SyncFreqMinutes"), minimum=1, step=1, label="🔄️Sync Every [mins]", interactive=True)
+                gr_check_watch_mode: gr.Checkbox = gr.Checkbox(preferences.WatchMode, label="👀Sync On Change", interactive=True)
+                gr_num_hold_after_created_days: gr.Number = gr.Number(first_pair.get("HoldAfterCreatedDays"), minimum=0, step=1, label="📄Remove Local After Created [days]", interactive=True)
+                gr_num_hold_after_modified_days: gr.Number = gr.Number(first_pair.get("HoldAfterModifiedDays"), minimum=0, step=1, label="📝Remove Local After Modified [days]", interactive=True)
+                gr_num_local_quota_gb: gr.Number = gr.Number(first_pair.get("LocalQuotaGB"), minimum=0, label="💾Local Quota [GB] (0: remove by date)", interactive=True)
                 gr_num_server_port: gr.Number = gr.Number(preferences.ServerPort, minimum=1, step=1, label="💻Console Server Port (from next launch)", interactive=True)
             gr_btn_apply_settings: gr.Button = gr.Button("Apply")
         gr_btn_open_local.click(select_directory, inputs=gr_text_local, outputs=gr_text_local)
         gr_btn_open_remote.click(select_directory, inputs=gr_text_remote, outputs=gr_text_remote)
         gr_btn_apply_settings.click(apply_settings, inputs=[
+            gr_dd_pair,
             gr_text_local,
             gr_text_remote,
             gr_num_sync_freq_mins,
+            gr_check_watch_mode,
             gr_num_hold_after_created_days,
             gr_num_hold_after_modified_days,
+            gr_num_local_quota_gb,
             gr_num_server_port,
         ], outputs=gr_state_on)
+        gr_btn_add_pair.click(add_pair, inputs=gr_text_new_pair, outputs=[gr_dd_pair, gr_text_new_pair])
+        gr_btn_remove_pair.click(remove_pair, inputs=gr_dd_pair, outputs=gr_dd_pair)
         # 同期ボタン
-        gr_btn_sync = gr.Button("Sync Manually")
-        gr_btn_sync.click(manual_sync, outputs=gr_state_on)
+        with gr.Row(equal_height=True):
+            gr_btn_sync = gr.Button("Sync Manually", scale=4)
+            gr_btn_cancel_sync = gr.Button("⏹️Cancel Sync", elem_id="button")
+        gr_df_run_state = gr.Dataframe(value=run_state_table, headers=run_state_headers, interactive=False)
+        gr_timer_run_state = gr.Timer(settings.run_state_refresh_interval_sec)
+        gr_timer_run_state.tick(run_state_table, outputs=gr_df_run_state, show_progress=False)
+        gr_btn_sync.click(manual_sync, inputs=gr_dd_pair, outputs=gr_state_on)
+        gr_btn_cancel_sync.click(cancel_sync, inputs=gr_dd_pair)
+        # 次の同期の計画
+        with gr.Accordion("Plan", open=False):
+            with gr.Row(equal_height=True):
+                gr_text_plan = gr.Textbox("", label="Summary", interactive=False, scale=4)
+                gr_btn_plan = gr.Button("🔍Preview", elem_id="button")
+            gr_df_plan = gr.Dataframe(headers=plan_headers, interactive=False)
+        gr_btn_plan.click(plan_preview, inputs=gr_dd_pair, outputs=[gr_text_plan, gr_df_plan])
+        # 同期履歴
+        with gr.Accordion("Metrics", open=False):
+            gr.Markdown(f"Prometheus endpoint: [{settings.metrics_path}]({settings.metrics_path})")
+            gr_df_metrics = gr.Dataframe(value=metrics_table, headers=metrics_headers, interactive=False)
+        # 復元の進捗
+        with gr.Accordion("Restore", open=False):
+            gr_df_restore = gr.Dataframe(headers=restore_headers, interactive=False)
+            with gr.Row(equal_height=True):
+                gr_dd_restore = gr.Dropdown([], label="Running restore", interactive=True, scale=4)
+                gr_btn_cancel_restore = gr.Button("⏹️Cancel Restore", elem_id="button")
+            gr_state_restore_choices = gr.State([])
+            gr_timer_restore = gr.Timer(settings.restore_refresh_interval_sec)
+        gr_timer_restore.tick(
+            restore_status, 
+            inputs=gr_state_restore_choices, 
+            outputs=[gr_df_restore, gr_dd_restore, gr_state_restore_choices], 
+            show_progress=False, 
+        )
+        gr_btn_cancel_restore.click(cancel_restore, inputs=gr_dd_restore)
+        # スナップショット
+        with gr.Accordion("Snapshots", open=False):
+            with gr.Row(equal_height=True):
+                gr_dd_snapshot_folder = gr.Dropdown([], label="📁Folder", interactive=True, scale=4)
+                gr_btn_refresh_snapshots = gr.Button("🔄️Refresh", elem_id="button")
+            gr_df_snapshots = gr.Dataframe(headers=snapshot_headers, interactive=False)
+            with gr.Row(equal_height=True):
+                gr_dd_snapshot = gr.Dropdown([], label="🕒Snapshot", interactive=True, scale=4)
+                gr_btn_restore_snapshot = gr.Button("📥Restore Snapshot", elem_id="button")
+        gr_dd_snapshot_folder.change(
+            snapshot_list, 
+            inputs=[gr_dd_pair, gr_dd_snapshot_folder], 
+            outputs=[gr_df_snapshots, gr_dd_snapshot], 
+            show_progress=False, 
+        )
+        gr_btn_refresh_snapshots.click(snapshot_folders, inputs=gr_dd_pair, outputs=gr_dd_snapshot_folder)
+        gr_btn_restore_snapshot.click(restore_snapshot, inputs=[gr_dd_pair, gr_dd_snapshot_folder, gr_dd_snapshot])
+        gr_dd_pair.change(snapshot_folders, inputs=gr_dd_pair, outputs=gr_dd_snapshot_folder, show_progress=False)
+        # フォルダごとの変更履歴
+        with gr.Accordion("History", open=False):
+            with gr.Row(equal_height=True):
+                gr_dd_history_folder = gr.Dropdown([], label="📁Folder", interactive=True, scale=4)
+                gr_btn_refresh_history = gr.Button("🔄️Refresh", elem_id="button")
+            gr_df_history = gr.Dataframe(headers=history_headers, interactive=False, wrap=True)
+        gr_dd_history_folder.change(folder_history, inputs=gr_dd_history_folder, outputs=gr_df_history, show_progress=False)
+        gr_btn_refresh_history.click(folder_history, inputs=gr_dd_history_folder, outputs=gr_df_history, show_progress=False)
+        gr_dd_pair.change(snapshot_folders, inputs=gr_dd_pair, outputs=gr_dd_history_folder, show_progress=False)
         # フォルダビューワー
         container = gr.Column()
         gr_timer = gr.Timer(settings.console_refresh_interval_sec)
         gr_dummy = gr.State(False)
+        gr_state_version = gr.State(-1)
+        gr_state_page = gr.State(0)
+        gr_timer.tick(poll_version, inputs=gr_state_version, outputs=gr_state_version, show_progress=False)
+        gr_timer.tick(metrics_table, outputs=gr_df_metrics, show_progress=False)
+        with gr.Row(equal_height=True):
+            gr_btn_prev_page = gr.Button("◀ Prev", elem_id="button")
+            gr_btn_next_page = gr.Button("Next ▶", elem_id="button")
+        gr_btn_prev_page.click(lambda page, pair_name: move_page(page, -1, pair_name), inputs=[gr_state_page, gr_dd_pair], outputs=gr_state_page, show_progress=False)
+        gr_btn_next_page.click(lambda page, pair_name: move_page(page, 1, pair_name), inputs=[gr_state_page, gr_dd_pair], outputs=gr_state_page, show_progress=False)
+        gr_dd_pair.change(select_pair, inputs=gr_dd_pair, outputs=[
+            gr_text_local,
+            gr_text_remote,
+            gr_num_sync_freq_mins,
+            gr_num_hold_after_created_days,
+            gr_num_hold_after_modified_days,
+            gr_num_local_quota_gb,
+            gr_state_page,
+        ], show_progress=False)
 
-        # フォルダ一覧の描画処理
-        @gr.render(inputs=[gr_dummy], triggers=[gr_timer.tick, gr_state_on.change])
-        def render_items(gr_dummy):
+        # フォルダ一覧の描画処理（同期状態が更新された場合のみ）
+        @gr.render(inputs=[gr_dummy, gr_state_page, gr_dd_pair], triggers=[gr_state_version.change, gr_state_page.change, gr_state_on.change, gr_dd_pair.change])
+        def render_items(gr_dummy, page, pair_name):
             if gr_dummy:
                 return
-            # フォルダ一覧取得
-            if not settings.local_dump_filename.exists() or not settings.remote_dump_filename.exists():
+            # 選択中の組のフォルダ一覧取得
+            root_local: LocalRootDirectory = LocalRootDirectory.load(pair_name)
+            root_remote: RemoteRootDirectory = RemoteRootDirectory.load(pair_name)
+            if root_local is None or root_remote is None:
                 return
-            root_local: LocalRootDirectory = yaml.load(settings.local_dump_filename.read_text(encoding='utf8'), Loader=yaml.Loader)
-            root_remote: RemoteRootDirectory = yaml.load(settings.remote_dump_filename.read_text(encoding='utf8'), Loader=yaml.Loader)
             ids: dict[str, dict[str, SyncDirectory]] = {}
             gr_state_root_local = gr.State(root_local)
             gr_state_root_remote = gr.State(root_remote)
@@ -195,39 +472,46 @@ def create_gradio_ui():
             sync_times = [x.synced_at for x in root_local.sync_directories]
             if sync_times:
                 synced_at = max(sync_times).strftime("%Y-%m-%d %H:%M")
-            gr.Markdown(f"Synced at: {synced_at}")
+            # 表示するページのみ描画する
+            page_size = settings.console_page_size
+            page_count = page_count_for(len(ids))
+            page = min(page, page_count - 1)
+            items = sorted(ids.items(), reverse=True)[page * page_size:(page + 1) * page_size]
+            gr.Markdown(f"Synced at: {synced_at}　　Page {page + 1} / {page_count} ({len(ids)} folders)", key="synced-at")
             # フォルダ概要を表示
             rows = []
-            for k, v in sorted(ids.items(), reverse=True):
+            for k, v in items:
                 sync_local: SyncDirectory = v["local"] if "local" in v.keys() else None
                 sync_remote: SyncDirectory = v["remote"] if "remote" in v.keys() else None
                 gr_state_sync_local = gr.State(sync_local)
                 gr_state_sync_remote = gr.State(sync_remote)
+                # key を指定し、再描画時は変更のあった行・部品のみ更新させる
                 with gr.Row(equal_height=True):
                     name = sync_local.path_.stem if sync_local else sync_remote.path_.stem
-                    gr_textbox_stem = gr.Textbox(name, label="Name", interactive=False, scale=4)
+                    gr_textbox_stem = gr.Textbox(name, label="Name", interactive=False, scale=4, key=f"{k}-name")
                     gr_textbox_created_at = gr.Textbox(
                         sync_remote.created_at.strftime("%Y-%m-%d %H:%M"), 
-                        label="📄Created at", interactive=False, scale=1
+                        label="📄Created at", interactive=False, scale=1, key=f"{k}-created-at"
                     )
                     modified_at = sync_local.modified_at if sync_local is not None else sync_remote.modified_at
                     gr_textbox_modified_at = gr.Textbox(
                         modified_at.strftime("%Y-%m-%d %H:%M"), 
-                        label="📝Modified at", interactive=False, scale=1
+                        label="📝Modified at", interactive=False, scale=1, key=f"{k}-modified-at"
                     )
                     gr_textbox_be_removed_at = gr.Textbox(
-                        sync_local.be_removed_at.strftime("%Y-%m-%d %H:%M") if sync_local is not None else "", 
-                        label="🗑️Remove local at", interactive=False, scale=1
+                        get_removal_text(sync_local), 
+                        label="🗑️Remove local at", interactive=False, scale=1, key=f"{k}-removed-at"
                     )
-                    gr_md_icon = gr.Markdown(get_icon_emojis(sync_local, sync_remote), elem_id="icon")
+                    gr_md_icon = gr.Markdown(get_icon_emojis(sync_local, sync_remote), elem_id="icon", key=f"{k}-icon")
                     with gr.Column() as lock_col:
                         with gr.Group():
-                            gr_button_lock_remote = gr.Button("🔒Lock Remote", interactive=not sync_remote.locked)
-                            gr_button_unlock_remote = gr.Button("🔓Unlock Remote", interactive=sync_remote.locked and sync_local is not None)
+                            gr_button_lock_remote = gr.Button("🔒Lock Remote", interactive=not sync_remote.locked, key=f"{k}-lock")
+                            gr_button_unlock_remote = gr.Button("🔓Unlock Remote", interactive=sync_remote.locked and sync_local is not None, key=f"{k}-unlock")
                     with gr.Column() as copy_col:
                         with gr.Group():
-                            gr_button_remove_local = gr.Button("🗑️Remove local", interactive=(sync_remote.locked and sync_local is not None))
-                            gr_button_copy_to_local = gr.Button("📥Copy to local", interactive=(sync_remote.locked and sync_local is None))
+                            gr_button_remove_local = gr.Button("🗑️Remove local", interactive=(sync_remote.locked and sync_local is not None), key=f"{k}-remove")
+                            can_restore = sync_local is None or (sync_local.restoring and not restore.is_running(k))
+                            gr_button_copy_to_local = gr.Button("📥Copy to local", interactive=(sync_remote.locked and can_restore), key=f"{k}-copy")
                     rows.extend([
                         gr_textbox_stem, 
                         gr_textbox_created_at, 
@@ -289,4 +573,6 @@ def create_gradio_ui():
 
         container.render = render_items(gr_dummy)
         demo.load(lambda: True, outputs=gr_state_on)
+        demo.load(snapshot_folders, inputs=gr_dd_pair, outputs=gr_dd_snapshot_folder)
+        demo.load(snapshot_folders, inputs=gr_dd_pair, outputs=gr_dd_history_folder)
         return demo
\ No newline at end of file